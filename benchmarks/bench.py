@@ -0,0 +1,232 @@
+'''
+Export benchmark suite. Run with a plain Python interpreter:
+
+    python benchmarks/bench.py --blender /path/to/blender --suite quick
+
+Each case exports a scene with export_fbx() in a fresh background Blender
+process, so that peak memory is measured per case. Synthetic scenes are
+generated once and cached in benchmarks/.cache. The sample assets of the
+repository are included as real-world cases.
+
+Results (wall time, peak RSS, output size) are written to --output, and
+compared with --baseline. A case regresses when a metric grows by more than
+--tolerance. The exit code is 1 if any case regressed or failed.
+'''
+import os
+import sys
+import json
+import shutil
+import fnmatch
+import argparse
+import platform
+import tempfile
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+CASE_SCRIPT = os.path.join(BENCH_DIR, 'blender_case.py')
+CACHE_DIR = os.path.join(BENCH_DIR, '.cache')
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, 'baseline.json')
+
+MARKER = 'io_ue5_fbx:bench:'
+
+# bump to regenerate cached synthetic scenes
+GENERATOR_VERSION = 1
+
+# synthetic scene sizes per suite: vertices, bones, frames
+SUITES = {
+    'quick': {
+        'mesh': [10_000, 100_000],
+        'armature': [10, 100],
+        'action': [10, 100],
+    },
+    'full': {
+        'mesh': [10_000, 100_000, 1_000_000, 10_000_000],
+        'armature': [10, 100, 1000],
+        'action': [10, 100, 1000, 10_000],
+    },
+}
+
+# sample assets of the repository
+REAL_ASSETS = [
+    'cube.blend',
+    'eva.blend',
+    'evabot.blend',
+    os.path.join('blender', 'leaf.blend'),
+]
+
+# metrics compared with the baseline
+METRICS = ['wall_time', 'peak_rss', 'output_size']
+
+ENGINES = ['BLENDER', 'NATIVE']
+
+
+def make_cases(suite, engines):
+    '''
+    List of case dicts, one per scene and engine
+    '''
+    scenes = []
+    for kind, sizes in SUITES[suite].items():
+        for size in sizes:
+            name = f"{kind}_{size}"
+            scenes.append({
+                'name': name,
+                'kind': kind,
+                'size': size,
+                'blend': os.path.join(CACHE_DIR,
+                    f"{name}_v{GENERATOR_VERSION}.blend"),
+            })
+
+    for asset in REAL_ASSETS:
+        stem = os.path.splitext(os.path.basename(asset))[0]
+        scenes.append({
+            'name': f"real_{stem}",
+            'kind': 'real',
+            'blend': os.path.join(REPO_ROOT, asset),
+        })
+
+    return [dict(scene, engine=engine, id=f"{scene['name']}/{engine}")
+        for scene in scenes for engine in engines]
+
+
+def run_blender(blender, args, spec, work_dir):
+    '''
+    Run blender_case.py with a case spec. Returns (return code, stdout)
+    '''
+    spec_path = os.path.join(work_dir, 'case.json')
+    with open(spec_path, 'w') as f:
+        json.dump(spec, f)
+
+    cmd = [blender, '--background', '--factory-startup'] + args + \
+        ['--python-exit-code', '1', '--python', CASE_SCRIPT, '--'] + \
+        [spec.get('mode', 'export'), spec_path]
+    proc = subprocess.run(cmd, stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT, text=True)
+    return proc.returncode, proc.stdout
+
+
+def run_case(blender, case, work_dir):
+    '''
+    Generate the scene if needed, then export it. Returns the metrics dict
+    '''
+    if (case['kind'] != 'real' and not os.path.isfile(case['blend'])):
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        print(f"Generating {case['name']}", flush=True)
+        code, out = run_blender(blender, [], dict(case, mode='generate'),
+            work_dir)
+        if (code != 0):
+            return {'error': f"Scene generation failed:\n{out[-2000:]}"}
+
+    spec = dict(case,
+        mode='export',
+        output_dir=work_dir,
+        file_name=case['id'].replace('/', '_'),
+    )
+    code, out = run_blender(blender, [case['blend']], spec, work_dir)
+
+    for line in out.splitlines():
+        if (line.startswith(MARKER)):
+            return json.loads(line[len(MARKER):])
+    return {'error': f"Export failed ({code}):\n{out[-2000:]}"}
+
+
+def compare(results, baseline, tolerance):
+    '''
+    Compare results with the baseline. Returns a list of regressions
+    '''
+    regressions = []
+    for case_id, metrics in results.items():
+        base = baseline.get(case_id)
+        if (base is None or 'error' in metrics or 'error' in base):
+            continue
+        for metric in METRICS:
+            old, new = base.get(metric), metrics.get(metric)
+            if (not old or new is None):
+                continue
+            change = (new - old) / old
+            if (change > tolerance):
+                regressions.append((case_id, metric, old, new, change))
+    return regressions
+
+
+def format_metric(metric, value):
+    if (value is None):
+        return '-'
+    if (metric == 'wall_time'):
+        return f"{value:.3f}s"
+    return f"{value / 2 ** 20:.1f}MB"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--blender', default=shutil.which('blender'),
+        help="Blender executable (default: blender on PATH)")
+    parser.add_argument('--suite', choices=SUITES, default='quick')
+    parser.add_argument('--engines', nargs='+', choices=ENGINES,
+        default=ENGINES)
+    parser.add_argument('--filter', default='*',
+        help="Only run cases whose id matches this pattern")
+    parser.add_argument('--output', default='bench_results.json',
+        help="Write the results to this file")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE,
+        help="Compare with the results in this file")
+    parser.add_argument('--update-baseline', action='store_true',
+        help="Store the results as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=0.15,
+        help="Relative growth of a metric that counts as a regression")
+    args = parser.parse_args(argv)
+
+    if (not args.blender):
+        parser.error("Blender not found. Pass --blender")
+
+    cases = [c for c in make_cases(args.suite, args.engines)
+        if fnmatch.fnmatchcase(c['id'], args.filter)]
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='io_ue5_fbx_bench_') as work_dir:
+        for case in cases:
+            metrics = run_case(args.blender, case, work_dir)
+            results[case['id']] = metrics
+
+            if ('error' in metrics):
+                print(f"{case['id']:<32} FAILED\n{metrics['error']}")
+            else:
+                print(f"{case['id']:<32} " + ' '.join(
+                    f"{m}={format_metric(m, metrics.get(m))}"
+                    for m in METRICS), flush=True)
+
+    report = {
+        'platform': platform.platform(),
+        'blender': args.blender,
+        'suite': args.suite,
+        'cases': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=4)
+
+    failed = [k for k, v in results.items() if 'error' in v]
+
+    regressions = []
+    if (os.path.isfile(args.baseline)):
+        with open(args.baseline) as f:
+            baseline = json.load(f)['cases']
+        regressions = compare(results, baseline, args.tolerance)
+        for case_id, metric, old, new, change in regressions:
+            print(f"REGRESSION {case_id} {metric}: " + \
+                f"{format_metric(metric, old)} -> " + \
+                f"{format_metric(metric, new)} ({change:+.0%})")
+        if (not regressions):
+            print(f"No regressions against {args.baseline}")
+    else:
+        print(f"No baseline at {args.baseline}")
+
+    if (args.update_baseline):
+        shutil.copyfile(args.output, args.baseline)
+        print(f"Updated baseline {args.baseline}")
+
+    return 1 if (failed or regressions) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
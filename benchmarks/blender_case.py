@@ -0,0 +1,222 @@
+'''
+RUN THIS SCRIPT FROM A BACKGROUND BLENDER PROCESS. Started by bench.py:
+
+    blender --background --factory-startup --python blender_case.py -- \
+        generate case.json
+    blender --background --factory-startup scene.blend \
+        --python blender_case.py -- export case.json
+
+generate: builds a synthetic scene and saves it to the case's blend file
+export:   exports the open file with export_fbx() and prints the timing,
+          peak memory and output size on one line prefixed with MARKER
+'''
+import bpy
+import os
+import sys
+import json
+import time
+import numpy as np
+
+# make the add-on importable without installing it
+repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if (repo_root not in sys.path):
+    sys.path.insert(0, repo_root)
+
+from io_ue5_fbx.constants import BlenderTypes
+from io_ue5_fbx.export import export
+from io_ue5_fbx.export.headless import Reporter
+
+MARKER = 'io_ue5_fbx:bench:'
+
+
+# ---------------------------- Memory ---------------------------- #
+
+
+def current_rss():
+    '''
+    Resident set size of this process in bytes, or None if unknown
+    '''
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        return None
+
+
+def peak_rss():
+    '''
+    Peak resident set size of this process in bytes, or None if unknown
+    '''
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        return peak if sys.platform == 'darwin' else peak * 1024
+    except ImportError:
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().peak_wset
+    except (ImportError, AttributeError):
+        return None
+
+
+# ------------------------- Scene builders ------------------------ #
+
+
+def clear_scene():
+    for obj in list(bpy.data.objects):
+        bpy.data.objects.remove(obj)
+
+
+def build_mesh(vertex_count):
+    '''
+    Square grid of quads with about vertex_count vertices
+    '''
+    side = max(2, int(np.ceil(np.sqrt(vertex_count))))
+    x, y = np.meshgrid(np.arange(side, dtype=np.float32),
+        np.arange(side, dtype=np.float32))
+    co = np.stack((x.ravel(), y.ravel(),
+        np.sin(x.ravel() * 0.1) * np.cos(y.ravel() * 0.1)), axis=1)
+
+    # one quad per grid cell
+    corner = (np.arange(side - 1)[:, None] * side +
+        np.arange(side - 1)[None, :]).ravel()
+    quads = np.stack((corner, corner + 1, corner + side + 1, corner + side),
+        axis=1).astype(np.int32)
+
+    mesh = bpy.data.meshes.new('Grid')
+    mesh.vertices.add(len(co))
+    mesh.vertices.foreach_set('co', co.ravel())
+    mesh.loops.add(quads.size)
+    mesh.loops.foreach_set('vertex_index', quads.ravel())
+    mesh.polygons.add(len(quads))
+    mesh.polygons.foreach_set('loop_start',
+        np.arange(0, quads.size, 4, dtype=np.int32))
+    mesh.update(calc_edges=True)
+
+    obj = bpy.data.objects.new('SM_Grid', mesh)
+    bpy.context.scene.collection.objects.link(obj)
+    return obj
+
+
+def build_armature(bone_count):
+    '''
+    Armature with bone_count bones in a binary tree
+    '''
+    arm = bpy.data.armatures.new('Skeleton')
+    obj = bpy.data.objects.new('SK_Skeleton', arm)
+    bpy.context.scene.collection.objects.link(obj)
+    bpy.context.view_layer.objects.active = obj
+
+    bpy.ops.object.mode_set(mode='EDIT')
+    bones = []
+    for i in range(bone_count):
+        bone = arm.edit_bones.new(f"bone_{i:04d}")
+        if (i == 0):
+            bone.head = (0, 0, 0)
+        else:
+            parent = bones[(i - 1) // 2]
+            bone.parent = parent
+            bone.use_connect = True
+            bone.head = parent.tail
+        side = 0.2 if i % 2 else -0.2
+        bone.tail = (bone.head[0] + side, bone.head[1], bone.head[2] + 1)
+        bones.append(bone)
+    bpy.ops.object.mode_set(mode='OBJECT')
+
+    return obj
+
+
+def build_action(obj, frame_count):
+    '''
+    Action keying the rotation of every bone on every frame
+    '''
+    scene = bpy.context.scene
+    scene.frame_start = 1
+    scene.frame_end = frame_count
+
+    action = bpy.data.actions.new('Take')
+    obj.animation_data_create().action = action
+
+    frames = np.arange(1, frame_count + 1, dtype=np.float32)
+    for i, pb in enumerate(obj.pose.bones):
+        pb.rotation_mode = 'XYZ'
+        path = f'pose.bones["{pb.name}"].rotation_euler'
+        for axis in range(3):
+            fc = action.fcurves.new(path, index=axis, action_group=pb.name)
+            values = np.sin(frames * 0.05 + i + axis).astype(np.float32)
+            fc.keyframe_points.add(frame_count)
+            fc.keyframe_points.foreach_set('co',
+                np.stack((frames, values), axis=1).ravel())
+            fc.update()
+
+    return action
+
+
+def generate(case):
+    clear_scene()
+    match case['kind']:
+        case 'mesh':
+            build_mesh(case['size'])
+        case 'armature':
+            build_armature(case['size'])
+            build_action(bpy.data.objects['SK_Skeleton'], 100)
+        case 'action':
+            obj = build_armature(100)
+            build_action(obj, case['size'])
+
+    bpy.ops.wm.save_as_mainfile(filepath=case['blend'])
+
+
+# ---------------------------- Export ----------------------------- #
+
+
+def run_export(case):
+    objs = [obj for obj in bpy.context.view_layer.objects
+        if obj.type in (BlenderTypes.MESH, BlenderTypes.ARMATURE)]
+    types = {obj.type for obj in objs}
+
+    rss_before = current_rss()
+    start = time.perf_counter()
+
+    filepath = export.export_fbx(op=Reporter(verbose=False),
+                                 context=bpy.context,
+                                 dir_name=case['output_dir'],
+                                 file_name=case['file_name'],
+                                 selected_mesh=BlenderTypes.MESH in types,
+                                 selected_armature=BlenderTypes.ARMATURE in types,
+                                 engine=case['engine'],
+                                 objects=objs,
+                                 )
+
+    result = {
+        'wall_time': time.perf_counter() - start,
+        'rss_before': rss_before,
+        'peak_rss': peak_rss(),
+        'output_size': os.path.getsize(filepath),
+        'vertices': sum(len(o.data.vertices) for o in objs
+            if o.type == BlenderTypes.MESH),
+        'bones': sum(len(o.data.bones) for o in objs
+            if o.type == BlenderTypes.ARMATURE),
+        'frames': bpy.context.scene.frame_end -
+            bpy.context.scene.frame_start + 1,
+    }
+    print(f"{MARKER}{json.dumps(result)}", flush=True)
+
+
+if __name__ == '__main__':
+    argv = sys.argv[sys.argv.index('--') + 1:]
+    with open(argv[1]) as f:
+        case = json.load(f)
+
+    match argv[0]:
+        case 'generate':
+            generate(case)
+        case 'export':
+            run_export(case)
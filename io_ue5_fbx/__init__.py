@@ -1,5 +1,5 @@
 import bpy
-from . import operators, properties, depsgraph
+from . import operators, properties, depsgraph, livelink
 from .constants import BlenderTypes, BlenderUnits, AddonUnits
 from .ui import panel
 
@@ -17,6 +17,7 @@ bl_info = {
 modules = [
     properties,
     operators,
+    livelink,
     panel,
 ]
 
@@ -0,0 +1,18 @@
+'''
+Command line entry point. See cli.py for the arguments
+
+    blender --background --python io_ue5_fbx/__main__.py -- [arguments]
+    python -m io_ue5_fbx [arguments]    (with the bpy module installed)
+'''
+import os
+import sys
+
+if (not __package__):
+    # run as a script by Blender. Make the add-on importable
+    sys.path.insert(0, os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))))
+    from io_ue5_fbx import cli
+else:
+    from . import cli
+
+sys.exit(cli.main())
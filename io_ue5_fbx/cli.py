@@ -0,0 +1,285 @@
+'''
+Command line entry point, for CI and render farms. Runs inside a background
+Blender process, without the sidebar panel:
+
+    blender --background --factory-startup \
+        --python io_ue5_fbx/__main__.py -- eva.blend evabot.blend \
+        --fp-project-dir /UnrealProjects/TART07 --fp-project-subdir Content \
+        --objects "SK_*" --result result.json
+
+or, with the add-on on sys.path:
+
+    blender --background --python-expr \
+        "import sys; from io_ue5_fbx import cli; sys.exit(cli.main())" \
+        -- eva.blend ...
+
+Every PG_Properties option is available as --option-name. With
+--scene-settings, each file is exported with the settings saved in its own
+scene instead, and options given on the command line override them.
+library.py runs this over a whole directory of Blender files. The result is
+written as JSON to --result, and printed on a single line prefixed with
+"io_ue5_fbx:result:". The exit code is 0 if every export succeeded.
+'''
+import bpy
+import os
+import sys
+import json
+import time
+import signal
+import fnmatch
+import argparse
+from . import properties
+from .properties import PG_Properties, export_settings, batch_settings
+from .constants import BlenderTypes, AddonBatch
+from .export import export, batch
+from .export.headless import Reporter
+
+# exit codes
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+
+
+def add_property_arguments(parser):
+    '''
+    Add one option per PG_Properties property, with the same defaults
+    '''
+    group = parser.add_argument_group('export options')
+
+    for key, prop in PG_Properties.__annotations__.items():
+        kw = prop.keywords
+        flag = '--' + key.replace('_', '-')
+        desc = kw.get('description', '')
+
+        match prop.function.__name__:
+            case 'BoolProperty':
+                group.add_argument(flag, dest=key, help=desc,
+                    action=argparse.BooleanOptionalAction,
+                    default=kw.get('default', False))
+            case 'EnumProperty':
+                choices = [item[0] for item in kw['items']]
+                group.add_argument(flag, dest=key, help=desc,
+                    choices=choices, default=kw.get('default', choices[0]))
+            case 'IntProperty':
+                group.add_argument(flag, dest=key, help=desc,
+                    type=int, default=kw.get('default', 0))
+            case 'FloatProperty':
+                group.add_argument(flag, dest=key, help=desc,
+                    type=float, default=kw.get('default', 0.0))
+            case 'StringProperty':
+                group.add_argument(flag, dest=key, help=desc,
+                    default=kw.get('default', ''))
+
+
+def make_parser():
+    parser = argparse.ArgumentParser(
+        prog='io_ue5_fbx',
+        description="Export FBX files from Blender to Unreal Engine 5",
+    )
+    parser.add_argument('blend_files', nargs='*', metavar='BLEND',
+        help="Blender files to export. Defaults to the open file")
+    parser.add_argument('--objects', nargs='+', metavar='PATTERN',
+        default=[], help="Export objects whose name matches a pattern")
+    parser.add_argument('--collections', nargs='+', metavar='PATTERN',
+        default=[], help="Export objects of collections whose name " + \
+            "matches a pattern")
+    parser.add_argument('--result', metavar='JSON',
+        help="Write the result to this file")
+    parser.add_argument('--scene-settings', action='store_true',
+        help="Export each file with the settings saved in its scene. " + \
+            "Export options given here override them")
+
+    add_property_arguments(parser)
+
+    # unless given, object types follow the filtered objects, as in the UI
+    parser.set_defaults(ob_mesh=None, ob_armature=None)
+    return parser
+
+
+def filter_objects(args):
+    '''
+    Objects of the open file matching the object and collection filters.
+    Without filters, every mesh and armature
+    '''
+    objs = [obj for obj in bpy.context.view_layer.objects
+        if obj.type in (BlenderTypes.MESH, BlenderTypes.ARMATURE)]
+
+    if (args.objects):
+        objs = [obj for obj in objs if any(fnmatch.fnmatchcase(obj.name, p)
+            for p in args.objects)]
+
+    if (args.collections):
+        members = set()
+        for coll in bpy.data.collections:
+            if (any(fnmatch.fnmatchcase(coll.name, p)
+                    for p in args.collections)):
+                members.update(coll.all_objects)
+        objs = [obj for obj in objs if obj in members]
+
+    return objs
+
+
+def explicit_options(argv):
+    '''
+    Export options given on the command line, without the defaults
+    '''
+    parser = make_parser()
+    parser.set_defaults(**{key: argparse.SUPPRESS
+        for key in PG_Properties.__annotations__})
+    return vars(parser.parse_args(argv))
+
+
+def scene_arguments(scene, args, overrides):
+    '''
+    Arguments with the export options saved in the scene, overridden by
+    those given on the command line. Returns None if the scene has no saved
+    options and none were given
+    '''
+    keys = PG_Properties.__annotations__
+    if (scene.get('io_ue5_fbx') is None and
+            not any(key in overrides for key in keys)):
+        return None
+
+    io_props = scene.io_ue5_fbx
+    file_args = argparse.Namespace(**vars(args))
+    for key in keys:
+        setattr(file_args, key, overrides.get(key, getattr(io_props, key)))
+
+    # the saved object types follow the selection in the UI, not a setting
+    for key in ('ob_mesh', 'ob_armature'):
+        setattr(file_args, key, overrides.get(key))
+    return file_args
+
+
+def export_file(blend_path, args, overrides=None):
+    '''
+    Export the objects of one Blender file. Returns a list of results
+    '''
+    if (blend_path):
+        bpy.ops.wm.open_mainfile(filepath=blend_path)
+
+    if (args.scene_settings):
+        args = scene_arguments(bpy.context.scene, args, overrides or {})
+        if (args is None):
+            return [{
+                'blend': blend_path,
+                'name': '',
+                'status': 'FAILED',
+                'filepath': '',
+                'messages': ["No io_ue5_fbx settings are saved in " + \
+                    "this file"],
+            }]
+
+    objs = filter_objects(args)
+    if (not objs):
+        return [{
+            'blend': blend_path,
+            'name': '',
+            'status': 'FAILED',
+            'filepath': '',
+            'messages': ["No objects match the filters"],
+        }]
+
+    # object types default to the types of the filtered objects
+    file_args = argparse.Namespace(**vars(args))
+    types = {obj.type for obj in objs}
+    if (file_args.ob_mesh is None):
+        file_args.ob_mesh = BlenderTypes.MESH in types
+    if (file_args.ob_armature is None):
+        file_args.ob_armature = BlenderTypes.ARMATURE in types
+
+    reporter = Reporter()
+    start = time.perf_counter()
+
+    if (file_args.bt_mode != AddonBatch.OFF.name):
+        results = batch.export_batch(op=reporter,
+                                     context=bpy.context,
+                                     objects=objs,
+                                     strict_paths=True,
+                                     **batch_settings(file_args),
+                                     )
+    else:
+        filepath = export.export_fbx(op=reporter,
+                                     context=bpy.context,
+                                     objects=objs,
+                                     strict_paths=True,
+                                     **export_settings(file_args),
+                                     )
+        results = [{
+            'name': os.path.splitext(os.path.basename(filepath))[0],
+            'status': 'FINISHED',
+            'filepath': filepath,
+            'messages': reporter.messages,
+            'elapsed': time.perf_counter() - start,
+        }]
+
+    for result in results:
+        result['blend'] = blend_path
+    return results
+
+
+def exit_on_terminate():
+    '''
+    Exit on SIGTERM by raising SystemExit, so that a stopped export still
+    closes its stages and removes its partial files. library.py stops a file
+    that runs past its timeout this way. On Windows, terminating a process
+    cannot be caught
+    '''
+    def terminate(signum, frame):
+        raise SystemExit(EXIT_FAILED)
+
+    signal.signal(signal.SIGTERM, terminate)
+
+
+def main(argv=None):
+    '''
+    Parse the arguments, export, and report. Returns the exit code
+    '''
+    if (argv is None):
+        # Blender's own arguments end at '--'
+        argv = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv \
+            else sys.argv[1:]
+
+    try:
+        args = make_parser().parse_args(argv)
+    except SystemExit as error:
+        return EXIT_OK if error.code == 0 else EXIT_USAGE
+
+    exit_on_terminate()
+
+    overrides = None
+    if (args.scene_settings):
+        # scene.io_ue5_fbx, without enabling the add-on
+        properties.register()
+        overrides = explicit_options(argv)
+
+    start = time.perf_counter()
+    results = []
+
+    for blend_path in args.blend_files or [bpy.data.filepath]:
+        try:
+            results.extend(export_file(blend_path, args, overrides))
+        except Exception as error:
+            results.append({
+                'blend': blend_path,
+                'name': '',
+                'status': 'FAILED',
+                'filepath': '',
+                'messages': [str(error)],
+            })
+
+    failed = any(r['status'] != 'FINISHED' for r in results)
+    code = EXIT_FAILED if failed else EXIT_OK
+    summary = {
+        'status': 'FAILED' if failed else 'FINISHED',
+        'exit_code': code,
+        'elapsed': time.perf_counter() - start,
+        'files': results,
+    }
+
+    if (args.result):
+        with open(args.result, 'w') as f:
+            json.dump(summary, f, indent=4)
+    print(f"{batch.MARKER}result:{json.dumps(summary)}", flush=True)
+
+    return code
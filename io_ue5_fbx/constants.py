@@ -32,4 +32,34 @@ class AddonSmoothing(Enum):
     FACE = 'Face (Recommended)'
     EDGE = 'Edge'
     OFF = "Normals Only"
-    
\ No newline at end of file
+    
+
+class AddonBatch(Enum):
+    OFF = 'Single File'
+    OBJECT = 'One File per Object'
+    COLLECTION = 'One File per Collection'
+    ACTION = 'One File per Action'
+
+
+class AddonInfluences(Enum):
+    FOUR = '4'
+    EIGHT = '8'
+    TWELVE = '12'
+
+
+class AddonEngine(Enum):
+    BLENDER = 'Blender FBX Exporter'
+    NATIVE = 'Native Streaming Writer'
+
+
+class AddonTextureFormat(Enum):
+    ORIGINAL = 'Original'
+    PNG = 'PNG'
+    TARGA = 'Targa'
+    JPEG = 'JPEG'
+
+
+class AddonLiveLink(Enum):
+    OFF = 'Off'
+    SAVE = 'On Save'
+    EDIT = 'After Edits'
@@ -1,7 +1,23 @@
 import bpy
 import bpy.app.handlers as handlers
+from bpy.app.handlers import persistent
+from . import livelink
+from .index import object_index
 from .constants import BlenderTypes
 
+# seconds for a burst of depsgraph updates to settle before rescanning
+DEBOUNCE_INTERVAL = 0.1
+
+# incremented whenever the selection may have changed. Lets the UI cache
+# whatever it derives from the selection
+selection_generation = 0
+
+# data-blocks whose update may change the selection or the objects in the
+# view layer. Edits of objects themselves (transform, sculpt, playback) only
+# update the objects and their data, unless they convert an object to
+# another type, see ObjectIndex.is_type_update()
+SELECTION_ID_TYPES = (bpy.types.Scene, bpy.types.Collection)
+
 
 def update_selected_objects(*args):
     '''
@@ -18,25 +34,98 @@ def update_selected_objects(*args):
             break
         match obj.type:
             case BlenderTypes.MESH:
-                mesh_found = True   
+                mesh_found = True
             case BlenderTypes.ARMATURE:
                 armature_found = True
 
-    io_props.ob_mesh = mesh_found
-    io_props.ob_armature = armature_found
+    # writing a property triggers another depsgraph update. Only write changes
+    if (io_props.ob_mesh != mesh_found):
+        io_props.ob_mesh = mesh_found
+    if (io_props.ob_armature != armature_found):
+        io_props.ob_armature = armature_found
+
+
+def is_selection_update(depsgraph):
+    '''
+    Can the updates of the depsgraph have changed the selection?
+    '''
+    for update in depsgraph.updates:
+        if (isinstance(update.id, SELECTION_ID_TYPES)):
+            return True
+    return False
+
+
+def flush_selection_update():
+    '''
+    Timer. Rescan the selection once, after a burst of updates
+    '''
+    update_selected_objects()
+    return None # do not repeat
+
+
+@persistent
+def invalidate_object_index(*args):
+    '''
+    Undo and file loading replace every object. Rebuild the index lazily
+    '''
+    global selection_generation
+    selection_generation += 1
+    object_index.invalidate()
+
+
+# persistent, so that the add-on keeps tracking after loading a file
+@persistent
+def on_depsgraph_update(scene, depsgraph):
+    '''
+    Schedule a selection rescan if the update can have changed it, or the
+    type of an object. Bursts of updates are coalesced into one rescan
+    '''
+    global selection_generation
+
+    # objects converted to another type, e.g. mesh to curve. Found before
+    # the index takes their new type
+    converted = object_index.is_type_update(scene, depsgraph)
+
+    # keep the object index up to date, for the changed objects only
+    object_index.apply_updates(scene, depsgraph)
+
+    # re-export the watched assets that changed
+    livelink.on_depsgraph_update(scene, depsgraph)
+
+    if (not converted and not is_selection_update(depsgraph)):
+        return
+    selection_generation += 1
+
+    if (bpy.app.timers.is_registered(flush_selection_update)):
+        return
+    bpy.app.timers.register(flush_selection_update,
+        first_interval=DEBOUNCE_INTERVAL)
 
 
 def register():
     '''
     Add set selected object event listener
     '''
-    if (update_selected_objects not in handlers.depsgraph_update_post):
-        handlers.depsgraph_update_post.append(update_selected_objects)
+    if (on_depsgraph_update not in handlers.depsgraph_update_post):
+        handlers.depsgraph_update_post.append(on_depsgraph_update)
+
+    for handler_list in (handlers.undo_post, handlers.redo_post,
+                         handlers.load_post):
+        if (invalidate_object_index not in handler_list):
+            handler_list.append(invalidate_object_index)
 
 
 def unregister():
     '''
     Remove set selected object event listener
     '''
-    if (update_selected_objects in handlers.depsgraph_update_post):
-        handlers.depsgraph_update_post.remove(update_selected_objects)
+    if (on_depsgraph_update in handlers.depsgraph_update_post):
+        handlers.depsgraph_update_post.remove(on_depsgraph_update)
+
+    for handler_list in (handlers.undo_post, handlers.redo_post,
+                         handlers.load_post):
+        if (invalidate_object_index in handler_list):
+            handler_list.remove(invalidate_object_index)
+
+    if (bpy.app.timers.is_registered(flush_selection_update)):
+        bpy.app.timers.unregister(flush_selection_update)
@@ -0,0 +1,149 @@
+'''
+Animation export. Baking for the native writer steps the scene once per
+frame, reads the pose of every bone of every armature with one foreach_get
+call, and computes local transforms for a chunk of frames at a time in
+NumPy. Also finds and plays the actions of an armature, for exporting one
+action per file. The key math of baked channels is in keys.py
+'''
+import bpy
+import re
+import numpy as np
+from contextlib import contextmanager
+from . import geometry, keys
+
+# frames sampled before their local transforms are computed. Bounds the
+# memory of the float64 pose matrices to chunk x bones x 128 bytes
+CHUNK_FRAMES = 256
+
+# translation, rotation (XYZ euler degrees), scale
+CHANNELS = 9
+
+
+def frame_range(scene):
+    '''
+    Frames baked from the scene, as an int64 array
+    '''
+    return np.arange(scene.frame_start, scene.frame_end + 1, dtype=np.int64)
+
+
+def frame_times(scene, frames, ktime):
+    '''
+    FBX times (ticks of 1/ktime seconds) of frames, as an int64 array
+    '''
+    fps = scene.render.fps / scene.render.fps_base
+    return np.round(frames * (ktime / fps)).astype(np.int64)
+
+
+def armature_actions(arm):
+    '''
+    Actions of an armature: its active action, the actions of its NLA
+    strips, and any other action keying one of its bones
+    '''
+    actions = []
+    anim_data = arm.animation_data
+    if (anim_data is not None):
+        if (anim_data.action is not None):
+            actions.append(anim_data.action)
+        for track in anim_data.nla_tracks:
+            actions.extend(s.action for s in track.strips if s.action)
+
+    bones = set(arm.data.bones.keys())
+    for action in bpy.data.actions:
+        for fcurve in action.fcurves:
+            match = re.match(r'pose\.bones\["(.+?)"\]', fcurve.data_path)
+            if (match and match.group(1) in bones):
+                actions.append(action)
+                break
+
+    # unique, in order
+    return list(dict.fromkeys(actions))
+
+
+@contextmanager
+def action_override(scene, armatures, action):
+    '''
+    Play action alone on armatures, over the action's frame range, for the
+    duration. NLA tracks are not evaluated meanwhile
+    '''
+    frame_range = (scene.frame_start, scene.frame_end)
+    saved = []
+    for arm in armatures:
+        had_anim_data = arm.animation_data is not None
+        anim_data = arm.animation_data_create()
+        saved.append((arm, had_anim_data, anim_data.action,
+            anim_data.use_nla))
+        anim_data.action = action
+        anim_data.use_nla = False
+
+    start, end = action.frame_range
+    scene.frame_start = int(round(start))
+    scene.frame_end = max(int(round(end)), scene.frame_start)
+
+    try:
+        yield
+    finally:
+        [scene.frame_start, scene.frame_end] = frame_range
+        for arm, had_anim_data, prev_action, use_nla in saved:
+            if (not had_anim_data):
+                arm.animation_data_clear()
+                continue
+            arm.animation_data.action = prev_action
+            arm.animation_data.use_nla = use_nla
+
+
+def bake_stages(scene, armatures, frames, chunk_frames=CHUNK_FRAMES):
+    '''
+    Sample the local transform of every bone of armatures on every frame
+
+    Generator. Yields progress (0 to 1) after each chunk of frames, and
+    returns {armature: (frames, bones, 9) float32 array} of translation,
+    rotation and scale. The current frame is restored afterwards
+    '''
+    frame_current = scene.frame_current
+    frame_subframe = scene.frame_subframe
+
+    # per armature: parent indices, chunk buffer, baked channels
+    bakes = {}
+    for arm in armatures:
+        n = len(arm.data.bones)
+        bakes[arm] = (
+            geometry.get_parent_indices(arm.data.bones),
+            np.empty((chunk_frames, n * 16), dtype=np.float32),
+            np.empty((len(frames), n, CHANNELS), dtype=np.float32),
+        )
+
+    try:
+        for start in range(0, len(frames), chunk_frames):
+            chunk = frames[start:start + chunk_frames]
+
+            # 1.) sample armature space pose matrices, one call per armature
+            for i, frame in enumerate(chunk):
+                scene.frame_set(int(frame))
+                for arm, (_, buf, _) in bakes.items():
+                    arm.pose.bones.foreach_get('matrix', buf[i])
+
+            # 2.) local transforms of the whole chunk at once
+            for arm, (parents, buf, channels) in bakes.items():
+                count, n = len(chunk), len(parents)
+
+                # foreach_get returns matrices column major
+                mats = buf[:count].reshape(count, n, 4, 4) \
+                    .transpose(0, 1, 3, 2).astype(np.float64)
+                local = geometry.parent_relative_matrices(mats, parents)
+                t, r, s = geometry.decompose_matrices(local.reshape(-1, 4, 4))
+                baked = channels[start:start + count]
+                baked[:, :, 0:3] = t.reshape(count, n, 3)
+                baked[:, :, 3:6] = r.reshape(count, n, 3)
+                baked[:, :, 6:9] = s.reshape(count, n, 3)
+
+                # 3.) continuous rotations, following on from the last chunk
+                previous = channels[start - 1, :, 3:6] if start else None
+                baked[:, :, 3:6] = keys.compatible_eulers(baked[:, :, 3:6],
+                    previous)
+
+            yield min(1.0, (start + len(chunk)) / len(frames))
+
+    finally:
+        scene.frame_set(frame_current, subframe=frame_subframe)
+
+    return {arm: channels for arm, (_, _, channels) in bakes.items()}
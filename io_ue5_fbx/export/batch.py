@@ -0,0 +1,403 @@
+import bpy
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import tempfile
+import subprocess
+from . import anim, export, textures
+from ..constants import \
+(
+    BlenderTypes,
+    AddonBatch,
+    AddonTextureFormat,
+)
+
+# headless script run by each background Blender process
+WORKER_SCRIPT = os.path.join(os.path.dirname(__file__), 'worker.py')
+
+# prefix of the progress lines printed by the workers
+MARKER = 'io_ue5_fbx:'
+
+# seconds between polls of the workers, when blocking
+POLL_INTERVAL = 0.05
+
+
+def sanitize_file_name(name):
+    '''
+    Replace characters that export_fbx() rejects in a file name
+    '''
+    return re.sub(r'[^A-Za-z0-9_-]', '_', name)
+
+
+def collect_groups(objects, mode):
+    '''
+    Split objects into named groups, one group per exported FBX file
+
+    OBJECT:     each root object, together with its selected descendants,
+                so that an armature and its skinned meshes stay together
+    COLLECTION: the objects of each collection (first collection only)
+    '''
+    groups = {}
+    selected = set(objects)
+
+    match mode:
+        case AddonBatch.OBJECT.name:
+            for obj in objects:
+                # skip objects whose ancestor is also exported
+                parent = obj.parent
+                while (parent is not None and parent not in selected):
+                    parent = parent.parent
+                if (parent is not None):
+                    continue
+                children = [c for c in obj.children_recursive
+                    if c in selected]
+                groups[obj.name] = [obj] + children
+
+        case AddonBatch.COLLECTION.name:
+            for obj in objects:
+                collection = obj.users_collection[0]
+                groups.setdefault(collection.name, []).append(obj)
+
+    return groups
+
+
+def collect_actions(objects):
+    '''
+    One group per action of each armature, {name: (armature, action)}
+    '''
+    groups = {}
+    for arm in objects:
+        if (arm.type != BlenderTypes.ARMATURE):
+            continue
+        for action in anim.armature_actions(arm):
+            groups[f"{arm.name}_{action.name}"] = (arm, action)
+    return groups
+
+
+def estimate_cost(objs, action=None):
+    '''
+    Rough relative cost of exporting objs, used to balance the workers
+    '''
+    scene = bpy.context.scene
+    frames = scene.frame_end - scene.frame_start + 1
+    if (action is not None):
+        start, end = action.frame_range
+        frames = int(end - start) + 1
+    cost = 0
+    for obj in objs:
+        match obj.type:
+            case BlenderTypes.MESH:
+                cost += len(obj.data.vertices)
+            case BlenderTypes.ARMATURE:
+                cost += len(obj.data.bones) * frames
+    return cost
+
+
+def distribute_jobs(jobs, workers):
+    '''
+    Assign jobs to workers, most expensive first, each to the least loaded
+    worker (longest processing time first)
+    '''
+    buckets = [[] for _ in range(min(workers, len(jobs)))]
+    loads = [0] * len(buckets)
+
+    for job in sorted(jobs, key=lambda j: j['cost'], reverse=True):
+        i = loads.index(min(loads))
+        buckets[i].append(job)
+        loads[i] += job['cost']
+
+    return buckets
+
+
+def start_worker(blend_path, job_path, log_path):
+    '''
+    Start one background Blender process over a job file
+    '''
+    cmd = [
+        bpy.app.binary_path,
+        '--background',
+        '--factory-startup',
+        blend_path,
+        '--python-exit-code', '1',
+        '--python', WORKER_SCRIPT,
+        '--', job_path,
+    ]
+
+    with open(log_path, 'w') as log:
+        return subprocess.Popen(cmd, stdout=log, stderr=subprocess.STDOUT)
+
+
+def read_markers(log_path, offset):
+    '''
+    Read the progress lines a worker printed since offset.
+    Returns the new offset and a list of (kind, value)
+    '''
+    if (not os.path.isfile(log_path)):
+        return offset, []
+
+    with open(log_path, 'rb') as f:
+        f.seek(offset)
+        data = f.read()
+
+    # leave an unfinished last line for the next read
+    end = data.rfind(b'\n') + 1
+    markers = []
+    for line in data[:end].decode('utf-8', 'replace').splitlines():
+        if (line.startswith(MARKER)):
+            kind, _, value = line[len(MARKER):].partition(':')
+            markers.append((kind, value))
+
+    return offset + end, markers
+
+
+def export_batch(op, context, **kwargs):
+    '''
+    Run a batch export to completion. See export_batch_stages() for arguments
+
+    Returns a list of results, one per exported file
+    '''
+    stages = export_batch_stages(op, context, **kwargs)
+    while True:
+        try:
+            next(stages)
+        except StopIteration as stop:
+            return stop.value
+        time.sleep(POLL_INTERVAL)
+
+
+def export_batch_stages(op,
+                        context,
+                        mode = AddonBatch.OBJECT.name,
+                        workers = 4,
+                        dir_name = '',
+                        subdir_name = '',
+                        selected_mesh = True,
+                        selected_armature = False,
+                        objects = None,
+                        strict_paths = False,
+                        **settings,
+                        ):
+    """
+    Export the selected objects to one FBX file per object or per collection,
+    spread across a pool of background Blender processes
+
+    Generator. Yields (progress, status) each time the workers are polled.
+    Closing the generator cancels the export: the workers are stopped and
+    their partial files removed
+
+    Keyword arguments:
+
+    op:      Operator. Passed in to get access to the report function
+    context: Context dependent on the area of Blender currently being accessed
+
+    Optional keyword arguments:
+
+    mode:    Batch mode (one file per object, or one file per collection)
+    workers: Number of background Blender processes
+    objects: Objects to export. By default, the selected objects, or else
+             the active object
+    strict_paths: Fail on an invalid directory, rather than fall back to a
+             default with a warning
+
+    The remaining keyword arguments are passed on to export_fbx()
+
+    Returns a list of results, one per exported file (as StopIteration.value)
+    """
+
+    start = time.perf_counter()
+
+    # resolve the destination once, rather than in every worker. Workers
+    # use strict paths, so they would fail on a path the UI falls back from
+    [dir_name, dir_concat] = export.resolve_directories(op,
+        dir_name, subdir_name, strict=strict_paths)
+    subdir_name = os.path.relpath(dir_concat, dir_name)
+
+    # 1.) gather objects of the selected types
+    object_types = set()
+    if (selected_mesh):
+        object_types.add(BlenderTypes.MESH)
+    if (selected_armature):
+        object_types.add(BlenderTypes.ARMATURE)
+
+    # actions are exported with their armature only, without meshes, and
+    # an armature without its baked action is not an animation
+    if (mode == AddonBatch.ACTION.name):
+        object_types = {BlenderTypes.ARMATURE}
+        if (not settings.get('bake_animation', True)):
+            if op: op.report({'WARNING'}, f"One file per action bakes " + \
+                f"animation, although Bake Animation is off")
+            settings['bake_animation'] = True
+
+    if (objects is None):
+        objects = list(context.selected_objects)
+        if (not objects and context.active_object):
+            objects = [context.active_object]
+    objects = [obj for obj in objects if obj.type in object_types]
+
+    if (not objects):
+        if op: op.report({'WARNING'}, f"Nothing to export")
+        return []
+
+    # 2.) one job per exported file
+    if (mode == AddonBatch.ACTION.name):
+        groups = {name: ([arm], action)
+            for name, (arm, action) in collect_actions(objects).items()}
+    else:
+        groups = {name: (objs, None)
+            for name, objs in collect_groups(objects, mode).items()}
+
+    if (not groups):
+        if op: op.report({'WARNING'}, f"Nothing to export")
+        return []
+
+    jobs = []
+    file_names = set()
+    for name, (objs, action) in groups.items():
+
+        # make file names unique after sanitizing
+        file_name = sanitize_file_name(name)
+        stem, i = file_name, 1
+        while (file_name.lower() in file_names):
+            file_name = f"{stem}_{i}"
+            i += 1
+        file_names.add(file_name.lower())
+
+        types = {obj.type for obj in objs}
+        jobs.append({
+            'name': name,
+            'file_name': file_name,
+            'objects': [obj.name for obj in objs],
+            'selected_mesh': BlenderTypes.MESH in types,
+            'selected_armature': BlenderTypes.ARMATURE in types,
+            'action': action.name if action else '',
+            'asset_type': export.asset_type(objs),
+            'cost': estimate_cost(objs, action),
+        })
+
+    # textures are shared between the files. Write them once, here, rather
+    # than from every worker
+    if (settings.get('write_textures')):
+        for status in textures.export_textures_stages(op,
+                objects,
+                os.path.join(dir_concat,
+                    settings.get('texture_subdir', 'Textures')),
+                max_size=settings.get('texture_max_size', 0),
+                file_format=settings.get('texture_format',
+                    AddonTextureFormat.ORIGINAL.name),
+                ):
+            yield (0.0, status)
+        settings['write_textures'] = False
+
+    # 3.) snapshot the current scene, including unsaved changes
+    tmp_dir = tempfile.mkdtemp(prefix='io_ue5_fbx_')
+    blend_path = os.path.join(tmp_dir, 'batch.blend')
+    bpy.ops.wm.save_as_mainfile(filepath=blend_path, copy=True)
+
+    settings = dict(settings,
+        dir_name=dir_name,
+        subdir_name=subdir_name,
+    )
+
+    # 4.) write one job file per worker
+    buckets = distribute_jobs(jobs, workers)
+    job_files = []
+    for i, bucket in enumerate(buckets):
+        job_path = os.path.join(tmp_dir, f"jobs_{i}.json")
+        result_path = os.path.join(tmp_dir, f"result_{i}.json")
+        log_path = os.path.join(tmp_dir, f"worker_{i}.log")
+        with open(job_path, 'w') as f:
+            json.dump({
+                'settings': settings,
+                'jobs': bucket,
+                'result': result_path,
+            }, f)
+        job_files.append((job_path, result_path, log_path, bucket))
+
+    if op: op.report({'DEBUG'}, f"Batch export of {len(jobs)} file(s) " + \
+        f"with {len(buckets)} worker(s)")
+
+    # partial files to remove if the export is cancelled
+    partials = [export.partial_path(os.path.join(dir_concat,
+        job['file_name'] + '.fbx')) for job in jobs]
+
+    # 5.) run the workers, and poll them until all have exited
+    procs = [start_worker(blend_path, jf[0], jf[2]) for jf in job_files]
+    offsets = [0] * len(procs)
+    done = 0
+
+    try:
+        while True:
+            for i, (_, _, log_path, _) in enumerate(job_files):
+                offsets[i], markers = read_markers(log_path, offsets[i])
+                done += sum(kind == 'done' for kind, _ in markers)
+
+            running = sum(proc.poll() is None for proc in procs)
+            yield (done / len(jobs), f"Exported {done} of {len(jobs)} " + \
+                f"file(s), {running} worker(s) running")
+            if (not running):
+                break
+
+    finally:
+        # cancelled, or failed: stop the workers and clean up after them
+        stopped = False
+        for proc in procs:
+            if (proc.poll() is None):
+                proc.terminate()
+                proc.wait()
+                stopped = True
+
+        if (stopped):
+            for path in partials:
+                if (os.path.isfile(path)):
+                    os.remove(path)
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    codes = [proc.returncode for proc in procs]
+
+    # 6.) collect results
+    results = []
+    for (job_path, result_path, log_path, bucket), code in \
+        zip(job_files, codes):
+
+        worker_results = []
+        if (os.path.isfile(result_path)):
+            with open(result_path) as f:
+                worker_results = json.load(f)
+
+        # jobs without a result were lost when the worker crashed
+        done = {r['name'] for r in worker_results}
+        for job in bucket:
+            if (job['name'] not in done):
+                worker_results.append({
+                    'name': job['name'],
+                    'asset_type': job['asset_type'],
+                    'status': 'FAILED',
+                    'filepath': '',
+                    'messages': [f"Worker exited with code {code}"],
+                })
+
+        # keep the log of a failed worker, the temp folder is removed
+        if (code != 0 and os.path.isfile(log_path)):
+            with open(log_path) as f:
+                tail = f.read()[-2000:]
+            print(tail, file=sys.stderr)
+
+        results.extend(worker_results)
+
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    # 7.) summary
+    failed = [r for r in results if r['status'] != 'FINISHED']
+    for r in failed:
+        if op: op.report({'WARNING'}, f"Failed to export {r['name']}: " + \
+            '; '.join(r['messages']))
+
+    elapsed = time.perf_counter() - start
+    if op: op.report({'INFO'}, f"Batch exported " + \
+        f"{len(results) - len(failed)} of {len(results)} file(s) " + \
+        f"with {len(buckets)} worker(s) in {elapsed:.1f}s")
+
+    return results
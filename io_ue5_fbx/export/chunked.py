@@ -0,0 +1,300 @@
+'''
+Bounded-memory geometry for the native writer
+
+Mesh data is read from Blender one array at a time, in its own 32 bit
+precision, and streamed to the file in fixed-size chunks that are
+converted and deflated one at a time. A memory budget caps the arrays held
+at once: a mesh that needs more fails before it is read, instead of
+running the machine out of memory. Meshes can also be split at a vertex
+limit into several pieces, each written as a model and geometry of its own
+'''
+import numpy as np
+from contextlib import contextmanager
+from . import geometry
+from .fbx_writer import name_class
+
+MB = 1 << 20
+
+# chunk size, as a fraction of the budget, within bounds
+CHUNK_FRACTION = 16
+MIN_CHUNK = 1 * MB
+MAX_CHUNK = 64 * MB
+
+# chunk size without a budget
+DEFAULT_CHUNK = 16 * MB
+
+# array: (collection, property, components, dtype)
+MESH_ARRAYS = {
+    'co': ('vertices', 'co', 3, np.float32),
+    'vertex_index': ('loops', 'vertex_index', 1, np.int32),
+    'loop_start': ('polygons', 'loop_start', 1, np.int32),
+    'loop_total': ('polygons', 'loop_total', 1, np.int32),
+    'use_smooth': ('polygons', 'use_smooth', 1, bool),
+    'use_edge_sharp': ('edges', 'use_edge_sharp', 1, bool),
+    'material_index': ('polygons', 'material_index', 1, np.int32),
+}
+
+
+class MemoryBudgetError(MemoryError):
+    '''
+    An export needs more memory than its budget
+    '''
+
+
+class MemoryBudget:
+    '''
+    Accounts for the large arrays held while writing geometry, and records
+    the peak. A limit of 0 only records
+    '''
+
+    def __init__(self, limit_mb=0):
+        self.limit = int(limit_mb * MB)
+        self.chunk_bytes = DEFAULT_CHUNK if not self.limit else \
+            min(max(self.limit // CHUNK_FRACTION, MIN_CHUNK), MAX_CHUNK)
+
+        # a converted chunk and its deflated copy are always held
+        self.held = 2 * self.chunk_bytes
+        self.peak = self.held
+
+
+    def reserve(self, nbytes, label):
+        if (self.limit and self.held + nbytes > self.limit):
+            raise MemoryBudgetError(f"{label} needs {nbytes / MB:.0f} MB, " + \
+                f"{self.held / MB:.0f} MB of the {self.limit / MB:.0f} MB " + \
+                f"memory budget are in use. Raise the budget, or split " + \
+                f"the mesh with a vertex limit")
+        self.held += nbytes
+        self.peak = max(self.peak, self.held)
+
+
+    def release(self, nbytes):
+        self.held -= nbytes
+
+
+    @contextmanager
+    def hold(self, nbytes, label):
+        self.reserve(nbytes, label)
+        try:
+            yield
+        finally:
+            self.release(nbytes)
+
+
+    def chunk(self, dtype):
+        '''
+        Values of dtype per chunk
+        '''
+        return max(1, self.chunk_bytes // np.dtype(dtype).itemsize)
+
+
+    def summary(self):
+        if (not self.limit):
+            return f"Peak geometry memory {self.peak / MB:.0f} MB"
+        return f"Peak geometry memory {self.peak / MB:.0f} MB of the " + \
+            f"{self.limit / MB:.0f} MB budget"
+
+
+class MeshArrays:
+    '''
+    Arrays of one mesh, read on first use and counted against the budget
+    until dropped. With keep set, drop() keeps them for the next piece
+    '''
+
+    def __init__(self, mesh, budget, label, keep=False):
+        self.mesh = mesh
+        self.budget = budget
+        self.label = label
+        self.keep = keep
+        self.arrays = {}
+
+
+    def read(self, key, collection, prop, components, dtype):
+        if (key not in self.arrays):
+            nbytes = len(collection) * components * np.dtype(dtype).itemsize
+            self.budget.reserve(nbytes, f"{self.label} {key}")
+            self.arrays[key] = geometry.get_array(collection, prop,
+                components, dtype)
+        return self.arrays[key]
+
+
+    def get(self, key):
+        [collection, prop, components, dtype] = MESH_ARRAYS[key]
+        return self.read(key, getattr(self.mesh, collection), prop,
+            components, dtype)
+
+
+    def normals(self):
+        mesh = self.mesh
+        if (hasattr(mesh, 'corner_normals')):
+            return self.read('normals', mesh.corner_normals, 'vector', 3,
+                np.float32)
+        mesh.calc_normals_split()
+        return self.read('normals', mesh.loops, 'normal', 3, np.float32)
+
+
+    def uv(self, layer):
+        return self.read(f"uv:{layer.name}", layer.uv, 'vector', 2,
+            np.float32)
+
+
+    def drop(self, *keys, force=False):
+        if (self.keep and not force):
+            return
+        for key in keys:
+            arr = self.arrays.pop(key, None)
+            if (arr is not None):
+                self.budget.release(arr.nbytes)
+
+
+    def clear(self):
+        self.drop(*list(self.arrays), force=True)
+
+
+def write_array(w, budget, name, arr, dtype):
+    '''
+    Stream arr as an array node, converted to dtype a chunk at a time
+    '''
+    w.array_node(name, dtype, arr.size, geometry.iter_chunks(arr.reshape(-1),
+        budget.chunk(dtype), dtype))
+
+
+def write_layer_header(w, element, name, mapping, reference):
+    w.node('Version', 102 if element == 'LayerElementSmoothing' else 101)
+    w.node('Name', name)
+    w.node('MappingInformationType', mapping)
+    w.node('ReferenceInformationType', reference)
+
+
+def write_geometry(w, budget, arrays, geom_id, name, smoothing, materials,
+                   piece=None):
+    '''
+    Write one Geometry node from arrays, for the whole mesh or for the
+    polygons [first, end) of piece, whose vertices are renumbered. Edge
+    smoothing is only written for whole meshes
+    '''
+    mesh = arrays.mesh
+    label = arrays.label
+    layers = []
+
+    loop_start = arrays.get('loop_start')
+    loop_total = arrays.get('loop_total')
+    if (piece is None):
+        [first, end] = [0, len(loop_start)]
+        [loop_first, loop_end] = [0, len(mesh.loops)]
+    else:
+        [first, end] = piece
+        loop_first = int(loop_start[first])
+        loop_end = int(loop_start[end - 1]) + int(loop_total[end - 1])
+    edges = smoothing == 'EDGE' and piece is None
+
+    with w.scope('Geometry', geom_id, name_class(name, 'Geometry'), 'Mesh'):
+        w.node('Properties70')
+        w.node('GeometryVersion', 124)
+
+        # the vertices of a piece are those its polygons use, renumbered
+        vertex_index = arrays.get('vertex_index')[loop_first:loop_end]
+        with budget.hold((end - first) * 8 + (0 if piece is None else
+                (loop_end - loop_first) * 16), f"{label} polygons"):
+            if (piece is None):
+                [used, indices] = [None, vertex_index]
+            else:
+                used, indices = np.unique(vertex_index, return_inverse=True)
+                indices = indices.astype(np.int32)
+
+            # end of polygon marks. In place for whole meshes
+            last = loop_start[first:end] + loop_total[first:end] - 1 - \
+                loop_first
+            indices[last] = -indices[last] - 1
+            del last
+            arrays.drop('loop_start', 'loop_total')
+
+            co = arrays.get('co')
+            if (used is None):
+                write_array(w, budget, 'Vertices', co, np.float64)
+            else:
+                with budget.hold(len(used) * 24, f"{label} piece vertices"):
+                    write_array(w, budget, 'Vertices',
+                        co.reshape(-1, 3)[used], np.float64)
+            arrays.drop('co')
+            write_array(w, budget, 'PolygonVertexIndex', indices, np.int32)
+            arrays.drop('vertex_index')
+            del co, used, indices
+
+        if (edges):
+            with budget.hold(len(mesh.loops) * 16, f"{label} edges"):
+                w.node('Edges', geometry.get_edges(mesh))
+
+        with w.scope('LayerElementNormal', 0):
+            write_layer_header(w, 'LayerElementNormal', '',
+                'ByPolygonVertex', 'Direct')
+            normals = arrays.normals()[3 * loop_first:3 * loop_end]
+            write_array(w, budget, 'Normals', normals, np.float64)
+            arrays.drop('normals')
+        layers.append(('LayerElementNormal', 0))
+
+        if (smoothing in ('FACE', 'EDGE')):
+            with w.scope('LayerElementSmoothing', 0):
+                if (edges):
+                    write_layer_header(w, 'LayerElementSmoothing', '',
+                        'ByEdge', 'Direct')
+                    sharp = arrays.get('use_edge_sharp')
+                    w.array_node('Smoothing', np.int32, len(sharp),
+                        (~chunk for chunk in geometry.iter_chunks(sharp,
+                            budget.chunk(np.int32))))
+                    arrays.drop('use_edge_sharp')
+                else:
+                    write_layer_header(w, 'LayerElementSmoothing', '',
+                        'ByPolygon', 'Direct')
+                    smooth = arrays.get('use_smooth')[first:end]
+                    write_array(w, budget, 'Smoothing', smooth, np.int32)
+                    arrays.drop('use_smooth')
+            layers.append(('LayerElementSmoothing', 0))
+
+        # UVs by polygon vertex, without the sort that deduplicating takes
+        for i, layer in enumerate(mesh.uv_layers):
+            with w.scope('LayerElementUV', i):
+                write_layer_header(w, 'LayerElementUV', layer.name,
+                    'ByPolygonVertex', 'Direct')
+                uv = arrays.uv(layer)[2 * loop_first:2 * loop_end]
+                write_array(w, budget, 'UV', uv, np.float64)
+                arrays.drop(f"uv:{layer.name}")
+            layers.append(('LayerElementUV', i))
+
+        if (materials):
+            indices = arrays.get('material_index')[first:end]
+            same = len(indices) > 0 and (indices == indices[0]).all()
+            with w.scope('LayerElementMaterial', 0):
+                write_layer_header(w, 'LayerElementMaterial', '',
+                    'AllSame' if same else 'ByPolygon', 'IndexToDirect')
+                write_array(w, budget, 'Materials',
+                    indices[:1] if same else indices, np.int32)
+                arrays.drop('material_index')
+            layers.append(('LayerElementMaterial', 0))
+
+        # layer 0 holds one of each element, extra UV maps get their own
+        for index in range(max(i for _, i in layers) + 1):
+            with w.scope('Layer', index):
+                w.node('Version', 100)
+                for element, typed_index in layers:
+                    if (typed_index != index):
+                        continue
+                    with w.scope('LayerElement'):
+                        w.node('Type', element)
+                        w.node('TypedIndex', typed_index)
+
+
+def plan_pieces(mesh, limit, budget, label):
+    '''
+    Polygon ranges of the pieces of a mesh with more than limit vertices,
+    or None if it needs no split
+    '''
+    if (len(mesh.vertices) <= limit or not len(mesh.polygons)):
+        return None
+
+    arrays = MeshArrays(mesh, budget, label)
+    try:
+        pieces = geometry.split_by_vertex_limit(arrays.get('vertex_index'),
+            arrays.get('loop_start'), arrays.get('loop_total'), limit)
+    finally:
+        arrays.clear()
+    return pieces if len(pieces) > 1 else None
@@ -1,75 +1,182 @@
 import bpy
 import os
 import re
-from ..constants import BlenderTypes, AddonUnits, AddonSmoothing
-
-
-def export_fbx(op,
-               context,
-               dir_name = '',
-               subdir_name = '',
-               file_name = '',
-               selected_mesh = True,
-               selected_armature = False,
-               scale = 1,
-               units = AddonUnits.LOCAL.name,
-               smoothing = AddonSmoothing.FACE.name,
-               add_leaf_bones = False,
-               bake_animation = True,
-               ):
-    """
-    Given the incoming UI properties, export the FBX File
+import sqlite3
+from contextlib import nullcontext
+from . import anim, fbx_diff, import_manifest, manifest, native
+from . import project_index, skin, textures, trace
+from ..constants import \
+(
+    BlenderTypes,
+    UnrealTypes,
+    AddonUnits,
+    AddonSmoothing,
+    AddonEngine,
+    AddonTextureFormat,
+)
 
-    Keyword arguments:
 
-    op:      Operator. Passed in to get access to the report function
-    context: Context dependent on the area of Blender currently being accessed
-    
-    Optional keyword arguments:
+def partial_path(filepath):
+    '''
+    Hidden file the FBX is written to before it replaces filepath. Unreal
+    does not pick it up, and a cancelled export never leaves a half-written
+    FBX file behind
+    '''
+    dir_name, base_name = os.path.split(filepath)
+    return os.path.join(dir_name, f".{base_name}.partial")
 
-    dir_name:          Destination project directory
-    subdir_name:       Destination project subdirectory
-    file_name:         File name
-    selected_mesh:     Is a mesh selected?
-    selected_armature: Is an armature selected?
-    scale:             Scale factor
-    units:             Scale units ("All Local" is recommended)
-    smoothing:         Geometry smoothing ("Face" is recommended)
-    add_leaf_bones:    Is the option to add leaf bones unchecked?
-    bake_animation:    Is the option to bake animation checked?
+
+def trace_path(filepath):
+    '''
+    Chrome trace file written next to the FBX file
+    '''
+    return os.path.splitext(filepath)[0] + '.trace.json'
+
+
+def export_scene_fbx(op, context, filepath, objects, **options):
+    '''
+    Export objects with Blender's FBX exporter. The operator exports the
+    selected objects, so objects are passed in as the selection of a context
+    override: the scene's selection is not changed
+
+    options are those of the operator. Defaults are the operator's
+    '''
+    with context.temp_override(selected_objects=list(objects)):
+        return bpy.ops.export_scene.fbx(filepath=filepath,
+                                        use_selection=True,
+                                        **options,
+                                        )
+
+
+def asset_type(objs):
+    '''
+    Unreal asset type that importing the objects creates
+    '''
+    types = {obj.type for obj in objs}
+    if (BlenderTypes.MESH not in types):
+        return UnrealTypes.ANIM_SEQUENCE
+    if (BlenderTypes.ARMATURE in types):
+        return UnrealTypes.SKELETAL_MESH
+    return UnrealTypes.STATIC_MESH
+
+
+def import_entry(context, filepath, directory, objects, settings,
+                 project_dir):
+    '''
+    Import manifest entry of an exported FBX file: the Unreal asset it
+    creates, where, from which armature, and with which options
+    '''
+    armatures = [o for o in objects if o.type == BlenderTypes.ARMATURE]
+    armature = armatures[0] if armatures else None
+    render = context.scene.render
+
+    # an animation exported away from its skeletal mesh imports onto the
+    # skeleton of the mesh the project index last recorded
+    skeleton = {}
+    if (armature is not None and
+            asset_type(objects) == UnrealTypes.ANIM_SEQUENCE):
+        skeleton = import_manifest.indexed_skeleton(project_dir,
+            project_index.entries(project_dir), armature.name,
+            blend=bpy.data.filepath) or {}
+
+    return {
+        'file': os.path.basename(filepath),
+        'name': os.path.splitext(os.path.basename(filepath))[0],
+        'asset_type': asset_type(objects),
+        'destination': import_manifest.game_path(directory),
+        'objects': [obj.name for obj in objects],
+        'armature': armature.name if armature else '',
+        'bones': [b.name for b in armature.data.bones] if armature else [],
+        'skeleton': skeleton,
+        'import': {
+            'scale': settings['global_scale'],
+            'leaf_bones': settings['add_leaf_bones'],
+            'bake_animation': settings['bake_anim'],
+            'action': settings['action'],
+            'smoothing': settings['mesh_smooth_type'],
+            'fps': render.fps / render.fps_base,
+        },
+    }
+
+
+def record_import(op, context, filepath, directory, objects, settings,
+                  project_dir):
+    '''
+    Add an exported FBX file to the import manifest of its directory
+    '''
+    try:
+        import_manifest.record(directory,
+            import_entry(context, filepath, directory, objects, settings,
+                project_dir),
+            source=bpy.data.filepath)
+    except (OSError, sqlite3.Error) as error:
+        if op: op.report({'WARNING'}, f"Could not write the import " + \
+            f"manifest of {os.path.basename(filepath)}: {error}")
+
+
+def default_directory():
+    '''
+    Fallback project directory: C:\\ on Windows, else the home directory
+    '''
+    return 'C:\\' if os.name == 'nt' else os.path.expanduser('~')
+
+
+def resolve_directories(op, dir_name = '', subdir_name = '', strict = False):
     """
+    Validate the destination directory and subdirectory, falling back to
+    defaults with a warning. With strict, an invalid directory or
+    subdirectory raises a ValueError instead
 
-    # -------------------------- Filepath ------------------------ #
+    Returns [directory, directory joined with the subdirectory]
+    """
 
-    default_dir = 'C:\\'
+    default_dir = default_directory()
 
     # 1.) validate directory
     if os.path.isdir(dir_name):
         pass # do nothing, leave the directory name be
     else:
         if not dir_name:
-            if op: op.report({'WARNING'}, f"Empty project directory. " + \
-                f"Defaulting to {default_dir}")
+            message = f"Empty project directory"
         else:
-            if op: op.report({'WARNING'}, f"{dir_name} does not exist. " + \
-                f"Defaulting to {default_dir}")
+            message = f"{dir_name} does not exist"
+        if (strict):
+            raise ValueError(message)
+        if op: op.report({'WARNING'}, f"{message}. " + \
+            f"Defaulting to {default_dir}")
         dir_name = default_dir
 
-    dir_concat = dir_name.strip('\\') + '\\' + subdir_name.strip('\\') + '\\'
+    # either separator, whatever the platform
+    parts = [p for p in re.split(r'[\\/]+', subdir_name or '') if p]
+    dir_concat = os.path.normpath(os.path.join(dir_name, *parts))
     if op: op.report({'DEBUG'}, f"Concat: {dir_concat}")
 
     # 2.) validate subdirectory
     if os.path.isdir(dir_concat):
         pass # do nothing, leave the subdirectory name be
     else:
-        if (subdir_name == '' or subdir_name is None):
-            if op: op.report({'WARNING'}, f"Empty project subdirectory. " + \
-                f"Defaulting to {dir_name}")
-        else:
-            if op: op.report({'WARNING'}, f"{dir_concat} does not exist. " + \
-                f"Defaulting to {dir_name}")
+        message = f"{dir_concat} does not exist"
+        if (strict):
+            raise ValueError(message)
+        if op: op.report({'WARNING'}, f"{message}. " + \
+            f"Defaulting to {dir_name}")
         dir_concat = dir_name
-    
+
+    return [dir_name, dir_concat]
+
+
+def resolve_filepath(op, dir_name = '', subdir_name = '', file_name = '',
+                     strict = False):
+    """
+    Validate the destination directory, subdirectory and file name, falling
+    back to defaults with a warning. See resolve_directories() for strict
+
+    Returns [filepath, directory, file name]
+    """
+
+    [dir_name, dir_concat] = resolve_directories(op, dir_name, subdir_name,
+        strict)
+
     # 3.) validate filename. Default is the Blender filename
     basename = os.path.basename(bpy.context.blend_data.filepath)
     [stem, ext] = os.path.splitext(basename)
@@ -92,6 +199,120 @@ def export_fbx(op,
     # 4.) finally, set the filepath
     filepath = os.path.join(dir_concat, file_name + '.fbx')
 
+    return [filepath, dir_concat, file_name]
+
+
+def export_fbx(op, context, **kwargs):
+    '''
+    Export the FBX file in one go. See export_fbx_stages() for arguments
+
+    Returns the filepath of the exported FBX file
+    '''
+    stages = export_fbx_stages(op, context, **kwargs)
+    while True:
+        try:
+            next(stages)
+        except StopIteration as stop:
+            return stop.value
+
+
+def export_fbx_stages(op,
+                      context,
+                      dir_name = '',
+                      subdir_name = '',
+                      file_name = '',
+                      selected_mesh = True,
+                      selected_armature = False,
+                      scale = 1,
+                      units = AddonUnits.LOCAL.name,
+                      smoothing = AddonSmoothing.FACE.name,
+                      add_leaf_bones = False,
+                      weight_limits = None,
+                      bake_animation = True,
+                      key_tolerance = None,
+                      action = '',
+                      skip_unchanged = False,
+                      engine = AddonEngine.BLENDER.name,
+                      compression = 6,
+                      memory_budget = 0,
+                      vertex_limit = 0,
+                      write_trace = False,
+                      keep_identical = False,
+                      write_textures = False,
+                      texture_subdir = 'Textures',
+                      texture_max_size = 0,
+                      texture_format = AddonTextureFormat.ORIGINAL.name,
+                      write_import_manifest = False,
+                      objects = None,
+                      strict_paths = False,
+                      ):
+    """
+    Given the incoming UI properties, export the FBX File
+
+    Generator. Yields (progress, status) between stages, so that a modal
+    operator can keep the UI responsive. Closing the generator cancels the
+    export and removes the partial file
+
+    Keyword arguments:
+
+    op:      Operator. Passed in to get access to the report function
+    context: Context dependent on the area of Blender currently being accessed
+    
+    Optional keyword arguments:
+
+    dir_name:          Destination project directory
+    subdir_name:       Destination project subdirectory
+    file_name:         File name
+    selected_mesh:     Is a mesh selected?
+    selected_armature: Is an armature selected?
+    scale:             Scale factor
+    units:             Scale units ("All Local" is recommended)
+    smoothing:         Geometry smoothing ("Face" is recommended)
+    add_leaf_bones:    Is the option to add leaf bones unchecked?
+    weight_limits:     (max influences per vertex, weight threshold) of the
+                       skinned meshes, or None to keep every weight
+    bake_animation:    Is the option to bake animation checked?
+    key_tolerance:     (location, rotation, scale) tolerance of baked key
+                       reduction, or None to keep every baked key
+    action:            Name of the only action to export, over its frame
+                       range. By default, the scene's animation is exported
+    skip_unchanged:    Skip the export if the file is already up to date?
+    engine:            FBX writer (Blender's exporter, or the native writer)
+    compression:       zlib level of the native writer (0 = uncompressed)
+    memory_budget:     Memory budget of the native writer's geometry, in MB.
+                       Geometry is streamed in chunks within it (0 = none)
+    vertex_limit:      Split meshes with more vertices into pieces, with the
+                       native writer (0 = never split)
+    write_trace:       Write the timing of each phase to a Chrome trace file
+    keep_identical:    Keep the previous FBX file if the new one only differs
+                       in timestamps and creation metadata
+    write_textures:    Write the images of the meshes' materials
+    texture_subdir:    Texture directory, relative to the FBX file directory
+    texture_max_size:  Largest texture width or height (0 = original size)
+    texture_format:    Texture file format ("Original" keeps each format)
+    write_import_manifest: Add the file to the Unreal import manifest of its
+                       directory, next to the script that imports it
+    objects:           Objects to export. By default, the selected objects,
+                       or else the active object. The selection is never
+                       changed
+    strict_paths:      Fail on an invalid directory, rather than fall back
+                       to a default with a warning. Set by the command line
+                       and the batch workers, where nobody reads warnings
+
+    Returns the filepath of the exported FBX file (as StopIteration.value)
+    """
+
+    timings = trace.Trace()
+
+    # -------------------------- Filepath ------------------------ #
+
+    yield from timings.pause((0.0, "Validating filepath"))
+
+    with timings.phase("Validate path"):
+        [filepath, dir_concat, file_name] = resolve_filepath(op,
+            dir_name, subdir_name, file_name, strict=strict_paths)
+        project_dir = dir_name if os.path.isdir(dir_name) else dir_concat
+
     # -------------------------- Blender ------------------------ #
     
     # set object type
@@ -115,29 +336,203 @@ def export_fbx(op,
     # set smoothing
     mesh_smooth_type = smoothing
 
-    # auto select active object, if nothing is selected
-    if (not context.selected_objects):
-        ao = context.active_object
-        ao.select_set(True)
-        if op: op.report({'WARNING'}, f"Object(s) not selected. " + \
-            f"Defaulting to active object \"{ao.name}\"")
+    with timings.phase("Select objects"):
+        if (objects is None):
+            objects = context.selected_objects
+
+            # default to the active object, if nothing is selected.
+            # The selection itself is left untouched
+            if (not objects and context.active_object):
+                ao = context.active_object
+                objects = [ao]
+                if op: op.report({'WARNING'}, f"Object(s) not selected. " + \
+                    f"Defaulting to active object \"{ao.name}\"")
+
+        objects = [obj for obj in objects if obj.type in object_types]
+
+    # play only this action on the exported armatures
+    override = nullcontext()
+    if (action):
+        if (action not in bpy.data.actions):
+            raise ValueError(f"Action \"{action}\" does not exist")
+        armatures = [o for o in objects if o.type == BlenderTypes.ARMATURE]
+        override = anim.action_override(context.scene, armatures,
+            bpy.data.actions[action])
+
+    # resolved settings that determine the content of the FBX file
+    settings = {
+        'engine': engine,
+        'compression': compression,
+        'memory_budget': memory_budget,
+        'vertex_limit': vertex_limit,
+        'global_scale': global_scale,
+        'apply_scale_options': apply_scale_options,
+        'object_types': sorted(object_types),
+        'mesh_smooth_type': mesh_smooth_type,
+        'add_leaf_bones': add_leaf_bones,
+        'weight_limits': weight_limits,
+        'bake_anim': bake_animation,
+        'key_tolerance': key_tolerance,
+        'action': action,
+    }
+
+    # write the changed textures, before the FBX file that uses them
+    if (write_textures):
+        with timings.phase("Write textures"):
+            for status in textures.export_textures_stages(op,
+                    objects,
+                    os.path.join(dir_concat, texture_subdir),
+                    max_size=texture_max_size,
+                    file_format=texture_format,
+                    ):
+                yield from timings.pause((0.05, status))
+
+    # skip the export if nothing changed since the last export to filepath
+    digest = None
+    if (skip_unchanged):
+        yield from timings.pause((0.05, "Hashing scene data"))
+        with timings.phase("Hash scene"):
+            digest = manifest.hash_export(context, objects, settings)
+
+        if (manifest.is_unchanged(filepath, digest)):
+            if op: op.report({'INFO'},
+                f"{file_name}.fbx is unchanged. Skipped export")
+            if (write_import_manifest):
+                record_import(op, context, filepath, dir_concat, objects,
+                    settings, project_dir)
+            return filepath
 
     if op: op.report({'DEBUG'}, 
         f"Prepare to export {file_name}.fbx to {dir_concat}")
 
-    # execute Blender operation
-    bpy.ops.export_scene.fbx(filepath=filepath,
-                            use_selection=True,
+    # evaluate modifiers and constraints up front, so that the writer's time
+    # does not include them
+    with timings.phase("Evaluate depsgraph"):
+        context.evaluated_depsgraph_get()
+
+    # write to a partial file, which replaces filepath once complete
+    tmp_path = partial_path(filepath)
+    yield from timings.pause((0.1, f"Writing {file_name}.fbx"))
+
+    try:
+        with override, timings.phase("Write FBX"):
+            match engine:
+                case AddonEngine.NATIVE.name:
+                    # stream the FBX file from numpy arrays
+                    for progress in native.write_fbx_stages(op,
+                            context,
+                            tmp_path,
+                            objects,
                             global_scale=global_scale,
-                            apply_unit_scale=True, 
                             apply_scale_options=apply_scale_options,
-                            object_types=object_types,
                             mesh_smooth_type=mesh_smooth_type,
                             add_leaf_bones=add_leaf_bones,
-                            bake_anim = bake_animation,
-                            )
+                            bake_anim=bake_animation,
+                            key_tolerance=key_tolerance,
+                            weight_limits=weight_limits,
+                            memory_budget=memory_budget,
+                            vertex_limit=vertex_limit,
+                            compression=compression,
+                            timings=timings,
+                            ):
+                        yield from timings.pause((0.1 + 0.85 * progress,
+                            f"Writing {file_name}.fbx"))
+                case _:
+                    if (key_tolerance is not None and bake_animation):
+                        if op: op.report({'WARNING'}, f"Key reduction " + \
+                            f"tolerances apply to the native writer only")
+                    if (memory_budget or vertex_limit):
+                        if op: op.report({'WARNING'}, f"The memory " + \
+                            f"budget and vertex limit apply to the native " + \
+                            f"writer only")
+
+                    # limited weights are read from copies of the meshes
+                    limits = nullcontext()
+                    if (weight_limits is not None):
+                        limits = skin.weights_override(objects,
+                            *weight_limits)
+
+                    # Blender's exporter, on the objects only
+                    with limits:
+                        export_scene_fbx(op,
+                                         context,
+                                         tmp_path,
+                                         objects,
+                                         global_scale=global_scale,
+                                         apply_scale_options=apply_scale_options,
+                                         object_types=object_types,
+                                         mesh_smooth_type=mesh_smooth_type,
+                                         add_leaf_bones=add_leaf_bones,
+                                         bake_anim=bake_animation,
+                                         bake_anim_use_all_actions=not action,
+                                         bake_anim_use_nla_strips=not action,
+                                         )
+
+        # hash the file once, for the project index, whichever engine wrote
+        # it
+        with timings.phase("Hash file"):
+            content_hash = project_index.file_hash(tmp_path)
+
+        # keep the previous file if the new one is the same, so that Unreal
+        # does not reimport it
+        identical = False
+        if (keep_identical and os.path.isfile(filepath)):
+            yield from timings.pause((0.93, f"Comparing {file_name}.fbx"))
+            with timings.phase("Compare file"):
+                identical = fbx_diff.is_identical(filepath, tmp_path)
+
+        yield from timings.pause((0.95, f"Saving {file_name}.fbx"))
+        if (identical):
+            if op: op.report({'INFO'}, f"{file_name}.fbx is identical " + \
+                f"to the previous export. Kept the previous file")
+            content_hash = None
+        else:
+            with timings.phase("Flush file"):
+                os.replace(tmp_path, filepath)
+
+    finally:
+        # cancelled, or failed
+        if (os.path.isfile(tmp_path)):
+            os.remove(tmp_path)
+
+    if (skip_unchanged):
+        manifest.record(filepath, digest)
+
+    # record the file in the index of the Unreal project
+    with timings.phase("Index file"):
+        try:
+            project_index.record(project_dir,
+                                 filepath,
+                                 blend=bpy.data.filepath,
+                                 objects=[obj.name for obj in objects],
+                                 asset_type=asset_type(objects),
+                                 settings=settings,
+                                 source_hash=digest,
+                                 content_hash=content_hash,
+                                 duration=timings.total(),
+                                 )
+        except (OSError, sqlite3.Error) as error:
+            if op: op.report({'WARNING'}, f"Could not index " + \
+                f"{file_name}.fbx: {error}")
+
+    # tell Unreal what to import the file as, and onto which skeleton
+    if (write_import_manifest):
+        with timings.phase("Write import manifest"):
+            record_import(op, context, filepath, dir_concat, objects,
+                settings, project_dir)
+
+    # where the time went
+    if op: op.report({'INFO'}, f"Export timings {timings.summary()}")
+    if (write_trace):
+        try:
+            timings.write_chrome_trace(trace_path(filepath),
+                label=f"{file_name}.fbx")
+        except OSError as error:
+            if op: op.report({'WARNING'}, f"Could not write trace: {error}")
 
-    # TODO: handle backslash and forward slash 
-    dir_concat = dir_concat.replace('/', '\\')
     if op: op.report({'INFO'},
             f"Exported {file_name}.fbx to {dir_concat}")
+
+    yield (1.0, f"Exported {file_name}.fbx")
+
+    return filepath
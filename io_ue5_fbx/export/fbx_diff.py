@@ -0,0 +1,255 @@
+'''
+Structural diff of two binary FBX files. Compares node trees, array
+contents within a tolerance and animation curves, ignoring timestamps and
+creation metadata, so that a re-export that is semantically identical to
+the previous file can be detected and the previous file kept
+
+Arrays whose stored bytes are equal are not inflated. Runs outside
+Blender, with NumPy:
+
+    python io_ue5_fbx/export/fbx_diff.py previous.fbx new.fbx
+'''
+import sys
+import argparse
+import numpy as np
+
+if (__package__):
+    from .fbx_reader import FBXReader, FBXReadError, LazyArray
+else:
+    from fbx_reader import FBXReader, FBXReadError, LazyArray
+
+# top level nodes, and nodes of FBXHeaderExtension, that only record when
+# and by what the file was written
+IGNORED_NODES = {
+    'FileId',
+    'CreationTime',
+    'Creator',
+    'CreationTimeStamp',
+    'SceneInfo',
+}
+
+# children compared as a set, regardless of order: object definitions by
+# type and name, and connections
+UNORDERED_NODES = {'Objects', 'Connections'}
+
+# bytes compared at a time, when checking for identical files
+COMPARE_CHUNK = 1 << 24
+
+
+class Differences(Exception):
+    '''
+    Raised to stop comparing once enough differences are found
+    '''
+
+
+class Diff:
+    '''
+    Differences between two files, as readable paths
+    '''
+
+    def __init__(self, rtol=1e-6, atol=1e-6, limit=None):
+        self.rtol = rtol
+        self.atol = atol
+        self.limit = limit
+        self.differences = []
+
+
+    def add(self, path, message):
+        self.differences.append(f"{path}: {message}")
+        if (self.limit is not None and len(self.differences) >= self.limit):
+            raise Differences()
+
+
+    def values_equal(self, a, b):
+        if (isinstance(a, float) and isinstance(b, float)):
+            return abs(a - b) <= self.atol + self.rtol * abs(b)
+        return type(a) is type(b) and a == b
+
+
+    def compare_arrays(self, path, a, b):
+        if (len(a) != len(b)):
+            self.add(path, f"{len(a)} values != {len(b)} values")
+            return
+        if (a.dtype != b.dtype):
+            self.add(path, f"{a.dtype} != {b.dtype}")
+            return
+
+        # identical storage, identical values
+        if (a.encoding == b.encoding and a.size == b.size and
+                same_bytes(a.buf, a.offset, b.buf, b.offset, a.size)):
+            return
+
+        x = a.values()
+        y = b.values()
+        if (x.dtype.kind == 'f'):
+            close = np.isclose(x, y, rtol=self.rtol, atol=self.atol)
+        else:
+            close = x == y
+        if (not close.all()):
+            index = int(np.argmin(close))
+            count = int(close.size - np.count_nonzero(close))
+            self.add(path, f"{count} value(s) differ, first at " + \
+                f"[{index}]: {x[index]} != {y[index]}")
+
+
+    def compare_props(self, path, a, b):
+        if (len(a.props) != len(b.props)):
+            self.add(path, f"{len(a.props)} properties != {len(b.props)}")
+            return
+
+        for i, (x, y) in enumerate(zip(a.props, b.props)):
+            if (isinstance(x, LazyArray) and isinstance(y, LazyArray)):
+                self.compare_arrays(f"{path}[{i}]", x, y)
+            elif (not self.values_equal(x, y)):
+                self.add(f"{path}[{i}]", f"{x!r} != {y!r}")
+
+
+    def compare_nodes(self, path, a, b):
+        self.compare_props(path, a, b)
+        if (a.name in UNORDERED_NODES):
+            self.compare_unordered(path, a.children, b.children)
+        else:
+            self.compare_ordered(path, a.children, b.children)
+
+
+    def compare_ordered(self, path, a_nodes, b_nodes):
+        a_nodes = [n for n in a_nodes if n.name not in IGNORED_NODES]
+        b_nodes = [n for n in b_nodes if n.name not in IGNORED_NODES]
+
+        for i, (a, b) in enumerate(zip(a_nodes, b_nodes)):
+            node_path = f"{path}/{a.name}"
+            if (a.name != b.name):
+                self.add(node_path, f"node {a.name} != {b.name} at {i}")
+                continue
+            if (a.name == 'P' and a.props):
+                node_path = f"{path}/P[{a.props[0]}]"
+            self.compare_nodes(node_path, a, b)
+
+        if (len(a_nodes) != len(b_nodes)):
+            self.add(path, f"{len(a_nodes)} children != {len(b_nodes)}")
+
+
+    def compare_unordered(self, path, a_nodes, b_nodes):
+        '''
+        Match children by name and their first string property (the
+        object name), or all of their properties for connections. Children
+        with the same key, such as unnamed curves, match in order
+        '''
+        a_nodes = self.keyed(a_nodes)
+        b_nodes = self.keyed(b_nodes)
+
+        for key, a in a_nodes.items():
+            b = b_nodes.get(key)
+            label = '/'.join(str(k) for k in key)
+            if (b is None):
+                self.add(f"{path}/{label}", f"only in the first file")
+                continue
+            self.compare_nodes(f"{path}/{label}", a, b)
+
+        for key in b_nodes.keys() - a_nodes.keys():
+            label = '/'.join(str(k) for k in key)
+            self.add(f"{path}/{label}", f"only in the second file")
+
+
+    def keyed(self, nodes):
+        keyed = {}
+        counts = {}
+        for node in nodes:
+            key = self.node_key(node)
+            counts[key] = counts.get(key, 0) + 1
+            keyed[key + (counts[key],)] = node
+        return keyed
+
+
+    def node_key(self, node):
+        if (node.name in ('C', 'Connect')):
+            return (node.name,) + tuple(node.props)
+        names = [p for p in node.props if isinstance(p, str)]
+        return (node.name, names[0].replace('\x00\x01', '::')
+            if names else '')
+
+
+def same_bytes(buf_a, start_a, buf_b, start_b, size):
+    '''
+    Are size bytes of two buffers equal? Compares in place, in chunks
+    '''
+    with memoryview(buf_a) as view_a, memoryview(buf_b) as view_b:
+        for offset in range(0, size, COMPARE_CHUNK):
+            end = min(offset + COMPARE_CHUNK, size)
+            if (view_a[start_a + offset:start_a + end] !=
+                    view_b[start_b + offset:start_b + end]):
+                return False
+    return True
+
+
+def files_equal(a, b):
+    '''
+    Are two open files byte for byte equal?
+    '''
+    if (len(a.buf) != len(b.buf)):
+        return False
+    return same_bytes(a.buf, 0, b.buf, 0, len(a.buf))
+
+
+def diff(path_a, path_b, rtol=1e-6, atol=1e-6, limit=None):
+    '''
+    Differences between two FBX files, as a list of strings. Stops after
+    limit differences, if given
+    '''
+    result = Diff(rtol, atol, limit)
+    with FBXReader(path_a) as a, FBXReader(path_b) as b:
+        if (a.version != b.version):
+            return [f"FBX version {a.version} != {b.version}"]
+        if (files_equal(a, b)):
+            return []
+        try:
+            result.compare_ordered('', a.nodes, b.nodes)
+        except Differences:
+            pass
+    return result.differences
+
+
+def is_identical(path_a, path_b, rtol=1e-6, atol=1e-6):
+    '''
+    Are two FBX files semantically identical? Stops at the first difference
+    '''
+    try:
+        return not diff(path_a, path_b, rtol, atol, limit=1)
+    except (OSError, FBXReadError):
+        return False
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='fbx_diff',
+        description="Compare two binary FBX files, ignoring timestamps " + \
+            "and creation metadata. Exits 0 if they are identical",
+    )
+    parser.add_argument('first', metavar='FBX')
+    parser.add_argument('second', metavar='FBX')
+    parser.add_argument('--rtol', type=float, default=1e-6,
+        help="Relative tolerance of floating point values")
+    parser.add_argument('--atol', type=float, default=1e-6,
+        help="Absolute tolerance of floating point values")
+    parser.add_argument('--limit', type=int, default=50,
+        help="Stop after this many differences")
+    args = parser.parse_args(argv)
+
+    try:
+        differences = diff(args.first, args.second, args.rtol, args.atol,
+            args.limit)
+    except (OSError, FBXReadError) as error:
+        print(error, file=sys.stderr)
+        return 2
+
+    for difference in differences:
+        print(difference)
+    if (differences):
+        print(f"{len(differences)} difference(s)")
+        return 1
+    print("Identical")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
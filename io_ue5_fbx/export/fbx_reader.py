@@ -0,0 +1,447 @@
+'''
+Lazy binary FBX reader, and an inspector built on it, for verifying
+exported files without loading them into Blender
+
+The file is memory-mapped. Nodes are parsed only when walked, properties
+only when read, and arrays only decompressed when their values are asked
+for: counting the vertices of a mesh reads the array header, not the
+array. Runs outside Blender, with NumPy:
+
+    python io_ue5_fbx/export/fbx_reader.py evabot.fbx --expect bones=3
+'''
+import os
+import sys
+import json
+import mmap
+import zlib
+import argparse
+import numpy as np
+from struct import unpack_from, error as StructError
+
+if (__package__):
+    from .fbx_writer import HEAD_MAGIC, FOOT_MAGIC, FBX_VERSION_64
+else:
+    from fbx_writer import HEAD_MAGIC, FOOT_MAGIC, FBX_VERSION_64
+
+# FBX array type code: numpy dtype
+ARRAY_DTYPES = {
+    'b': np.dtype(np.bool_),
+    'i': np.dtype('<i4'),
+    'l': np.dtype('<i8'),
+    'f': np.dtype('<f4'),
+    'd': np.dtype('<f8'),
+}
+
+# FBX scalar type code: (struct format, size)
+SCALAR_FORMATS = {
+    'Y': ('<h', 2),
+    'C': ('<?', 1),
+    'I': ('<i', 4),
+    'F': ('<f', 4),
+    'D': ('<d', 8),
+    'L': ('<q', 8),
+}
+
+
+class FBXReadError(ValueError):
+    '''
+    The file is not a well-formed binary FBX file
+    '''
+
+
+class LazyArray:
+    '''
+    Array property whose data is read and inflated on first use
+    '''
+
+    def __init__(self, buf, offset, dtype, length, encoding, size):
+        self.buf = buf
+        self.offset = offset
+        self.dtype = dtype
+        self.length = length
+        self.encoding = encoding
+        self.size = size          # bytes in the file
+        self.data = None
+
+
+    def __len__(self):
+        return self.length
+
+
+    def __repr__(self):
+        return f"LazyArray({self.dtype}, {self.length})"
+
+
+    def values(self):
+        '''
+        The array, as a read-only numpy array
+        '''
+        if (self.data is None):
+            if (self.encoding not in (0, 1)):
+                raise FBXReadError(f"Unknown array encoding {self.encoding}")
+            raw = self.buf[self.offset:self.offset + self.size]
+            try:
+                if (self.encoding == 1):
+                    raw = zlib.decompress(raw)
+                self.data = np.frombuffer(raw, dtype=self.dtype,
+                    count=self.length)
+            except (zlib.error, ValueError) as error:
+                raise FBXReadError(f"Invalid array of {self.length} " + \
+                    f"values at {self.offset}: {error}")
+        return self.data
+
+
+class Node:
+    '''
+    Node record. Its properties and children are parsed on first access
+    '''
+
+    __slots__ = ('reader', 'name', 'end', 'props_offset', 'props_count',
+        'children_offset', '_props')
+
+    def __init__(self, reader, name, end, props_offset, props_count,
+                 children_offset):
+        self.reader = reader
+        self.name = name
+        self.end = end
+        self.props_offset = props_offset
+        self.props_count = props_count
+        self.children_offset = children_offset
+        self._props = None
+
+
+    def __repr__(self):
+        return f"Node({self.name!r}, {self.props_count} props)"
+
+
+    @property
+    def props(self):
+        if (self._props is None):
+            self._props = self.reader.read_properties(self)
+        return self._props
+
+
+    @property
+    def children(self):
+        '''
+        Child nodes. Generator
+        '''
+        return self.reader.iter_nodes(self.children_offset, self.end)
+
+
+    def find(self, name):
+        '''
+        First child with a name, or None
+        '''
+        return next((c for c in self.children if c.name == name), None)
+
+
+    def find_all(self, name):
+        return [c for c in self.children if c.name == name]
+
+
+class FBXReader:
+    '''
+    Memory-mapped binary FBX file. Use as a context manager
+    '''
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.file = open(filepath, 'rb')
+        try:
+            self.buf = mmap.mmap(self.file.fileno(), 0,
+                access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty file
+            self.file.close()
+            raise FBXReadError(f"{filepath} is empty")
+
+        if (self.buf[:len(HEAD_MAGIC)] != HEAD_MAGIC):
+            self.close()
+            raise FBXReadError(f"{filepath} is not a binary FBX file")
+
+        # a file cut short, such as a partial export, has no footer
+        if (self.buf[-len(FOOT_MAGIC):] != FOOT_MAGIC):
+            self.close()
+            raise FBXReadError(f"{filepath} is truncated")
+
+        [self.version] = unpack_from('<I', self.buf, len(HEAD_MAGIC))
+        self.wide = self.version >= FBX_VERSION_64
+        self.header_format = '<3QB' if self.wide else '<3IB'
+        self.header_size = 25 if self.wide else 13
+        self.start = len(HEAD_MAGIC) + 4
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *args):
+        self.close()
+
+
+    def close(self):
+        self.buf.close()
+        self.file.close()
+
+
+    def read_node(self, offset):
+        '''
+        Node at offset, or None at the end of a node list
+        '''
+        if (offset + self.header_size > len(self.buf)):
+            raise FBXReadError(f"Truncated node record at {offset}")
+
+        [end, count, props_len, name_len] = unpack_from(self.header_format,
+            self.buf, offset)
+        if (end == 0):
+            return None
+        name_offset = offset + self.header_size
+        props_offset = name_offset + name_len
+        if (end > len(self.buf) or props_offset + props_len > end):
+            raise FBXReadError(f"Invalid node record at {offset}")
+
+        try:
+            name = bytes(self.buf[name_offset:props_offset]).decode()
+        except UnicodeDecodeError:
+            raise FBXReadError(f"Invalid node name at {offset}")
+        return Node(self, name, end, props_offset, count,
+            props_offset + props_len)
+
+
+    def iter_nodes(self, offset, end=None):
+        '''
+        Nodes of the list starting at offset. Generator
+        '''
+        end = len(self.buf) if end is None else end
+        while (offset < end):
+            node = self.read_node(offset)
+            if (node is None):
+                return
+            yield node
+            offset = node.end
+
+
+    @property
+    def nodes(self):
+        '''
+        Top level nodes. Generator
+        '''
+        return self.iter_nodes(self.start)
+
+
+    def find(self, name):
+        return next((n for n in self.nodes if n.name == name), None)
+
+
+    def read_properties(self, node):
+        '''
+        Decode the properties of a node. Arrays are returned as LazyArray
+        '''
+        try:
+            return self.decode_properties(node)
+        except (StructError, IndexError) as error:
+            raise FBXReadError(f"Truncated properties of {node.name}: " + \
+                f"{error}")
+
+
+    def decode_properties(self, node):
+        buf = self.buf
+        offset = node.props_offset
+        props = []
+
+        for _ in range(node.props_count):
+            code = chr(buf[offset])
+            offset += 1
+
+            if (code in SCALAR_FORMATS):
+                [fmt, size] = SCALAR_FORMATS[code]
+                props.append(unpack_from(fmt, buf, offset)[0])
+                offset += size
+            elif (code in ARRAY_DTYPES):
+                [length, encoding, size] = unpack_from('<3I', buf, offset)
+                offset += 12
+                props.append(LazyArray(buf, offset, ARRAY_DTYPES[code],
+                    length, encoding, size))
+                offset += size
+            elif (code in 'SR'):
+                [size] = unpack_from('<I', buf, offset)
+                offset += 4
+                data = bytes(buf[offset:offset + size])
+                props.append(data.decode('utf-8', 'replace')
+                    if code == 'S' else data)
+                offset += size
+            else:
+                raise FBXReadError(f"Unknown property type {code!r} " + \
+                    f"in {node.name}")
+
+        # the properties, arrays included, end where the children start
+        if (offset > node.children_offset):
+            raise FBXReadError(f"Properties of {node.name} overrun its " + \
+                f"record")
+
+        return props
+
+
+def split_name(name):
+    '''
+    'Name\\x00\\x01Class' to 'Name'
+    '''
+    return name.split('\x00\x01')[0]
+
+
+def inspect(filepath, deep=False):
+    '''
+    Summary of an FBX file: object, vertex, bone, take and key counts
+
+    Counts come from array headers; only deep inspection inflates arrays,
+    to count polygons
+    '''
+    with FBXReader(filepath) as reader:
+        summary = {
+            'file': filepath,
+            'size': os.path.getsize(filepath),
+            'version': reader.version,
+            'creator': '',
+            'objects': {},
+            'models': {},
+            'meshes': 0,
+            'vertices': 0,
+            'polygon_vertices': 0,
+            'bones': 0,
+            'curves': 0,
+            'keys': 0,
+            'takes': [],
+        }
+        if (deep):
+            summary['polygons'] = 0
+
+        for node in reader.nodes:
+            match node.name:
+                case 'Creator':
+                    summary['creator'] = node.props[0]
+
+                case 'Objects':
+                    for obj in node.children:
+                        objects = summary['objects']
+                        objects[obj.name] = objects.get(obj.name, 0) + 1
+                        inspect_object(summary, obj, deep)
+
+                case 'Takes':
+                    summary['takes'] = [split_name(t.props[0])
+                        for t in node.find_all('Take')]
+
+        return summary
+
+
+def inspect_object(summary, obj, deep):
+    match obj.name:
+        case 'Model':
+            cls = obj.props[2]
+            models = summary['models']
+            models[cls] = models.get(cls, 0) + 1
+            if (cls == 'LimbNode'):
+                summary['bones'] += 1
+
+        case 'Geometry':
+            if (obj.props[2] != 'Mesh'):
+                return
+            summary['meshes'] += 1
+            vertices = obj.find('Vertices')
+            if (vertices is not None):
+                summary['vertices'] += len(vertices.props[0]) // 3
+            indices = obj.find('PolygonVertexIndex')
+            if (indices is not None):
+                summary['polygon_vertices'] += len(indices.props[0])
+                if (deep):
+                    summary['polygons'] += int(
+                        np.count_nonzero(indices.props[0].values() < 0))
+
+        case 'AnimationCurve':
+            summary['curves'] += 1
+            times = obj.find('KeyTime')
+            if (times is not None):
+                summary['keys'] += len(times.props[0])
+
+
+def parse_expectation(text):
+    [key, _, value] = text.partition('=')
+    if (not value):
+        raise argparse.ArgumentTypeError(f"Expected KEY=VALUE, got {text}")
+    return key, value
+
+
+def check(summary, expectations):
+    '''
+    Compare summary values to KEY=VALUE expectations. A key of the objects
+    or models counts, such as Model or LimbNode, is looked up there too.
+    Returns a list of failures
+    '''
+    failures = []
+    for key, expected in expectations:
+        if (key in summary):
+            actual = summary[key]
+        elif (key in summary['objects']):
+            actual = summary['objects'][key]
+        else:
+            actual = summary['models'].get(key, 0)
+
+        if (isinstance(actual, list)):
+            ok = expected in actual
+        else:
+            ok = str(actual) == expected
+        if (not ok):
+            failures.append(f"{key}: expected {expected}, got {actual}")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='fbx_reader',
+        description="Inspect binary FBX files without loading them " + \
+            "into Blender",
+    )
+    parser.add_argument('files', nargs='+', metavar='FBX')
+    parser.add_argument('--deep', action='store_true',
+        help="Also inflate index arrays, to count polygons")
+    parser.add_argument('--expect', action='append', default=[],
+        type=parse_expectation, metavar='KEY=VALUE',
+        help="Fail unless a count matches. Repeatable, e.g. " + \
+            "--expect bones=3 --expect meshes=1")
+    parser.add_argument('--json', action='store_true',
+        help="Print the summaries as JSON")
+    args = parser.parse_args(argv)
+
+    code = 0
+    summaries = []
+    for filepath in args.files:
+        try:
+            summary = inspect(filepath, deep=args.deep)
+        except (OSError, FBXReadError) as error:
+            print(f"{filepath}: {error}", file=sys.stderr)
+            code = 1
+            continue
+
+        failures = check(summary, args.expect)
+        summary['failures'] = failures
+        summaries.append(summary)
+        if (failures):
+            code = 1
+
+        if (not args.json):
+            print(f"{filepath}: FBX {summary['version']}, " + \
+                f"{summary['meshes']} mesh(es), " + \
+                f"{summary['vertices']} vertices, " + \
+                f"{summary['bones']} bone(s), " + \
+                f"{len(summary['takes'])} take(s), " + \
+                f"{summary['keys']} key(s)")
+            for failure in failures:
+                print(f"  FAILED {failure}")
+
+    if (args.json):
+        print(json.dumps(summaries, indent=4))
+    return code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
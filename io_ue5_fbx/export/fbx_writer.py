@@ -0,0 +1,469 @@
+import zlib
+import numpy as np
+from struct import pack
+from collections import deque
+from concurrent.futures import Future
+
+# binary FBX 7.5, whose 64 bit record offsets allow files over 4 GB. 7.4
+# and earlier have 32 bit offsets
+FBX_VERSION = 7500
+FBX_VERSION_64 = 7500
+
+HEAD_MAGIC = b'Kaydara FBX Binary\x20\x20\x00\x1a\x00'
+
+# the FBX SDK validates the footer against the creation time, so write files
+# at a fixed time, with the matching ids
+TIME_ID = '1970-01-01 10:00:00:000'
+FILE_ID = b'\x28\xb3\x2a\xeb\xb6\x24\xcc\xc2\xbf\xc8\xb0\x2a\xa9\x2b\xfc\xf1'
+FOOT_ID = b'\xfa\xbc\xab\x09\xd0\xc8\xd4\x66\xb1\x76\xfb\x83\x1c\xf7\x26\x7e'
+FOOT_MAGIC = b'\xf8\x5a\x8c\x6a\xde\xf5\xd9\x7e\xec\xe9\x0c\xe3\x75\x8f\x29\x0b'
+
+# end of a nested node list: a null record header, of 13 bytes with 32 bit
+# offsets and 25 bytes with 64 bit offsets
+BLOCK_SENTINEL = b'\x00' * 13
+BLOCK_SENTINEL_64 = b'\x00' * 25
+
+# largest array stored in a file: arrays record their size in 32 bits, in
+# every version
+MAX_ARRAY_BYTES = 0xFFFFFFFF
+
+# arrays smaller than this are not worth deflating
+COMPRESS_MIN_SIZE = 128
+
+# numpy dtype: FBX array type code
+ARRAY_TYPES = {
+    np.dtype(np.bool_): b'b',
+    np.dtype(np.int32): b'i',
+    np.dtype(np.int64): b'l',
+    np.dtype(np.float32): b'f',
+    np.dtype(np.float64): b'd',
+}
+
+
+class Int16(int):
+    '''
+    Force an int16 ('Y') property
+    '''
+
+
+class Int64(int):
+    '''
+    Force an int64 ('L') property, e.g. object ids and FBX times
+    '''
+
+
+class Float32(float):
+    '''
+    Force a float32 ('F') property
+    '''
+
+
+def encode_property(value):
+    '''
+    Encode one scalar node property. Returns bytes
+    '''
+    match value:
+        case bool():
+            return b'C' + pack('<?', value)
+        case Int16():
+            return b'Y' + pack('<h', value)
+        case Int64():
+            return b'L' + pack('<q', value)
+        case int():
+            return b'I' + pack('<i', value)
+        case Float32():
+            return b'F' + pack('<f', value)
+        case float():
+            return b'D' + pack('<d', value)
+        case str():
+            data = value.encode('utf-8')
+            return b'S' + pack('<I', len(data)) + data
+        case bytes():
+            return b'R' + pack('<I', len(value)) + value
+    raise TypeError(f"Unsupported FBX property {value!r}")
+
+
+def encode_array(arr, level=zlib.Z_DEFAULT_COMPRESSION):
+    '''
+    Encode the header and data of an array property. Returns a list of
+    buffers, so that large arrays are written without copying
+    '''
+    arr = np.ascontiguousarray(arr)
+    code = ARRAY_TYPES.get(arr.dtype)
+    if (code is None):
+        raise TypeError(f"Unsupported FBX array type {arr.dtype}")
+
+    data = memoryview(arr).cast('B')
+    encoding = 0
+    if (level != 0 and data.nbytes >= COMPRESS_MIN_SIZE):
+        data = zlib.compress(data, level)
+        encoding = 1
+    if (len(data) > MAX_ARRAY_BYTES):
+        raise ValueError(f"Array of {arr.size} values is too large for " + \
+            f"an FBX file. Split the mesh with a vertex limit")
+
+    head = code + pack('<3I', arr.size, encoding, len(data))
+    return [head, data]
+
+
+def name_class(name, cls):
+    '''
+    Object name as stored in the file: 'Name\\x00\\x01Class'
+    '''
+    return f"{name}\x00\x01{cls}"
+
+
+class FBXWriter:
+    '''
+    Streaming binary FBX writer
+
+    Nodes are written to the file as soon as they are opened, and their end
+    offset is patched when they are closed, so the document never exists as
+    a tree of Python objects. Array properties are numpy arrays, written
+    straight from their buffers.
+
+    With a thread pool, large arrays are deflated on the pool while the
+    caller keeps extracting data. Output is queued in order and written as
+    soon as the compressed blocks in front of it are ready. At most
+    max_pending blocks are in flight, which bounds memory.
+
+    Record offsets are 64 bit from version 7500 on, and 32 bit before.
+    '''
+
+    def __init__(self, f, version=FBX_VERSION,
+                 level=zlib.Z_DEFAULT_COMPRESSION, pool=None, max_pending=16):
+        self.f = f
+        self.version = version
+
+        # record header: end offset, property count, property length, and
+        # name length
+        wide = version >= FBX_VERSION_64
+        self.header_format = '<3QB' if wide else '<3IB'
+        self.offset_format = '<Q' if wide else '<I'
+        self.offset_size = 8 if wide else 4
+        self.sentinel = BLOCK_SENTINEL_64 if wide else BLOCK_SENTINEL
+        self.level = level
+        self.pool = pool
+        self.max_pending = max_pending
+
+        # open nodes: [offset of the record header, has children, no props]
+        self.stack = []
+
+        # queued output: buffers, futures of buffers, and offset marks
+        self.queue = deque()
+        self.in_flight = 0
+
+        f.write(HEAD_MAGIC)
+        f.write(pack('<I', version))
+
+
+    # ---------------------------- Queue ----------------------------- #
+
+
+    def emit(self, item):
+        '''
+        Queue a buffer, a future or a mark, then write what is ready
+        '''
+        self.queue.append(item)
+        if (isinstance(item, Future)):
+            self.in_flight += 1
+        self.flush(block=self.in_flight > self.max_pending)
+
+
+    def flush(self, block=False):
+        '''
+        Write queued output in order. Stops at the first unfinished future,
+        unless block is set, which waits until in-flight blocks are back
+        under the limit
+        '''
+        f = self.f
+        queue = self.queue
+
+        while (queue):
+            item = queue[0]
+
+            if (isinstance(item, Future)):
+                if (not item.done() and
+                    not (block and self.in_flight > self.max_pending)):
+                    break
+                for b in item.result():
+                    f.write(b)
+                self.in_flight -= 1
+
+            elif (isinstance(item, Mark)):
+                item.resolve(f, self.offset_format)
+
+            else:
+                f.write(item)
+
+            queue.popleft()
+
+
+    def encode_properties(self, props):
+        '''
+        Encode a node's property list. Returns a list of buffers and futures
+        '''
+        items = []
+        for value in props:
+            if (not isinstance(value, np.ndarray)):
+                items.append(encode_property(value))
+            elif (self.pool is not None and self.level != 0 and
+                  value.nbytes >= COMPRESS_MIN_SIZE):
+                # zlib releases the GIL, so blocks deflate in parallel
+                value = np.ascontiguousarray(value)
+                items.append(self.pool.submit(encode_array, value,
+                    self.level))
+            else:
+                items.extend(encode_array(value, self.level))
+        return items
+
+
+    # ---------------------------- Nodes ----------------------------- #
+
+
+    def begin(self, name, *props):
+        '''
+        Open a node. Children are written until the matching end()
+        '''
+        if (self.stack):
+            self.stack[-1][1] = True
+
+        items = self.encode_properties(props)
+        deferred = any(isinstance(i, Future) for i in items)
+
+        # the length of deflated properties is patched once they are written
+        props_len = 0 if deferred else sum(
+            len(i) if isinstance(i, bytes) else i.nbytes for i in items)
+
+        name = name.encode('ascii')
+        begin = Mark()
+
+        # end offset is patched in end()
+        self.emit(begin)
+        self.emit(pack(self.header_format, 0, len(props), props_len,
+            len(name)) + name)
+        for item in items:
+            self.emit(item)
+        if (deferred):
+            self.emit(self.props_len_mark(begin, name))
+
+        self.stack.append([begin, False, not props])
+
+
+    def end(self):
+        '''
+        Close the last opened node
+        '''
+        begin, has_children, no_props = self.stack.pop()
+
+        # nodes without properties also end with a sentinel
+        if (has_children or no_props):
+            self.emit(self.sentinel)
+
+        self.emit(Mark(begin, 0))
+
+
+    def node(self, name, *props):
+        '''
+        Write a node without children
+        '''
+        self.begin(name, *props)
+        self.end()
+
+
+    def props_len_mark(self, begin, name):
+        '''
+        Mark patching the property length of the node opened at begin, with
+        the length written since its name
+        '''
+        size = self.offset_size
+        return Mark(begin, 2 * size, begin, 3 * size + 1 + len(name))
+
+
+    def array_node(self, name, dtype, length, chunks):
+        '''
+        Write a node without children, with one array property of length
+        values, given as an iterable of numpy chunks. Chunks are converted
+        and deflated one at a time, so that the array is never held whole.
+        The queued output is written first, and the array is not deflated
+        on the pool
+        '''
+        if (self.stack):
+            self.stack[-1][1] = True
+
+        dtype = np.dtype(dtype)
+        code = ARRAY_TYPES.get(dtype)
+        if (code is None):
+            raise TypeError(f"Unsupported FBX array type {dtype}")
+        if (self.level == 0 and length * dtype.itemsize > MAX_ARRAY_BYTES):
+            raise ValueError(f"{name}: {length} values are too large " + \
+                f"for an FBX array. Split the mesh with a vertex limit")
+
+        name = name.encode('ascii')
+        begin = Mark()
+        self.emit(begin)
+        self.emit(pack(self.header_format, 0, 1, 0, len(name)) + name)
+        self.drain()
+
+        # the encoding and deflated size are patched after the data
+        f = self.f
+        head = f.tell()
+        f.write(code + pack('<3I', length, 0, 0))
+
+        deflate = self.level != 0 and \
+            length * dtype.itemsize >= COMPRESS_MIN_SIZE
+        z = zlib.compressobj(self.level) if deflate else None
+        count = size = 0
+        for chunk in chunks:
+            chunk = np.ascontiguousarray(chunk, dtype=dtype)
+            count += chunk.size
+            data = memoryview(chunk).cast('B')
+            if (z is not None):
+                data = z.compress(data)
+            f.write(data)
+            size += len(data)
+        if (z is not None):
+            data = z.flush()
+            f.write(data)
+            size += len(data)
+
+        if (count != length):
+            raise ValueError(f"{name.decode()}: wrote {count} of " + \
+                f"{length} values")
+        if (size > MAX_ARRAY_BYTES):
+            raise ValueError(f"{name.decode()}: {length} values are too " + \
+                f"large for an FBX array. Split the mesh with a vertex limit")
+
+        pos = f.tell()
+        f.seek(head + 5)
+        f.write(pack('<2I', 1 if deflate else 0, size))
+        f.seek(pos)
+
+        self.emit(self.props_len_mark(begin, name))
+        self.stack.append([begin, False, False])
+        self.end()
+
+
+    def scope(self, name, *props):
+        '''
+        Context manager for a node with children
+        '''
+        return NodeScope(self, name, props)
+
+
+    def drain(self):
+        '''
+        Write all queued output, waiting for in-flight blocks
+        '''
+        max_pending, self.max_pending = self.max_pending, 0
+        self.flush(block=True)
+        self.max_pending = max_pending
+
+
+    def close(self):
+        '''
+        Write the final sentinel and the footer
+        '''
+        while (self.stack):
+            self.end()
+
+        self.drain()
+
+        f = self.f
+        f.write(self.sentinel)
+        f.write(FOOT_ID)
+        f.write(b'\x00' * 4)
+
+        # align to 16 bytes. A full 16 bytes if already aligned
+        ofs = f.tell()
+        pad = ((ofs + 15) & ~15) - ofs
+        f.write(b'\x00' * (pad or 16))
+
+        f.write(pack('<I', self.version))
+        f.write(b'\x00' * 120)
+        f.write(FOOT_MAGIC)
+
+
+class Mark:
+    '''
+    A position in the queued output
+
+    Without a target, records the file offset it is written at. With a
+    target, patches the offset at (target offset + field), packed as fmt,
+    with the current offset, minus the offset of (base + base_field) if given
+    '''
+
+    def __init__(self, target=None, field=0, base=None, base_field=0):
+        self.offset = None
+        self.target = target
+        self.field = field
+        self.base = base
+        self.base_field = base_field
+
+
+    def resolve(self, f, fmt='<I'):
+        pos = f.tell()
+        if (self.target is None):
+            self.offset = pos
+            return
+
+        value = pos
+        if (self.base is not None):
+            value -= self.base.offset + self.base_field
+
+        f.seek(self.target.offset + self.field)
+        f.write(pack(fmt, value))
+        f.seek(pos)
+
+
+class NodeScope:
+
+    def __init__(self, writer, name, props):
+        self.writer = writer
+        self.name = name
+        self.props = props
+
+
+    def __enter__(self):
+        self.writer.begin(self.name, *self.props)
+        return self.writer
+
+
+    def __exit__(self, *args):
+        self.writer.end()
+
+
+# ------------------------- Properties70 ------------------------- #
+
+
+def p_bool(w, name, value):
+    w.node('P', name, 'bool', '', '', int(value))
+
+
+def p_int(w, name, value):
+    w.node('P', name, 'int', 'Integer', '', value)
+
+
+def p_enum(w, name, value):
+    w.node('P', name, 'enum', '', '', value)
+
+
+def p_double(w, name, value):
+    w.node('P', name, 'double', 'Number', '', float(value))
+
+
+def p_ktime(w, name, value):
+    w.node('P', name, 'KTime', 'Time', '', Int64(value))
+
+
+def p_string(w, name, value):
+    w.node('P', name, 'KString', '', '', value)
+
+
+def p_color(w, name, value):
+    w.node('P', name, 'ColorRGB', 'Color', '', *(float(v) for v in value))
+
+
+def p_vector(w, name, value, animatable=True):
+    flags = 'A' if animatable else ''
+    w.node('P', name, name, '', flags, *(float(v) for v in value))
@@ -0,0 +1,306 @@
+'''
+Bulk extraction of mesh and armature data into numpy arrays with
+foreach_get, instead of per-element Python access
+'''
+import numpy as np
+
+
+def get_array(collection, prop, components, dtype):
+    '''
+    Read one property of every item in a bpy collection. Returns a flat array
+    '''
+    arr = np.empty(len(collection) * components, dtype=dtype)
+    collection.foreach_get(prop, arr)
+    return arr
+
+
+def get_vertices(mesh):
+    '''
+    Vertex positions, flat float64 (x, y, z, ...)
+    '''
+    return get_array(mesh.vertices, 'co', 3, np.float32).astype(np.float64)
+
+
+def get_polygon_vertex_index(mesh):
+    '''
+    Polygon vertex indices. The last index of each polygon is stored as
+    (-index - 1) to mark the end of the polygon
+    '''
+    indices = get_array(mesh.loops, 'vertex_index', 1, np.int32)
+    loop_start = get_array(mesh.polygons, 'loop_start', 1, np.int32)
+    loop_total = get_array(mesh.polygons, 'loop_total', 1, np.int32)
+
+    last = loop_start + loop_total - 1
+    indices[last] = -indices[last] - 1
+    return indices
+
+
+def get_edges(mesh):
+    '''
+    FBX edges, as the index of the first polygon vertex using each edge
+    '''
+    edge_index = get_array(mesh.loops, 'edge_index', 1, np.int32)
+    edges, first = np.unique(edge_index, return_index=True)
+
+    # loose edges are not part of any polygon
+    result = np.full(len(mesh.edges), -1, dtype=np.int32)
+    result[edges] = first
+    return result
+
+
+def get_normals(mesh):
+    '''
+    Normals by polygon vertex, flat float64
+    '''
+    if (hasattr(mesh, 'corner_normals')):
+        normals = get_array(mesh.corner_normals, 'vector', 3, np.float32)
+    else:
+        mesh.calc_normals_split()
+        normals = get_array(mesh.loops, 'normal', 3, np.float32)
+    return normals.astype(np.float64)
+
+
+def get_face_smoothing(mesh):
+    '''
+    Smoothing by polygon (1 = smooth)
+    '''
+    smooth = get_array(mesh.polygons, 'use_smooth', 1, bool)
+    return smooth.astype(np.int32)
+
+
+def get_edge_smoothing(mesh):
+    '''
+    Smoothing by edge (1 = smooth)
+    '''
+    sharp = get_array(mesh.edges, 'use_edge_sharp', 1, bool)
+    return (~sharp).astype(np.int32)
+
+
+def get_uvs(mesh):
+    '''
+    One (name, uv, uv_index) tuple per UV map. UVs are deduplicated, and
+    uv_index maps each polygon vertex to its UV
+    '''
+    uvs = []
+    for layer in mesh.uv_layers:
+        uv = get_array(layer.uv, 'vector', 2, np.float32)
+
+        # view each float32 pair as one int64 to dedupe in one pass
+        keys = uv.view(np.int64)
+        unique, index = np.unique(keys, return_inverse=True)
+        unique_uv = unique.view(np.float32).astype(np.float64)
+
+        uvs.append((layer.name, unique_uv, index.astype(np.int32)))
+    return uvs
+
+
+def get_material_indices(mesh):
+    '''
+    Material index by polygon
+    '''
+    return get_array(mesh.polygons, 'material_index', 1, np.int32)
+
+
+def get_skin_weights(mesh):
+    '''
+    Skin weights as flat (vertex, group, weight) arrays
+
+    Vertex group weights are not exposed to foreach_get, so this is the one
+    per-vertex loop. Everything downstream of it is vectorized.
+    '''
+    counts = np.fromiter((len(v.groups) for v in mesh.vertices),
+        dtype=np.int32, count=len(mesh.vertices))
+    total = int(counts.sum())
+
+    vertices = np.repeat(np.arange(len(counts), dtype=np.int32), counts)
+    groups = np.fromiter((g.group for v in mesh.vertices for g in v.groups),
+        dtype=np.int32, count=total)
+    weights = np.fromiter((g.weight for v in mesh.vertices for g in v.groups),
+        dtype=np.float64, count=total)
+
+    return vertices, groups, weights
+
+
+def group_weights_by_bone(vertices, groups, weights, group_names, bone_names):
+    '''
+    Split skin weights into one (indices, weights) pair per bone. Groups that
+    do not match a bone are dropped
+    '''
+    clusters = {}
+    if (len(groups) == 0):
+        return clusters
+
+    # sort once by group, then slice
+    order = np.argsort(groups, kind='stable')
+    groups = groups[order]
+    bounds = np.flatnonzero(np.diff(groups)) + 1
+    starts = np.concatenate(([0], bounds))
+    ends = np.concatenate((bounds, [len(groups)]))
+
+    for start, end in zip(starts, ends):
+        name = group_names[groups[start]]
+        if (name not in bone_names):
+            continue
+        idx = order[start:end]
+        clusters[name] = (vertices[idx], weights[idx])
+
+    return clusters
+
+
+def limit_skin_weights(vertices, groups, weights, deform, max_influences = 0,
+                       threshold = 0.0):
+    '''
+    Keep the max_influences largest weights of each vertex (0 keeps all),
+    drop those below threshold, and renormalize the kept weights to sum
+    to 1. The largest weight of a vertex is always kept
+
+    deform is a bool per group index, True for groups that deform a bone.
+    Weights of other groups are kept as they are
+
+    Returns (keep, weights): a bool mask over the input, and the new weights
+    '''
+    keep = np.ones(len(groups), dtype=bool)
+    weights = weights.copy()
+    if (len(groups) == 0):
+        return keep, weights
+
+    idx = np.flatnonzero(deform[groups])
+    if (len(idx) == 0):
+        return keep, weights
+
+    # rank each influence within its vertex, largest first
+    order = idx[np.lexsort((-weights[idx], vertices[idx]))]
+    v = vertices[order]
+    rank = np.arange(len(order)) - np.searchsorted(v, v, side='left')
+
+    kept = weights[order] >= threshold
+    if (max_influences > 0):
+        kept &= rank < max_influences
+    kept |= rank == 0
+    keep[order[~kept]] = False
+
+    # renormalize what is left of each vertex
+    order = order[kept]
+    sums = np.bincount(vertices[order], weights=weights[order])
+    total = sums[vertices[order]]
+    weights[order] = np.divide(weights[order], total,
+        out=np.zeros_like(total), where=total > 0)
+
+    return keep, weights
+
+
+def iter_chunks(arr, size, dtype=None):
+    '''
+    Slices of arr of at most size values, each converted to dtype on its
+    own. Generator
+    '''
+    for start in range(0, len(arr), size):
+        chunk = arr[start:start + size]
+        yield chunk if dtype is None else chunk.astype(dtype)
+
+
+def split_by_vertex_limit(loop_vertices, loop_start, loop_total, limit):
+    '''
+    Split polygons into consecutive ranges that each use at most limit
+    vertices. A polygon with more vertices than limit gets a range of its
+    own. Returns a list of (first polygon, end polygon)
+
+    Vertices are counted in a window of loops that grows until it holds
+    more than limit vertices, so memory follows the size of a piece, not
+    of the mesh
+    '''
+    ends = loop_start.astype(np.int64) + loop_total
+    count_polygons = len(loop_start)
+    count_loops = len(loop_vertices)
+    window = 4 * limit
+    pieces = []
+
+    first = 0
+    while (first < count_polygons):
+        start = int(loop_start[first])
+        while True:
+            stop = min(start + window, count_loops)
+            _, index = np.unique(loop_vertices[start:stop], return_index=True)
+            is_new = np.zeros(stop - start, dtype=np.int32)
+            is_new[index] = 1
+            used = np.cumsum(is_new)
+            if (used[-1] > limit or stop == count_loops):
+                break
+            window *= 2
+
+        # the last polygon ending in the window within the limit
+        last = int(np.searchsorted(ends, stop, side='right'))
+        fits = int(np.searchsorted(used[ends[first:last] - start - 1],
+            limit, side='right'))
+        end = first + max(fits, 1)
+        pieces.append((first, end))
+        first = end
+
+    return pieces
+
+
+def get_bone_matrices(bones, prop='matrix_local'):
+    '''
+    4x4 matrices of every bone, as an (n, 4, 4) array in row major order
+    '''
+    arr = get_array(bones, prop, 16, np.float32).astype(np.float64)
+
+    # foreach_get returns matrices column major
+    return arr.reshape(-1, 4, 4).transpose(0, 2, 1)
+
+
+def get_parent_indices(bones):
+    '''
+    Index of the parent of every bone, -1 for root bones
+    '''
+    return np.array([bones.find(b.parent.name) if b.parent else -1
+        for b in bones], dtype=np.int64)
+
+
+def parent_relative_matrices(mats, parents):
+    '''
+    Matrices of (..., n, 4, 4) bones relative to their parent bone. Root
+    bones are left as is. Leading axes, such as frames, are batched
+    '''
+    has_parent = parents >= 0
+    local = mats.copy()
+    local[..., has_parent, :, :] = \
+        np.linalg.inv(mats[..., parents[has_parent], :, :]) @ \
+        mats[..., has_parent, :, :]
+    return local
+
+
+def decompose_matrices(mats):
+    '''
+    Decompose (n, 4, 4) matrices into FBX local transforms. Returns
+    (translation, rotation, scale) as (n, 3) arrays, with rotation as XYZ
+    euler angles in degrees
+    '''
+    translation = mats[:, :3, 3]
+    basis = mats[:, :3, :3]
+
+    scale = np.linalg.norm(basis, axis=1)
+    # a negative determinant flips the x axis
+    flip = np.linalg.det(basis) < 0
+    scale[flip, 0] *= -1
+    scale_safe = np.where(np.abs(scale) < 1e-12, 1.0, scale)
+    rot = basis / scale_safe[:, np.newaxis, :]
+
+    # R = Rz @ Ry @ Rx
+    cy = np.sqrt(rot[:, 0, 0] ** 2 + rot[:, 1, 0] ** 2)
+    gimbal = cy < 1e-6
+    x = np.where(gimbal,
+        np.arctan2(-rot[:, 1, 2], rot[:, 1, 1]),
+        np.arctan2(rot[:, 2, 1], rot[:, 2, 2]))
+    y = np.arctan2(-rot[:, 2, 0], cy)
+    z = np.where(gimbal, 0.0, np.arctan2(rot[:, 1, 0], rot[:, 0, 0]))
+
+    rotation = np.degrees(np.stack((x, y, z), axis=1))
+    return translation, rotation, scale
+
+
+def matrix_to_array(mat):
+    '''
+    4x4 matrix as a flat column major float64 array, as stored in FBX
+    '''
+    return np.asarray(mat, dtype=np.float64).T.ravel()
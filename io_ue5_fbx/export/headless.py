@@ -0,0 +1,23 @@
+'''
+Helpers for exporting without the UI: background workers and the
+command line
+'''
+
+
+class Reporter:
+    '''
+    Stand-in for an operator, when exporting without the UI.
+    Collects the messages passed to report()
+    '''
+
+    def __init__(self, verbose=True):
+        self.messages = []
+        self.verbose = verbose
+
+
+    def report(self, type, message):
+        if ('DEBUG' not in type):
+            self.messages.append(message)
+        if (self.verbose):
+            print(f"{', '.join(type)}: {message}")
+
@@ -0,0 +1,246 @@
+'''
+Unreal import manifest. Every export adds its FBX file to a JSON manifest
+in the export directory, with its Unreal asset type, destination, skeleton
+and import settings, and copies an Unreal Python script next to it that
+imports the whole directory: one import_asset_tasks() pass for the assets
+that create their skeletons, and one for the assets imported onto them
+
+Validating a manifest needs neither Unreal nor Blender:
+
+    python io_ue5_fbx/export/import_manifest.py Content/TART07/io_ue5_fbx_import.json
+'''
+import os
+import re
+import sys
+import json
+import shutil
+import filecmp
+
+# manifest and import script, in the export directory
+MANIFEST_NAME = 'io_ue5_fbx_import.json'
+SCRIPT_NAME = 'io_ue5_fbx_import.py'
+
+# the Unreal Python script copied next to the manifest
+SCRIPT_SOURCE = os.path.join(os.path.dirname(__file__), 'unreal_import.py')
+
+# bump when the layout of an asset entry changes
+MANIFEST_VERSION = 1
+
+# constants.UnrealTypes
+SKELETAL_MESH = 'SkeletalMesh'
+STATIC_MESH = 'StaticMesh'
+ANIM_SEQUENCE = 'AnimSequence'
+ASSET_TYPES = (SKELETAL_MESH, STATIC_MESH, ANIM_SEQUENCE)
+
+REQUIRED_KEYS = ('file', 'name', 'asset_type', 'destination', 'import')
+
+
+def game_path(directory):
+    '''
+    Unreal package path of a directory inside a project's Content
+    directory, e.g. C:\\TART07\\Content\\TART07 -> /Game/TART07
+    '''
+    parts = [p for p in re.split(r'[\\/]+', directory) if p]
+    lowered = [p.lower() for p in parts]
+    if ('content' not in lowered):
+        return '/Game'
+    index = len(lowered) - 1 - lowered[::-1].index('content')
+    return '/'.join(['/Game'] + parts[index + 1:])
+
+
+def skeleton_path(entry):
+    '''
+    Skeleton asset Unreal creates when importing a skeletal mesh entry
+    '''
+    return f"{entry['destination']}/{entry['name']}_Skeleton"
+
+
+def resolve_skeletons(assets):
+    '''
+    Point every animation, and every skeletal mesh but the first of an
+    armature, at the skeleton created by the first skeletal mesh exported
+    from the same armature. Explicit skeleton paths are kept, as are those
+    of entries without a skeletal mesh in the manifest, such as animations
+    exported apart from their mesh (see indexed_skeleton())
+    '''
+    owners = {}
+    for entry in sorted(assets.values(), key=lambda e: e['file']):
+        if (entry['asset_type'] == SKELETAL_MESH and entry.get('armature')):
+            owners.setdefault(entry['armature'], entry)
+
+    for entry in assets.values():
+        if (entry['asset_type'] == STATIC_MESH):
+            continue
+        skeleton = entry.setdefault('skeleton', {})
+        owner = owners.get(entry.get('armature'))
+        if (skeleton.get('explicit') or owner is None):
+            continue
+        if (owner is entry):
+            skeleton.pop('asset', None)
+            skeleton.pop('mesh', None)
+        else:
+            skeleton['asset'] = skeleton_path(owner)
+            skeleton['mesh'] = owner['file']
+
+
+def indexed_skeleton(project_dir, indexed, armature, blend=''):
+    '''
+    Skeleton of the skeletal mesh last exported from armature into the
+    project, from the project index entries indexed, preferring those of
+    the same blend file. Returns {'asset', 'mesh'}, or None
+    '''
+    meshes = [e for e in indexed if e['asset_type'] == SKELETAL_MESH and
+        armature in e['objects']]
+    if (not meshes):
+        return None
+    latest = max(meshes, key=lambda e: (e['blend'] == blend,
+        e['exported_at']))
+
+    filepath = os.path.join(project_dir, latest['path'])
+    directory = os.path.dirname(filepath)
+    file_name = os.path.basename(filepath)
+    mesh = {
+        'destination': game_path(directory),
+        'name': os.path.splitext(file_name)[0],
+    }
+
+    # the mesh may itself be imported onto the skeleton of another mesh
+    asset = None
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME)) as f:
+            manifest = json.load(f)
+        asset = manifest['assets'][file_name].get('skeleton', {}).get('asset')
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    return {'asset': asset or skeleton_path(mesh), 'mesh': latest['path']}
+
+
+def record(directory, entry, source=''):
+    '''
+    Add or replace the entry of an exported FBX file in the manifest of
+    its directory, and copy the import script next to it
+    '''
+    from .manifest import ManifestLock, read_manifest, write_manifest
+
+    path = os.path.join(directory, MANIFEST_NAME)
+    with ManifestLock(path):
+        manifest = read_manifest(path)
+        if (manifest.get('version') != MANIFEST_VERSION):
+            manifest = {'version': MANIFEST_VERSION, 'assets': {}}
+
+        manifest['generator'] = 'io_ue5_fbx'
+        manifest['source'] = source
+        manifest['assets'][entry['file']] = entry
+        resolve_skeletons(manifest['assets'])
+        write_manifest(path, manifest)
+
+    script = os.path.join(directory, SCRIPT_NAME)
+    if (not os.path.isfile(script) or
+            not filecmp.cmp(SCRIPT_SOURCE, script, shallow=False)):
+        shutil.copyfile(SCRIPT_SOURCE, script)
+
+
+def import_passes(manifest):
+    '''
+    Asset entries in import order, each pass sorted by file: first the
+    assets that create their skeleton or need none, then those imported
+    onto a skeleton
+    '''
+    assets = sorted(manifest['assets'].values(), key=lambda e: e['file'])
+    return [
+        [e for e in assets if not e.get('skeleton', {}).get('asset')],
+        [e for e in assets if e.get('skeleton', {}).get('asset')],
+    ]
+
+
+def validate(manifest, directory):
+    '''
+    Check a manifest the way the import script would use it. Returns a
+    list of errors
+    '''
+    errors = []
+    if (manifest.get('version') != MANIFEST_VERSION):
+        return [f"Unsupported manifest version {manifest.get('version')}"]
+
+    assets = manifest.get('assets', {})
+    destinations = {}
+    skeletons = {skeleton_path(e): e for e in assets.values()
+        if e.get('asset_type') == SKELETAL_MESH and
+            not e.get('skeleton', {}).get('asset')}
+
+    for key, entry in sorted(assets.items()):
+        missing = [k for k in REQUIRED_KEYS if k not in entry]
+        if (missing):
+            errors.append(f"{key}: missing {', '.join(missing)}")
+            continue
+
+        if (entry['asset_type'] not in ASSET_TYPES):
+            errors.append(f"{key}: unknown asset type {entry['asset_type']}")
+        if (not entry['destination'].startswith('/Game')):
+            errors.append(f"{key}: destination {entry['destination']} " + \
+                f"is outside /Game")
+        if (not os.path.isfile(os.path.join(directory, entry['file']))):
+            errors.append(f"{key}: {entry['file']} does not exist")
+
+        # two files importing onto the same asset
+        asset = f"{entry['destination']}/{entry['name']}"
+        if (asset.lower() in destinations):
+            errors.append(f"{key}: imports onto {asset}, as does " + \
+                f"{destinations[asset.lower()]}")
+        destinations[asset.lower()] = key
+
+        # animations need a skeleton, from this manifest or from the project
+        skeleton = entry.get('skeleton', {})
+        if (entry['asset_type'] == ANIM_SEQUENCE and
+                not skeleton.get('asset')):
+            errors.append(f"{key}: no skeleton for armature " + \
+                f"\"{entry.get('armature', '')}\"")
+            continue
+
+        # a skeleton from this manifest must have the same bones
+        owner = skeletons.get(skeleton.get('asset'))
+        if (owner is None):
+            continue
+        if (owner.get('bones') != entry.get('bones')):
+            errors.append(f"{key}: {len(entry.get('bones', []))} " + \
+                f"bone(s) do not match the " + \
+                f"{len(owner.get('bones', []))} of {owner['file']}")
+        elif (owner['import'].get('leaf_bones') !=
+                entry['import'].get('leaf_bones')):
+            errors.append(f"{key}: leaf bones differ from {owner['file']}")
+
+    return errors
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if (len(argv) != 1):
+        print(f"usage: import_manifest.py {MANIFEST_NAME}", file=sys.stderr)
+        return 2
+
+    path = argv[0]
+    if (os.path.isdir(path)):
+        path = os.path.join(path, MANIFEST_NAME)
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as error:
+        print(f"{path}: {error}", file=sys.stderr)
+        return 2
+
+    errors = validate(manifest, os.path.dirname(path))
+    for i, entries in enumerate(import_passes(manifest)):
+        print(f"Pass {i + 1}: " + \
+            (', '.join(f"{e['file']} ({e['asset_type']})" for e in entries)
+                or 'nothing to import'))
+    for error in errors:
+        print(f"ERROR {error}")
+
+    print(f"{len(manifest.get('assets', {}))} asset(s), " + \
+        f"{len(errors)} error(s)")
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
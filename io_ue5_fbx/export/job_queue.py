@@ -0,0 +1,246 @@
+'''
+Export jobs by target, by priority, with merging and retries. The queue of
+jobs.py, kept free of Blender so that it runs and is tested without it
+'''
+import os
+import json
+import time
+import heapq
+
+# bump when the layout of a saved job changes. Older queues are dropped
+QUEUE_VERSION = 1
+
+# seconds before the first retry of a failed job. Doubles on every retry
+RETRY_DELAY = 2.0
+
+# job states
+QUEUED = 'QUEUED'
+RUNNING = 'RUNNING'
+
+
+def open_blend():
+    '''
+    Path of the open blend file, the default blend of the queue's methods
+    '''
+    import bpy
+    return bpy.data.filepath
+
+
+class JobQueue:
+    '''
+    Export jobs by target, popped in order of priority (highest first),
+    then of first request
+
+    The heap holds (-priority, sequence, target) entries. Merging or
+    retrying a job pushes a new entry; entries that no longer match their
+    job are skipped when popped
+    '''
+
+    def __init__(self, path=None):
+        self.path = path
+        self.jobs = {}         # target -> queued job
+        self.running = None    # job being exported, not in jobs
+        self.heap = []
+        self.sequence = 0
+
+
+    def __len__(self):
+        return len(self.jobs)
+
+
+    def push(self, job):
+        '''
+        Queue a job, merging it into a queued job for the same target. The
+        merged job exports the newer objects and settings, at the higher
+        priority, in the place of the first request
+
+        Returns True if the job was merged into a queued job
+        '''
+        queued = self.jobs.get(job['target'])
+        if (queued is not None):
+            priority = max(queued['priority'], job['priority'])
+            for key in ('blend', 'mode', 'objects', 'settings', 'retries'):
+                queued[key] = job[key]
+
+            # a new request runs as soon as possible, with fresh retries
+            queued['attempts'] = 0
+            queued['not_before'] = 0.0
+            if (priority != queued['priority']):
+                queued['priority'] = priority
+                heapq.heappush(self.heap,
+                    (-priority, queued['sequence'], queued['target']))
+            self.save()
+            return True
+
+        self.sequence += 1
+        job = dict(job, sequence=self.sequence, state=QUEUED)
+        self.jobs[job['target']] = job
+        heapq.heappush(self.heap,
+            (-job['priority'], job['sequence'], job['target']))
+        self.save()
+        return False
+
+
+    def is_ready(self, job, now, blend):
+        '''
+        Can the job run now, in the open blend file?
+        '''
+        return job['not_before'] <= now and job['blend'] == blend
+
+
+    def pop(self, blend=None, now=None):
+        '''
+        Start the highest priority job of the open blend file that is not
+        waiting for a retry. Returns the job, or None
+        '''
+        blend = open_blend() if blend is None else blend
+        now = time.time() if now is None else now
+
+        waiting = []
+        job = None
+        while (self.heap):
+            entry = heapq.heappop(self.heap)
+            [priority, sequence, target] = entry
+            queued = self.jobs.get(target)
+
+            # stale entry, of a merged, retried or finished job
+            if (queued is None or queued['sequence'] != sequence or
+                    -queued['priority'] != priority):
+                continue
+            if (not self.is_ready(queued, now, blend)):
+                waiting.append(entry)
+                continue
+            job = queued
+            break
+
+        for entry in waiting:
+            heapq.heappush(self.heap, entry)
+        if (job is None):
+            return None
+
+        del self.jobs[job['target']]
+        job['state'] = RUNNING
+        job['attempts'] += 1
+        self.running = job
+        self.save()
+        return job
+
+
+    def finish(self, job):
+        '''
+        The running job exported successfully
+        '''
+        self.running = None
+        self.save()
+
+
+    def fail(self, job, error):
+        '''
+        The running job failed. Queue it again after a backoff, unless it
+        is out of retries or a newer request for its target is queued
+
+        Returns True if the job will be retried
+        '''
+        self.running = None
+        job['errors'].append(str(error))
+
+        retry = job['attempts'] <= job['retries'] and \
+            job['target'] not in self.jobs
+        if (retry):
+            delay = RETRY_DELAY * 2 ** (job['attempts'] - 1)
+            job['not_before'] = time.time() + delay
+            job['state'] = QUEUED
+            self.sequence += 1
+            job['sequence'] = self.sequence
+            self.jobs[job['target']] = job
+            heapq.heappush(self.heap,
+                (-job['priority'], job['sequence'], job['target']))
+
+        self.save()
+        return retry
+
+
+    def pending(self, blend=None):
+        '''
+        Number of queued jobs of the open blend file, ready or waiting
+        '''
+        blend = open_blend() if blend is None else blend
+        return sum(1 for job in self.jobs.values() if job['blend'] == blend)
+
+
+    def next_ready(self, blend=None):
+        '''
+        Seconds until the next job of the open blend file is ready, or
+        None if there is none
+        '''
+        blend = open_blend() if blend is None else blend
+        times = [job['not_before'] for job in self.jobs.values()
+            if job['blend'] == blend]
+        if (not times):
+            return None
+        return max(0.0, min(times) - time.time())
+
+
+    def clear(self, blend=None):
+        '''
+        Remove the queued jobs of the open blend file
+        '''
+        blend = open_blend() if blend is None else blend
+        self.jobs = {target: job for target, job in self.jobs.items()
+            if job['blend'] != blend}
+        self.save()
+
+
+    def save(self):
+        '''
+        Write the queue, replacing the saved queue only once fully written
+        '''
+        if (not self.path):
+            return
+
+        jobs = list(self.jobs.values())
+        if (self.running is not None):
+            jobs.append(self.running)
+
+        tmp_path = self.path + '.tmp'
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump({'version': QUEUE_VERSION, 'jobs': jobs}, f,
+                    indent=1)
+            os.replace(tmp_path, self.path)
+        except OSError as error:
+            print(f"io_ue5_fbx: could not save the export queue: {error}")
+
+
+    def load(self):
+        '''
+        Read the saved queue. A job that was running when Blender quit is
+        queued again, and counts as an attempt. Jobs of unsaved files are
+        dropped
+        '''
+        self.jobs = {}
+        self.running = None
+        self.heap = []
+        self.sequence = 0
+        if (not self.path or not os.path.isfile(self.path)):
+            return
+
+        try:
+            with open(self.path) as f:
+                saved = json.load(f)
+        except (OSError, ValueError) as error:
+            print(f"io_ue5_fbx: could not load the export queue: {error}")
+            return
+        if (saved.get('version') != QUEUE_VERSION):
+            return
+
+        # a newer request for the target of the interrupted job replaces it
+        for job in sorted(saved['jobs'], key=lambda j: j['sequence']):
+            # the objects of an unsaved file cannot be found again
+            if (not job['blend']):
+                continue
+            job['state'] = QUEUED
+            self.sequence = max(self.sequence, job['sequence'])
+            self.jobs[job['target']] = job
+            heapq.heappush(self.heap,
+                (-job['priority'], job['sequence'], job['target']))
@@ -0,0 +1,86 @@
+'''
+Persistent queue of export requests. Requests for the same target merge
+into one job, jobs run by priority, and failed jobs are retried with a
+backoff. The queue is saved to the user config directory after every
+change, so that queued exports resume after Blender restarts
+'''
+import bpy
+import os
+from . import batch, export
+from .job_queue import JobQueue, QUEUED
+from ..constants import AddonBatch
+
+# queue file, in the add-on's user config directory
+QUEUE_NAME = 'export_queue.json'
+
+
+def queue_path():
+    '''
+    Path of the saved queue
+    '''
+    config_dir = bpy.utils.user_resource('CONFIG', path='io_ue5_fbx',
+        create=True)
+    return os.path.join(config_dir, QUEUE_NAME)
+
+
+def job_target(mode, settings):
+    '''
+    Resolved path an export writes to: the FBX file, or the directory of a
+    batch export. Requests with the same target are duplicates
+    '''
+    [filepath, dir_concat, _] = export.resolve_filepath(None,
+        settings['dir_name'], settings['subdir_name'],
+        settings.get('file_name', 'batch'))
+
+    if (mode != AddonBatch.OFF.name):
+        return f"{mode}:{os.path.normcase(os.path.abspath(dir_concat))}"
+    return os.path.normcase(os.path.abspath(filepath))
+
+
+def make_job(context, mode, settings, priority=0, retries=0, objects=None):
+    '''
+    Snapshot of an export request. settings are the keyword arguments of
+    export_fbx() (or export_batch(), for a batch mode), resolved from the
+    add-on properties at the time of the request
+
+    objects default to the selected objects, or else the active object
+    '''
+    if (objects is None):
+        objects = list(context.selected_objects)
+        if (not objects and context.active_object):
+            objects = [context.active_object]
+
+    return {
+        'target': job_target(mode, settings),
+        'blend': bpy.data.filepath,
+        'mode': mode,
+        'objects': [obj.name for obj in objects],
+        'settings': settings,
+        'priority': priority,
+        'retries': retries,
+        'attempts': 0,
+        'not_before': 0.0,
+        'errors': [],
+        'state': QUEUED,
+    }
+
+
+# the add-on's queue, loaded on register
+export_queue = JobQueue()
+
+
+def export_job_stages(op, context, job):
+    '''
+    Run a job. Generator of (progress, status), like export_fbx_stages().
+    Objects of the job that no longer exist are left out
+    '''
+    objects = [bpy.data.objects[name] for name in job['objects']
+        if name in bpy.data.objects]
+    if (not objects):
+        raise ValueError(f"None of the objects of the job exist")
+
+    if (job['mode'] != AddonBatch.OFF.name):
+        return batch.export_batch_stages(op, context, objects=objects,
+            **job['settings'])
+    return export.export_fbx_stages(op, context, objects=objects,
+        **job['settings'])
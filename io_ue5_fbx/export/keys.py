@@ -0,0 +1,113 @@
+'''
+Key math of baked animation channels: continuous euler rotations, and
+error-bounded key reduction. NumPy only, so that it runs without Blender
+'''
+import numpy as np
+
+
+def flip_eulers(rot):
+    '''
+    The other XYZ euler solution of the same rotations, in degrees
+    '''
+    alt = rot + np.array([180.0, 0.0, 180.0])
+    alt[..., 1] = 180.0 - rot[..., 1]
+    return alt
+
+
+def angle_distance(a, b):
+    '''
+    Sum of the absolute differences of euler angles, modulo 360 degrees
+    '''
+    return np.abs((a - b + 180.0) % 360.0 - 180.0).sum(axis=-1)
+
+
+def compatible_eulers(rot, previous=None):
+    '''
+    Make (frames, bones, 3) euler rotations in degrees continuous over the
+    frames: pick whichever of the two euler solutions is closest to the
+    frame before, then remove 360 degree jumps. previous is the (bones, 3)
+    rotation of the frame before the first, if any
+
+    Picking a solution flips the parity of every following frame, so the
+    choices are a cumulative sum of per-frame flips rather than a loop
+    '''
+    rot = rot.astype(np.float64)
+    alt = flip_eulers(rot)
+
+    # does the other solution of a frame better follow the frame before?
+    step = angle_distance(alt[1:], rot[:-1]) < \
+        angle_distance(rot[1:], rot[:-1])
+    if (previous is None):
+        first = np.zeros(rot.shape[1], dtype=bool)
+    else:
+        first = angle_distance(alt[0], previous) < \
+            angle_distance(rot[0], previous)
+
+    flip = np.cumsum(np.concatenate((first[np.newaxis], step)), axis=0) % 2
+    rot = np.where(flip[..., np.newaxis] == 1, alt, rot)
+
+    if (previous is None):
+        return np.unwrap(rot, period=360, axis=0)
+    rot = np.concatenate((previous[np.newaxis], rot))
+    return np.unwrap(rot, period=360, axis=0)[1:]
+
+
+def reduce_keys(channels, tolerance):
+    '''
+    Reduce the keys of baked (frames, bones, 9) channels, so that linear
+    interpolation between the remaining keys stays within tolerance of
+    every baked value. tolerance is (location, rotation, scale), in
+    armature units, degrees and scale factor
+
+    Returns (keep, values): a bool array of the keys to keep, and the
+    values of those keys, both shaped like channels
+
+    Every channel is swept once, all channels at a time. A channel keeps
+    the range of slopes from its last key that passes within tolerance of
+    every value since, and places a key when the range becomes empty
+    '''
+    frames, bones, _ = channels.shape
+    values = channels.reshape(frames, -1).astype(np.float64)
+    tol = np.tile(np.repeat(np.asarray(tolerance, dtype=np.float64), 3),
+        bones)
+
+    keep = np.zeros(values.shape, dtype=bool)
+    keys = values.copy()
+    keep[0] = True
+    if (frames < 2):
+        return keep.reshape(channels.shape), channels
+
+    # last key of each channel, and its range of slopes
+    anchor = np.zeros(values.shape[1])
+    anchor_value = values[0].copy()
+    lo = np.full(values.shape[1], -np.inf)
+    hi = np.full(values.shape[1], np.inf)
+
+    for i in range(1, frames):
+        d = i - anchor
+        new_lo = np.maximum(lo, (values[i] - tol - anchor_value) / d)
+        new_hi = np.minimum(hi, (values[i] + tol - anchor_value) / d)
+
+        # 1.) no line fits up to frame i. Key the previous frame
+        split = new_lo > new_hi
+        if (split.any()):
+            slope = (lo[split] + hi[split]) / 2
+            key_value = anchor_value[split] + slope * (i - 1 - anchor[split])
+            keep[i - 1, split] = True
+            keys[i - 1, split] = key_value
+            anchor[split] = i - 1
+            anchor_value[split] = key_value
+
+            # 2.) start a new range from the new key
+            new_lo[split] = values[i, split] - tol[split] - key_value
+            new_hi[split] = values[i, split] + tol[split] - key_value
+
+        lo = new_lo
+        hi = new_hi
+
+    # 3.) the last frame is always keyed
+    keep[-1] = True
+    keys[-1] = anchor_value + (lo + hi) / 2 * (frames - 1 - anchor)
+
+    return keep.reshape(channels.shape), \
+        keys.astype(np.float32).reshape(channels.shape)
@@ -0,0 +1,235 @@
+import bpy
+import os
+import json
+import time
+import hashlib
+import numpy as np
+from ..constants import BlenderTypes
+
+# bump to invalidate every manifest entry when the hashed data changes
+HASH_VERSION = 1
+
+# manifest file written next to the exported FBX files
+MANIFEST_NAME = 'io_ue5_fbx_manifest.json'
+
+# attribute data type: (foreach_get property, components, dtype)
+ATTRIBUTE_FIELDS = {
+    'FLOAT': ('value', 1, np.float32),
+    'INT': ('value', 1, np.int32),
+    'INT8': ('value', 1, np.int32),
+    'INT32_2D': ('value', 2, np.int32),
+    'BOOLEAN': ('value', 1, bool),
+    'FLOAT2': ('vector', 2, np.float32),
+    'FLOAT_VECTOR': ('vector', 3, np.float32),
+    'FLOAT_COLOR': ('color', 4, np.float32),
+    'BYTE_COLOR': ('color', 4, np.float32),
+    'QUATERNION': ('value', 4, np.float32),
+}
+
+
+def hash_collection(h, collection, prop, components, dtype):
+    '''
+    Hash one property of every item in a bpy collection with foreach_get
+    '''
+    arr = np.empty(len(collection) * components, dtype=dtype)
+    collection.foreach_get(prop, arr)
+    h.update(prop.encode())
+    h.update(arr.tobytes())
+
+
+def hash_mesh(h, obj, depsgraph):
+    '''
+    Hash the evaluated mesh of obj, with modifiers applied
+    '''
+    obj_eval = obj.evaluated_get(depsgraph)
+    mesh = obj_eval.to_mesh()
+
+    try:
+        hash_collection(h, mesh.vertices, 'co', 3, np.float32)
+        hash_collection(h, mesh.edges, 'vertices', 2, np.int32)
+        hash_collection(h, mesh.loops, 'vertex_index', 1, np.int32)
+        hash_collection(h, mesh.polygons, 'loop_start', 1, np.int32)
+
+        # smoothing, sharp edges, UV maps, colors, ...
+        for attr in sorted(mesh.attributes, key=lambda a: a.name):
+            field = ATTRIBUTE_FIELDS.get(attr.data_type)
+            if (field is None):
+                continue
+            h.update(f"{attr.name}:{attr.domain}".encode())
+            hash_collection(h, attr.data, *field)
+
+        # skin weights (not available through foreach_get)
+        h.update(repr([g.name for g in obj.vertex_groups]).encode())
+        weights = [(g.group, g.weight)
+            for v in mesh.vertices for g in v.groups]
+        h.update(np.array(weights, dtype=np.float32).tobytes())
+
+        h.update(repr([s.name for s in obj.material_slots]).encode())
+
+    finally:
+        obj_eval.to_mesh_clear()
+
+
+def hash_armature(h, obj):
+    '''
+    Hash the rest pose and the current pose of an armature
+    '''
+    bones = obj.data.bones
+    h.update(repr([(b.name, b.parent.name if b.parent else '')
+        for b in bones]).encode())
+    hash_collection(h, bones, 'matrix_local', 16, np.float32)
+    hash_collection(h, bones, 'length', 1, np.float32)
+
+    pose_bones = obj.pose.bones
+    hash_collection(h, pose_bones, 'location', 3, np.float32)
+    hash_collection(h, pose_bones, 'rotation_quaternion', 4, np.float32)
+    hash_collection(h, pose_bones, 'rotation_euler', 3, np.float32)
+    hash_collection(h, pose_bones, 'scale', 3, np.float32)
+
+
+def hash_action(h, action):
+    '''
+    Hash the keyframes of every F-Curve in an action
+    '''
+    h.update(action.name.encode())
+    for fc in action.fcurves:
+        h.update(f"{fc.data_path}[{fc.array_index}]".encode())
+        for prop in ('co', 'handle_left', 'handle_right'):
+            hash_collection(h, fc.keyframe_points, prop, 2, np.float32)
+
+
+def hash_export(context, objects, settings):
+    '''
+    Hash everything that determines the content of the exported FBX file:
+    evaluated meshes, armatures, actions and the resolved export settings
+    '''
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{HASH_VERSION}:{bpy.app.version_string}".encode())
+    h.update(json.dumps(settings, sort_keys=True).encode())
+
+    scene = context.scene
+    h.update(repr((scene.frame_start, scene.frame_end,
+        scene.render.fps, scene.render.fps_base)).encode())
+
+    depsgraph = context.evaluated_depsgraph_get()
+    has_armature = False
+
+    for obj in sorted(objects, key=lambda o: o.name):
+        h.update(repr((obj.name, obj.type,
+            obj.parent.name if obj.parent else '',
+            obj.parent_type, obj.parent_bone)).encode())
+        h.update(np.array(obj.matrix_world, dtype=np.float32).tobytes())
+
+        match obj.type:
+            case BlenderTypes.MESH:
+                hash_mesh(h, obj, depsgraph)
+            case BlenderTypes.ARMATURE:
+                has_armature = True
+                hash_armature(h, obj)
+
+        anim = obj.animation_data
+        if (anim is not None and anim.action is not None):
+            h.update(f"active:{anim.action.name}".encode())
+
+    # baking exports every action in the file
+    if (has_armature):
+        for action in sorted(bpy.data.actions, key=lambda a: a.name):
+            hash_action(h, action)
+
+    return h.hexdigest()
+
+
+class ManifestLock:
+    '''
+    Lock file guarding the manifest against concurrent batch workers
+    '''
+
+    def __init__(self, path, timeout=30):
+        self.path = path + '.lock'
+        self.timeout = timeout
+
+
+    def __enter__(self):
+        start = time.monotonic()
+        while True:
+            try:
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.close(fd)
+                return self
+            except FileExistsError:
+                # a stale lock left behind by a crashed worker
+                if (time.monotonic() - start > self.timeout):
+                    os.remove(self.path)
+                time.sleep(0.01)
+
+
+    def __exit__(self, *args):
+        if (os.path.isfile(self.path)):
+            os.remove(self.path)
+
+
+def manifest_path(filepath):
+    return os.path.join(os.path.dirname(filepath), MANIFEST_NAME)
+
+
+def read_manifest(path):
+    if (not os.path.isfile(path)):
+        return {}
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def is_unchanged(filepath, digest):
+    '''
+    Was filepath last exported from the same data, and not modified since?
+    '''
+    entry = read_manifest(manifest_path(filepath)).get(
+        os.path.basename(filepath))
+
+    if (entry is None):
+        return False
+    return is_current(filepath, entry, digest)
+
+
+def is_current(filepath, entry, digest, options=None):
+    '''
+    Was filepath written from the same data and options, per its manifest
+    entry, and not modified since?
+    '''
+    if (entry['hash'] != digest or entry.get('options') != options):
+        return False
+    if (not os.path.isfile(filepath)):
+        return False
+
+    stat = os.stat(filepath)
+    return stat.st_size == entry['size'] and stat.st_mtime == entry['mtime']
+
+
+def write_manifest(path, entries):
+    '''
+    Replace a manifest atomically, so readers never see a partial manifest
+    '''
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(entries, f, indent=4, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def record(filepath, digest):
+    '''
+    Store the hash of an exported FBX file in the manifest
+    '''
+    path = manifest_path(filepath)
+    stat = os.stat(filepath)
+
+    with ManifestLock(path):
+        entries = read_manifest(path)
+        entries[os.path.basename(filepath)] = {
+            'hash': digest,
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+        }
+        write_manifest(path, entries)
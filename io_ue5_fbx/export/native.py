@@ -0,0 +1,911 @@
+import zlib
+import itertools
+import numpy as np
+from contextlib import contextmanager
+from mathutils import Matrix
+from concurrent.futures import ThreadPoolExecutor
+from bpy_extras.io_utils import axis_conversion
+from . import anim, chunked, geometry, keys, trace
+from .fbx_writer import \
+(
+    FBXWriter,
+    Int64,
+    name_class,
+    TIME_ID,
+    FILE_ID,
+    p_int,
+    p_enum,
+    p_double,
+    p_ktime,
+    p_string,
+    p_color,
+    p_vector,
+)
+from ..constants import BlenderTypes
+
+# FBX time ticks per second
+FBX_KTIME = 46186158000
+
+CREATOR = 'io_ue5_fbx native FBX writer'
+
+# linear interpolation, auto tangents, for every key
+KEY_ATTR_FLAGS = 1 << 2 | 1 << 8 | 1 << 13 | 1 << 14
+KEY_ATTR_DATA = (0.0, 0.0, 9.419963346924634e-30, 0.0)
+
+# first object id. Ids are sequential, so that files are reproducible
+FIRST_ID = 1000000000000
+
+
+def units_blender_to_fbx_factor(scene):
+    '''
+    Blender units to FBX units (centimeters)
+    '''
+    units = scene.unit_settings
+    return 1.0 if units.system == 'NONE' else 100.0 * units.scale_length
+
+
+def resolve_global_matrix(scene, global_scale, apply_scale_options):
+    '''
+    Axis conversion and scale applied to root objects, and the FBX unit scale.
+    Same conventions as bpy.ops.export_scene.fbx (-Z forward, Y up)
+    '''
+    axis = axis_conversion(to_forward='-Z', to_up='Y').to_4x4()
+    unit_scale = units_blender_to_fbx_factor(scene)
+
+    if (apply_scale_options == 'FBX_SCALE_NONE'):
+        return Matrix.Scale(unit_scale * global_scale, 4) @ axis, 1.0
+    return Matrix.Scale(global_scale, 4) @ axis, unit_scale
+
+
+def find_armature(obj, exported):
+    '''
+    The exported armature deforming obj, if any
+    '''
+    for mod in obj.modifiers:
+        if (mod.type == 'ARMATURE' and mod.object in exported):
+            return mod.object
+    if (obj.parent_type == 'ARMATURE' and obj.parent in exported):
+        return obj.parent
+    return None
+
+
+class Document:
+    '''
+    Writes one FBX document from a list of Blender objects
+
+    Everything except geometry is small, and is resolved before writing.
+    Geometry is extracted and streamed to disk one mesh at a time.
+    '''
+
+    def __init__(self, op, context, objects, global_matrix, unit_scale,
+                 mesh_smooth_type, add_leaf_bones, bake_anim,
+                 key_tolerance=None, weight_limits=None, memory_budget=0,
+                 vertex_limit=0):
+        self.op = op
+        self.context = context
+        self.scene = context.scene
+        self.global_matrix = global_matrix
+        self.unit_scale = unit_scale
+        self.mesh_smooth_type = mesh_smooth_type
+        self.add_leaf_bones = add_leaf_bones
+
+        self.ids = itertools.count(FIRST_ID)
+        self.connections = []
+
+        self.objects = objects
+        exported = set(objects)
+
+        self.meshes = [o for o in objects if o.type == BlenderTypes.MESH]
+        self.armatures = [o for o in objects
+            if o.type == BlenderTypes.ARMATURE]
+        self.skinned = {o: find_armature(o, exported) for o in self.meshes}
+
+        # object ids
+        self.model_ids = {obj: self.new_id() for obj in objects}
+        self.geometry_ids = {obj: self.new_id() for obj in self.meshes}
+        self.attribute_ids = {obj: self.new_id() for obj in self.armatures}
+
+        # bone ids: {armature: {bone name: (model id, attribute id)}}
+        self.bone_ids = {}
+        for arm in self.armatures:
+            ids = {}
+            for bone in arm.data.bones:
+                ids[bone.name] = (self.new_id(), self.new_id())
+                if (self.add_leaf_bones and not bone.children):
+                    ids[bone.name + '_end'] = (self.new_id(), self.new_id())
+            self.bone_ids[arm] = ids
+
+        # materials, shared between objects
+        self.materials = {}
+        for obj in self.meshes:
+            for slot in obj.material_slots:
+                if (slot.material and slot.material not in self.materials):
+                    self.materials[slot.material] = self.new_id()
+
+        # skin deformers: {mesh: (skin id, {bone name: cluster id})}
+        self.skins = {}
+        for obj, arm in self.skinned.items():
+            if (arm is None):
+                continue
+            bones = arm.data.bones
+            self.skins[obj] = (self.new_id(), {g.name: self.new_id()
+                for g in obj.vertex_groups if g.name in bones})
+
+        # weights of skinned meshes, read from the evaluated mesh whose
+        # vertices are written: {mesh: (vertices, groups, weights)}
+        self.skin_weights = {}
+
+        # one bind pose per armature with skinned meshes
+        self.poses = {arm: self.new_id()
+            for arm in set(a for a in self.skinned.values() if a)}
+
+        # armatures with baked bone animation, over the scene frame range
+        self.animated = self.armatures if bake_anim else []
+        self.frames = anim.frame_range(self.scene)
+        if (not len(self.frames)):
+            self.animated = []
+        # takes are named after the action, if only one is played
+        actions = {a.animation_data.action for a in self.animated
+            if a.animation_data and a.animation_data.action}
+        self.take_name = actions.pop().name if len(actions) == 1 \
+            else self.scene.name
+
+        # (location, rotation, scale) tolerance of key reduction, or None
+        self.key_tolerance = key_tolerance
+
+        # (max influences per vertex, weight threshold), or None
+        self.weight_limits = weight_limits
+
+        # geometry is streamed in chunks within a memory budget (MB), and
+        # split into pieces of at most vertex_limit vertices, if set
+        self.budget = chunked.MemoryBudget(memory_budget) \
+            if memory_budget or vertex_limit else None
+        self.vertex_limit = vertex_limit
+
+        # pieces of split meshes: {mesh: [(first, end polygon)]}, and the
+        # ids of all but the first: {mesh: [(model id, geometry id)]}
+        self.pieces = {}
+        self.piece_ids = {}
+
+
+    def new_id(self):
+        return Int64(next(self.ids))
+
+
+    def connect(self, child, parent, prop=None):
+        '''
+        Connect child to parent, or to a property of parent
+        '''
+        self.connections.append((child, parent, prop))
+
+
+    # --------------------------- Matrices ------------------------ #
+
+
+    def world_matrix(self, obj):
+        '''
+        World matrix of obj in FBX space
+        '''
+        return self.global_matrix @ obj.matrix_world
+
+
+    def local_matrix(self, obj):
+        '''
+        Matrix of obj relative to its exported parent. Root objects get the
+        global matrix (axis conversion and scale)
+        '''
+        if (obj.parent in self.model_ids):
+            return obj.parent.matrix_world.inverted_safe() @ obj.matrix_world
+        return self.world_matrix(obj)
+
+
+    def bone_local_matrices(self, arm):
+        '''
+        Current pose of every bone relative to its parent bone, (n, 4, 4)
+        '''
+        mats = geometry.get_bone_matrices(arm.pose.bones, 'matrix')
+        parents = geometry.get_parent_indices(arm.data.bones)
+        return geometry.parent_relative_matrices(mats, parents)
+
+
+    def bone_world_matrices(self, arm):
+        '''
+        Rest matrix of every bone in FBX space, {name: Matrix}
+        '''
+        arm_world = self.world_matrix(arm)
+        return {b.name: arm_world @ b.matrix_local for b in arm.data.bones}
+
+
+    # --------------------------- Sections ------------------------ #
+
+
+    def write_stages(self, w):
+        '''
+        Write the document. Yields progress (0 to 1) after each object
+        '''
+        if (self.vertex_limit):
+            self.plan_pieces()
+
+        self.write_header(w)
+        self.write_global_settings(w)
+        self.write_documents(w)
+        self.write_definitions(w)
+
+        chunks = -(-len(self.frames) // anim.CHUNK_FRAMES) \
+            if self.animated else 0
+        pieces = sum(len(ids) for ids in self.piece_ids.values())
+        steps = len(self.objects) + len(self.meshes) + len(self.skins) + \
+            chunks + pieces
+        for i, _ in enumerate(self.write_objects_stages(w)):
+            yield (i + 1) / (steps + 1)
+
+        self.write_connections(w)
+        self.write_takes(w)
+        yield 1.0
+
+
+    def plan_pieces(self):
+        '''
+        Split the meshes with more than vertex_limit vertices. Skinned
+        meshes are not split, their weights would need splitting too
+        '''
+        op = self.op
+        depsgraph = self.context.evaluated_depsgraph_get()
+        for obj in self.meshes:
+            if (obj in self.skins):
+                if (len(obj.data.vertices) > self.vertex_limit):
+                    if op: op.report({'WARNING'}, f"\"{obj.name}\" is " + \
+                        f"skinned, and is not split")
+                continue
+
+            with self.evaluated_mesh(obj, depsgraph) as mesh:
+                pieces = chunked.plan_pieces(mesh, self.vertex_limit,
+                    self.budget, f"\"{obj.name}\"")
+            if (pieces is None):
+                continue
+
+            self.pieces[obj] = pieces
+            self.piece_ids[obj] = [(self.new_id(), self.new_id())
+                for _ in pieces[1:]]
+            if op: op.report({'INFO'}, f"Split \"{obj.name}\" into " + \
+                f"{len(pieces)} pieces")
+            if (self.mesh_smooth_type == 'EDGE'):
+                if op: op.report({'WARNING'}, f"Pieces of " + \
+                    f"\"{obj.name}\" are written with face smoothing")
+
+
+    def write_header(self, w):
+        with w.scope('FBXHeaderExtension'):
+            w.node('FBXHeaderVersion', 1003)
+            w.node('FBXVersion', w.version)
+            w.node('EncryptionType', 0)
+            with w.scope('CreationTimeStamp'):
+                w.node('Version', 1000)
+                w.node('Year', 1970)
+                w.node('Month', 1)
+                w.node('Day', 1)
+                w.node('Hour', 10)
+                w.node('Minute', 0)
+                w.node('Second', 0)
+                w.node('Millisecond', 0)
+            w.node('Creator', CREATOR)
+
+        w.node('FileId', FILE_ID)
+        w.node('CreationTime', TIME_ID)
+        w.node('Creator', CREATOR)
+
+
+    def write_global_settings(self, w):
+        scene = self.scene
+        fps = scene.render.fps / scene.render.fps_base
+        start = int(scene.frame_start / fps * FBX_KTIME)
+        stop = int(scene.frame_end / fps * FBX_KTIME)
+
+        with w.scope('GlobalSettings'):
+            w.node('Version', 1000)
+            with w.scope('Properties70'):
+                p_int(w, 'UpAxis', 1)
+                p_int(w, 'UpAxisSign', 1)
+                p_int(w, 'FrontAxis', 2)
+                p_int(w, 'FrontAxisSign', 1)
+                p_int(w, 'CoordAxis', 0)
+                p_int(w, 'CoordAxisSign', 1)
+                p_int(w, 'OriginalUpAxis', 2)
+                p_int(w, 'OriginalUpAxisSign', 1)
+                p_double(w, 'UnitScaleFactor', self.unit_scale)
+                p_double(w, 'OriginalUnitScaleFactor', self.unit_scale)
+                p_color(w, 'AmbientColor', (0, 0, 0))
+                p_string(w, 'DefaultCamera', 'Producer Perspective')
+                p_enum(w, 'TimeMode', 14) # custom frame rate
+                p_enum(w, 'TimeProtocol', 2)
+                p_enum(w, 'SnapOnFrameMode', 0)
+                p_ktime(w, 'TimeSpanStart', start)
+                p_ktime(w, 'TimeSpanStop', stop)
+                p_double(w, 'CustomFrameRate', fps)
+                p_enum(w, 'CurrentTimeMarker', -1)
+
+
+    def write_documents(self, w):
+        with w.scope('Documents'):
+            w.node('Count', 1)
+            with w.scope('Document', self.new_id(), 'Scene', 'Scene'):
+                with w.scope('Properties70'):
+                    w.node('P', 'SourceObject', 'object', '', '')
+                    p_string(w, 'ActiveAnimStackName',
+                        self.take_name if self.animated else '')
+                w.node('RootNode', Int64(0))
+
+        w.node('References')
+
+
+    def definition_counts(self):
+        bones = sum(len(ids) for ids in self.bone_ids.values())
+        clusters = sum(len(c) for _, c in self.skins.values())
+        pieces = sum(len(ids) for ids in self.piece_ids.values())
+        animated_bones = sum(len(a.data.bones) for a in self.animated)
+        return {
+            'GlobalSettings': 1,
+            'Model': len(self.objects) + bones + pieces,
+            'NodeAttribute': len(self.armatures) + bones,
+            'Geometry': len(self.meshes) + pieces,
+            'Material': len(self.materials),
+            'Deformer': len(self.skins) + clusters,
+            'Pose': len(self.poses),
+            'AnimationStack': 1 if self.animated else 0,
+            'AnimationLayer': 1 if self.animated else 0,
+            'AnimationCurveNode': animated_bones * 3,
+            'AnimationCurve': animated_bones * anim.CHANNELS,
+        }
+
+
+    def write_definitions(self, w):
+        counts = {k: v for k, v in self.definition_counts().items() if v}
+        with w.scope('Definitions'):
+            w.node('Version', 100)
+            w.node('Count', sum(counts.values()))
+            for object_type, count in counts.items():
+                with w.scope('ObjectType', object_type):
+                    w.node('Count', count)
+
+
+    def write_objects_stages(self, w):
+        '''
+        Write the Objects section. Yields after each object, mesh and skin
+        '''
+        with w.scope('Objects'):
+            for obj in self.objects:
+                self.write_model(w, obj)
+                if (obj.type == BlenderTypes.ARMATURE):
+                    self.write_bones(w, obj)
+                if (obj in self.piece_ids):
+                    self.write_piece_models(w, obj)
+                yield
+
+            for mat, mat_id in self.materials.items():
+                self.write_material(w, mat, mat_id)
+
+            yield from self.write_geometries_stages(w)
+
+            for obj in self.skins:
+                self.write_skin(w, obj)
+                yield
+
+            for arm, pose_id in self.poses.items():
+                self.write_bind_pose(w, arm, pose_id)
+
+            if (self.animated):
+                yield from self.write_animation_stages(w)
+
+
+    def write_connections(self, w):
+        with w.scope('Connections'):
+            for child, parent, prop in self.connections:
+                if (prop is None):
+                    w.node('C', 'OO', child, parent)
+                else:
+                    w.node('C', 'OP', child, parent, prop)
+
+
+    def write_takes(self, w):
+        with w.scope('Takes'):
+            if (not self.animated):
+                w.node('Current', '')
+                return
+
+            times = anim.frame_times(self.scene, self.frames[[0, -1]],
+                FBX_KTIME)
+            w.node('Current', self.take_name)
+            with w.scope('Take', self.take_name):
+                w.node('FileName', f"{self.take_name}.tak")
+                w.node('LocalTime', Int64(times[0]), Int64(times[1]))
+                w.node('ReferenceTime', Int64(times[0]), Int64(times[1]))
+
+
+    # --------------------------- Objects ------------------------- #
+
+
+    def write_model_node(self, w, model_id, name, model_type,
+                         translation, rotation, scale):
+        with w.scope('Model', model_id, name_class(name, 'Model'),
+                     model_type):
+            w.node('Version', 232)
+            with w.scope('Properties70'):
+                p_vector(w, 'Lcl Translation', translation)
+                p_vector(w, 'Lcl Rotation', rotation)
+                p_vector(w, 'Lcl Scaling', scale)
+                p_int(w, 'DefaultAttributeIndex', 0)
+                p_enum(w, 'InheritType', 1)
+            w.node('MultiLayer', 0)
+            w.node('MultiTake', 0)
+            w.node('Shading', True)
+            w.node('Culling', 'CullingOff')
+
+
+    def write_model(self, w, obj):
+        model_id = self.model_ids[obj]
+        mat = np.array(self.local_matrix(obj))[np.newaxis]
+        t, r, s = geometry.decompose_matrices(mat)
+
+        match obj.type:
+            case BlenderTypes.MESH:
+                model_type = 'Mesh'
+            case BlenderTypes.ARMATURE:
+                model_type = 'Null'
+
+        self.write_model_node(w, model_id, obj.name, model_type,
+            t[0], r[0], s[0])
+
+        parent_id = self.model_ids.get(obj.parent, Int64(0))
+        self.connect(model_id, parent_id)
+
+        # armatures are exported as a Null root above the bones
+        if (obj.type == BlenderTypes.ARMATURE):
+            attr_id = self.attribute_ids[obj]
+            with w.scope('NodeAttribute', attr_id,
+                         name_class(obj.name, 'NodeAttribute'), 'Null'):
+                w.node('TypeFlags', 'Null')
+            self.connect(attr_id, model_id)
+
+        for slot in obj.material_slots:
+            if (slot.material):
+                self.connect(self.materials[slot.material], model_id)
+
+
+    def write_piece_models(self, w, obj):
+        '''
+        Models of the pieces of a split mesh after the first, which is obj
+        '''
+        mat = np.array(self.local_matrix(obj))[np.newaxis]
+        t, r, s = geometry.decompose_matrices(mat)
+        parent_id = self.model_ids.get(obj.parent, Int64(0))
+
+        for i, (model_id, _) in enumerate(self.piece_ids[obj], 2):
+            self.write_model_node(w, model_id, f"{obj.name}_part{i}", 'Mesh',
+                t[0], r[0], s[0])
+            self.connect(model_id, parent_id)
+            for slot in obj.material_slots:
+                if (slot.material):
+                    self.connect(self.materials[slot.material], model_id)
+
+
+    def write_bones(self, w, arm):
+        bones = arm.data.bones
+        ids = self.bone_ids[arm]
+        t, r, s = geometry.decompose_matrices(self.bone_local_matrices(arm))
+
+        for i, bone in enumerate(bones):
+            model_id, attr_id = ids[bone.name]
+            self.write_bone(w, model_id, attr_id, bone.name,
+                t[i], r[i], s[i], bone.length)
+
+            parent = ids[bone.parent.name][0] if bone.parent \
+                else self.model_ids[arm]
+            self.connect(model_id, parent)
+
+            # leaf bones, at the tail of bones without children
+            if (bone.name + '_end' in ids):
+                leaf_id, leaf_attr_id = ids[bone.name + '_end']
+                self.write_bone(w, leaf_id, leaf_attr_id, bone.name + '_end',
+                    (0, bone.length, 0), (0, 0, 0), (1, 1, 1), bone.length)
+                self.connect(leaf_id, model_id)
+
+
+    def write_bone(self, w, model_id, attr_id, name, t, r, s, size):
+        self.write_model_node(w, model_id, name, 'LimbNode', t, r, s)
+
+        with w.scope('NodeAttribute', attr_id,
+                     name_class(name, 'NodeAttribute'), 'LimbNode'):
+            with w.scope('Properties70'):
+                p_double(w, 'Size', size)
+            w.node('TypeFlags', 'Skeleton')
+        self.connect(attr_id, model_id)
+
+
+    def write_material(self, w, mat, mat_id):
+        with w.scope('Material', mat_id, name_class(mat.name, 'Material'),
+                     ''):
+            w.node('Version', 102)
+            w.node('ShadingModel', 'Phong')
+            w.node('MultiLayer', 0)
+            with w.scope('Properties70'):
+                p_string(w, 'ShadingModel', 'Phong')
+                p_color(w, 'DiffuseColor', mat.diffuse_color[:3])
+                p_double(w, 'DiffuseFactor', 1.0)
+                p_double(w, 'Opacity', mat.diffuse_color[3])
+
+
+    def write_geometries_stages(self, w):
+        '''
+        Extract and write each mesh in turn, with armature modifiers of
+        skinned meshes disabled, so that the bind pose is exported. Yields
+        after each mesh
+
+        The skin weights of a skinned mesh are read from the same evaluated
+        mesh, since other modifiers may add, remove or reorder vertices
+        '''
+        with self.armature_modifiers_disabled(self.skins):
+            depsgraph = self.context.evaluated_depsgraph_get()
+            for obj in self.meshes:
+                with self.evaluated_mesh(obj, depsgraph) as mesh:
+                    if (obj in self.skins):
+                        self.skin_weights[obj] = \
+                            geometry.get_skin_weights(mesh)
+                    if (self.budget is not None):
+                        yield from self.write_geometry_chunked(w, obj, mesh)
+                        continue
+                    self.write_geometry(w, obj, mesh)
+                yield
+
+
+    @contextmanager
+    def evaluated_mesh(self, obj, depsgraph):
+        '''
+        Mesh of obj with modifiers and shape keys applied. Within a memory
+        budget, the object's own mesh is used when nothing changes it,
+        which saves a copy of the largest meshes
+        '''
+        if (self.budget is not None and not obj.modifiers and
+                obj.data.shape_keys is None):
+            yield obj.data
+            return
+
+        obj_eval = obj.evaluated_get(depsgraph)
+        try:
+            yield obj_eval.to_mesh()
+        finally:
+            obj_eval.to_mesh_clear()
+
+
+    @contextmanager
+    def armature_modifiers_disabled(self, objs):
+        '''
+        Disable the armature modifiers of objs for the duration
+        '''
+        disabled = []
+        for obj in objs:
+            for mod in obj.modifiers:
+                if (mod.type == 'ARMATURE' and mod.show_viewport):
+                    mod.show_viewport = False
+                    disabled.append(mod)
+        try:
+            yield
+        finally:
+            for mod in disabled:
+                mod.show_viewport = True
+
+
+    def write_geometry(self, w, obj, mesh):
+        geom_id = self.geometry_ids[obj]
+        smoothing = self.mesh_smooth_type
+
+        layers = []
+        with w.scope('Geometry', geom_id,
+                     name_class(obj.data.name, 'Geometry'), 'Mesh'):
+            w.node('Properties70')
+            w.node('GeometryVersion', 124)
+            w.node('Vertices', geometry.get_vertices(mesh))
+            w.node('PolygonVertexIndex',
+                geometry.get_polygon_vertex_index(mesh))
+            if (smoothing == 'EDGE'):
+                w.node('Edges', geometry.get_edges(mesh))
+
+            with w.scope('LayerElementNormal', 0):
+                w.node('Version', 101)
+                w.node('Name', '')
+                w.node('MappingInformationType', 'ByPolygonVertex')
+                w.node('ReferenceInformationType', 'Direct')
+                w.node('Normals', geometry.get_normals(mesh))
+            layers.append(('LayerElementNormal', 0))
+
+            if (smoothing in ('FACE', 'EDGE')):
+                with w.scope('LayerElementSmoothing', 0):
+                    w.node('Version', 102)
+                    w.node('Name', '')
+                    if (smoothing == 'FACE'):
+                        w.node('MappingInformationType', 'ByPolygon')
+                        w.node('ReferenceInformationType', 'Direct')
+                        w.node('Smoothing', geometry.get_face_smoothing(mesh))
+                    else:
+                        w.node('MappingInformationType', 'ByEdge')
+                        w.node('ReferenceInformationType', 'Direct')
+                        w.node('Smoothing', geometry.get_edge_smoothing(mesh))
+                layers.append(('LayerElementSmoothing', 0))
+
+            for i, (name, uv, uv_index) in enumerate(geometry.get_uvs(mesh)):
+                with w.scope('LayerElementUV', i):
+                    w.node('Version', 101)
+                    w.node('Name', name)
+                    w.node('MappingInformationType', 'ByPolygonVertex')
+                    w.node('ReferenceInformationType', 'IndexToDirect')
+                    w.node('UV', uv)
+                    w.node('UVIndex', uv_index)
+                layers.append(('LayerElementUV', i))
+
+            if (obj.material_slots):
+                indices = geometry.get_material_indices(mesh)
+                with w.scope('LayerElementMaterial', 0):
+                    w.node('Version', 101)
+                    w.node('Name', '')
+                    if (len(indices) and (indices == indices[0]).all()):
+                        w.node('MappingInformationType', 'AllSame')
+                        indices = indices[:1]
+                    else:
+                        w.node('MappingInformationType', 'ByPolygon')
+                    w.node('ReferenceInformationType', 'IndexToDirect')
+                    w.node('Materials', indices)
+                layers.append(('LayerElementMaterial', 0))
+
+            # layer 0 holds one of each element, extra UV maps get their own
+            for index in range(max(i for _, i in layers) + 1):
+                with w.scope('Layer', index):
+                    w.node('Version', 100)
+                    for element, typed_index in layers:
+                        if (typed_index != index):
+                            continue
+                        with w.scope('LayerElement'):
+                            w.node('Type', element)
+                            w.node('TypedIndex', typed_index)
+
+        self.connect(geom_id, self.model_ids[obj])
+
+
+    def write_geometry_chunked(self, w, obj, mesh):
+        '''
+        Stream the geometry of obj within the memory budget, one Geometry
+        per piece. Yields after each piece
+        '''
+        pieces = self.pieces.get(obj)
+        ids = [(self.model_ids[obj], self.geometry_ids[obj])] + \
+            self.piece_ids.get(obj, [])
+
+        # pieces share the arrays of the mesh
+        arrays = chunked.MeshArrays(mesh, self.budget, f"\"{obj.name}\"",
+            keep=pieces is not None)
+        try:
+            for i, (piece, (model_id, geom_id)) in enumerate(
+                    zip(pieces or [None], ids), 1):
+                name = obj.data.name if i == 1 else \
+                    f"{obj.data.name}_part{i}"
+                chunked.write_geometry(w, self.budget, arrays, geom_id, name,
+                    self.mesh_smooth_type, bool(obj.material_slots), piece)
+                self.connect(geom_id, model_id)
+                yield
+        finally:
+            arrays.clear()
+
+
+    def write_skin(self, w, obj):
+        arm = self.skinned[obj]
+        skin_id, cluster_ids = self.skins[obj]
+        bone_world = self.bone_world_matrices(arm)
+        mesh_world = self.world_matrix(obj)
+        arm_world = geometry.matrix_to_array(self.world_matrix(arm))
+
+        with w.scope('Deformer', skin_id, name_class(obj.name, 'Deformer'),
+                     'Skin'):
+            w.node('Version', 101)
+            w.node('Link_DeformAcuracy', 50.0)
+        self.connect(skin_id, self.geometry_ids[obj])
+
+        # weights of the written vertices
+        group_names = [g.name for g in obj.vertex_groups]
+        vertices, groups, weights = self.skin_weights.pop(obj)
+        if (not len(weights) and obj.vertex_groups):
+            op = self.op
+            if op: op.report({'WARNING'}, f"The modifiers of " + \
+                f"\"{obj.name}\" remove its skin weights")
+
+        # fewer, larger influences per vertex
+        if (self.weight_limits is not None):
+            deform = np.array([name in cluster_ids for name in group_names],
+                dtype=bool)
+            keep, weights = geometry.limit_skin_weights(vertices, groups,
+                weights, deform, *self.weight_limits)
+            vertices, groups, weights = \
+                vertices[keep], groups[keep], weights[keep]
+
+        clusters = geometry.group_weights_by_bone(vertices, groups, weights,
+            group_names, cluster_ids)
+
+        for name, cluster_id in cluster_ids.items():
+            indices, weights = clusters.get(name,
+                (np.empty(0, np.int32), np.empty(0, np.float64)))
+            link = bone_world[name]
+
+            with w.scope('Deformer', cluster_id,
+                         name_class(name, 'SubDeformer'), 'Cluster'):
+                w.node('Version', 100)
+                w.node('UserData', '', '')
+                w.node('Indexes', indices.astype(np.int32))
+                w.node('Weights', weights.astype(np.float64))
+                w.node('Transform', geometry.matrix_to_array(
+                    link.inverted_safe() @ mesh_world))
+                w.node('TransformLink', geometry.matrix_to_array(link))
+                w.node('TransformAssociateModel', arm_world)
+
+            self.connect(cluster_id, skin_id)
+            self.connect(self.bone_ids[arm][name][0], cluster_id)
+
+
+    def write_bind_pose(self, w, arm, pose_id):
+        nodes = [(self.model_ids[arm], self.world_matrix(arm))]
+        nodes += [(self.model_ids[obj], self.world_matrix(obj))
+            for obj, a in self.skinned.items() if a == arm]
+        bone_world = self.bone_world_matrices(arm)
+        nodes += [(self.bone_ids[arm][name][0], mat)
+            for name, mat in bone_world.items()]
+
+        with w.scope('Pose', pose_id, name_class(arm.name, 'Pose'),
+                     'BindPose'):
+            w.node('Type', 'BindPose')
+            w.node('Version', 100)
+            w.node('NbPoseNodes', len(nodes))
+            for model_id, mat in nodes:
+                with w.scope('PoseNode'):
+                    w.node('Node', model_id)
+                    w.node('Matrix', geometry.matrix_to_array(mat))
+
+
+    # -------------------------- Animation ------------------------ #
+
+
+    def write_animation_stages(self, w):
+        '''
+        Bake the bones of animated armatures and write one curve per
+        channel. Yields after each chunk of baked frames
+        '''
+        # mesh deformation is not needed to sample the bones, whether the
+        # meshes are exported or not
+        deformed = [obj for obj in self.scene.objects
+            if any(mod.type == 'ARMATURE' and mod.object in self.animated
+                for mod in obj.modifiers)]
+        with self.armature_modifiers_disabled(deformed):
+            baked = yield from anim.bake_stages(self.scene, self.animated,
+                self.frames)
+
+        times = anim.frame_times(self.scene, self.frames, FBX_KTIME)
+
+        stack_id = self.new_id()
+        layer_id = self.new_id()
+        with w.scope('AnimationStack', stack_id,
+                     name_class(self.take_name, 'AnimStack'), ''):
+            with w.scope('Properties70'):
+                p_ktime(w, 'LocalStart', times[0])
+                p_ktime(w, 'LocalStop', times[-1])
+                p_ktime(w, 'ReferenceStart', times[0])
+                p_ktime(w, 'ReferenceStop', times[-1])
+        w.node('AnimationLayer', layer_id,
+            name_class(self.take_name, 'AnimLayer'), '')
+        self.connect(layer_id, stack_id)
+
+        for arm, channels in baked.items():
+            # drop keys that linear interpolation reproduces
+            if (self.key_tolerance is not None):
+                keep, channels = keys.reduce_keys(channels,
+                    self.key_tolerance)
+            else:
+                keep = np.ones(channels.shape, dtype=bool)
+
+            ids = self.bone_ids[arm]
+            for i, bone in enumerate(arm.data.bones):
+                self.write_bone_curves(w, layer_id, ids[bone.name][0],
+                    times, channels[:, i], keep[:, i])
+
+
+    def write_bone_curves(self, w, layer_id, model_id, times, channels,
+                          keep):
+        '''
+        Write translation, rotation and scale curve nodes of one bone.
+        channels is a (frames, 9) array, keep the (frames, 9) keys to write
+        '''
+        targets = [('T', 'Lcl Translation'), ('R', 'Lcl Rotation'),
+            ('S', 'Lcl Scaling')]
+
+        for i, (node_name, prop) in enumerate(targets):
+            node_id = self.new_id()
+            values = channels[:, 3 * i:3 * i + 3]
+
+            with w.scope('AnimationCurveNode', node_id,
+                         name_class(node_name, 'AnimCurveNode'), ''):
+                with w.scope('Properties70'):
+                    for j, axis in enumerate('XYZ'):
+                        w.node('P', f"d|{axis}", 'Number', '', 'A',
+                            float(values[0, j]))
+            self.connect(node_id, layer_id)
+            self.connect(node_id, model_id, prop)
+
+            for j, axis in enumerate('XYZ'):
+                curve_id = self.new_id()
+                mask = keep[:, 3 * i + j]
+                self.write_curve(w, curve_id, times[mask], values[mask, j])
+                self.connect(curve_id, node_id, f"d|{axis}")
+
+
+    def write_curve(self, w, curve_id, times, values):
+        with w.scope('AnimationCurve', curve_id,
+                     name_class('', 'AnimCurve'), ''):
+            w.node('Default', float(values[0]))
+            w.node('KeyVer', 4009)
+            w.node('KeyTime', times)
+            w.node('KeyValueFloat', values.astype(np.float32))
+            w.node('KeyAttrFlags', np.array([KEY_ATTR_FLAGS], np.int32))
+            w.node('KeyAttrDataFloat', np.array(KEY_ATTR_DATA, np.float32))
+            w.node('KeyAttrRefCount', np.array([len(times)], np.int32))
+
+
+def write_fbx_stages(op,
+                     context,
+                     filepath,
+                     objects,
+                     global_scale = 1,
+                     apply_scale_options = 'FBX_SCALE_NONE',
+                     mesh_smooth_type = 'FACE',
+                     add_leaf_bones = False,
+                     bake_anim = True,
+                     key_tolerance = None,
+                     weight_limits = None,
+                     memory_budget = 0,
+                     vertex_limit = 0,
+                     compression = zlib.Z_DEFAULT_COMPRESSION,
+                     timings = None,
+                     ):
+    """
+    Write objects to a binary FBX file without bpy.ops.export_scene.fbx
+
+    Keyword arguments mirror the options of bpy.ops.export_scene.fbx, plus
+    the (location, rotation, scale) tolerance of baked key reduction (None
+    keeps every key), the (max influences, threshold) limits of skin
+    weights (None keeps every weight), the memory budget of geometry in MB
+    and the vertex limit of mesh pieces (0 for neither) and the zlib level
+    of array properties (0 stores them uncompressed). Arrays are deflated
+    on a thread pool while geometry is extracted; within a memory budget,
+    geometry arrays are streamed and deflated in chunks instead. Draining
+    the pool and closing the file is timed as the "Flush file" phase of
+    timings.
+
+    Generator. Yields progress (0 to 1) after each object
+    """
+    global_matrix, unit_scale = resolve_global_matrix(
+        context.scene, global_scale, apply_scale_options)
+
+    doc = Document(op, context, objects, global_matrix, unit_scale,
+        mesh_smooth_type, add_leaf_bones, bake_anim, key_tolerance,
+        weight_limits, memory_budget, vertex_limit)
+
+    if (timings is None):
+        timings = trace.Trace()
+
+    pool = ThreadPoolExecutor() if compression != 0 else None
+    try:
+        with open(filepath, 'wb') as f:
+            w = FBXWriter(f, level=compression, pool=pool)
+            yield from doc.write_stages(w)
+            with timings.phase("Flush file"):
+                w.close()
+                f.flush()
+    finally:
+        if (pool is not None):
+            pool.shutdown(cancel_futures=True)
+
+    if (doc.budget is not None):
+        if op: op.report({'INFO'}, doc.budget.summary())
@@ -0,0 +1,255 @@
+'''
+Index of every FBX file the add-on writes into an Unreal project, kept in a
+SQLite database at the root of the project directory. Answers "what is
+stale?" and "what is orphaned?" without walking the content tree or
+reading the FBX files again
+
+Uses the standard library only, so that it also runs outside Blender:
+
+    python io_ue5_fbx/export/project_index.py /UnrealProjects/TART07 stale
+'''
+import os
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import argparse
+
+# database file, at the root of the project directory
+INDEX_NAME = '.io_ue5_fbx_index.sqlite'
+
+# bump when the schema, or what a column holds, changes. Older indexes are
+# rebuilt empty
+SCHEMA_VERSION = 2
+
+# seconds a writer waits for another process (a batch worker) to commit
+LOCK_TIMEOUT = 30
+
+# bytes hashed at a time
+HASH_CHUNK = 1 << 20
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS assets (
+    path          TEXT PRIMARY KEY,  -- relative to the project directory
+    blend         TEXT NOT NULL,     -- source blend file
+    objects       TEXT NOT NULL,     -- JSON list of object names
+    asset_type    TEXT NOT NULL,     -- Unreal asset type
+    settings_hash TEXT NOT NULL,     -- export settings
+    source_hash   TEXT,              -- exported scene data, if hashed
+    content_hash  TEXT NOT NULL,     -- FBX file, see file_hash()
+    size          INTEGER NOT NULL,
+    mtime         REAL NOT NULL,
+    duration      REAL NOT NULL,     -- seconds spent exporting
+    exported_at   REAL NOT NULL      -- unix time
+);
+CREATE INDEX IF NOT EXISTS assets_blend ON assets (blend);
+'''
+
+COLUMNS = ('path', 'blend', 'objects', 'asset_type', 'settings_hash',
+    'source_hash', 'content_hash', 'size', 'mtime', 'duration',
+    'exported_at')
+
+
+def index_path(project_dir):
+    return os.path.join(project_dir, INDEX_NAME)
+
+
+def connect(project_dir):
+    '''
+    Open the index of a project, creating it if needed
+    '''
+    db = sqlite3.connect(index_path(project_dir), timeout=LOCK_TIMEOUT)
+    db.row_factory = sqlite3.Row
+
+    version = db.execute('PRAGMA user_version').fetchone()[0]
+    if (version != SCHEMA_VERSION):
+        with db:
+            db.execute('DROP TABLE IF EXISTS assets')
+            db.executescript(SCHEMA)
+            db.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+    return db
+
+
+def settings_hash(settings):
+    '''
+    Hash of the export settings, independent of key order
+    '''
+    data = json.dumps(settings, sort_keys=True).encode()
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def file_hash(filepath):
+    '''
+    Hash of the content of a file, read in chunks
+    '''
+    h = hashlib.blake2b(digest_size=16)
+    with open(filepath, 'rb') as f:
+        while (chunk := f.read(HASH_CHUNK)):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def relative_path(project_dir, filepath):
+    '''
+    Key of a file in the index: its path relative to the project, with
+    forward slashes, so that Windows and Linux machines share an index
+    '''
+    rel_path = os.path.relpath(os.path.abspath(filepath),
+        os.path.abspath(project_dir))
+    return rel_path.replace(os.sep, '/')
+
+
+def record(project_dir, filepath, blend, objects, asset_type, settings,
+           source_hash=None, content_hash=None, duration=0.0):
+    '''
+    Add or replace the entry of an exported FBX file. content_hash is its
+    file_hash(), if already known. Otherwise the hash of the file's entry
+    is kept if the file is unchanged since, and the file is read to hash it
+    if not
+    '''
+    stat = os.stat(filepath)
+    path = relative_path(project_dir, filepath)
+
+    db = connect(project_dir)
+    try:
+        if (content_hash is None):
+            row = db.execute('SELECT content_hash, size, mtime FROM ' + \
+                'assets WHERE path = ?', (path,)).fetchone()
+            if (row is not None and row['size'] == stat.st_size and
+                    row['mtime'] == stat.st_mtime):
+                content_hash = row['content_hash']
+            else:
+                content_hash = file_hash(filepath)
+
+        row = (
+            path,
+            blend,
+            json.dumps(list(objects)),
+            asset_type,
+            settings_hash(settings),
+            source_hash,
+            content_hash,
+            stat.st_size,
+            stat.st_mtime,
+            duration,
+            time.time(),
+        )
+
+        with db:
+            db.execute(f"INSERT OR REPLACE INTO assets " + \
+                f"({', '.join(COLUMNS)}) VALUES " + \
+                f"({', '.join('?' * len(COLUMNS))})", row)
+    finally:
+        db.close()
+
+
+def entries(project_dir, blend=None):
+    '''
+    Entries of the index, as dicts, optionally only those of a blend file
+    '''
+    if (not os.path.isfile(index_path(project_dir))):
+        return []
+
+    db = connect(project_dir)
+    try:
+        if (blend is None):
+            rows = db.execute('SELECT * FROM assets ORDER BY path')
+        else:
+            rows = db.execute('SELECT * FROM assets WHERE blend = ? ' + \
+                'ORDER BY path', (blend,))
+        return [dict(row, objects=json.loads(row['objects']))
+            for row in rows]
+    finally:
+        db.close()
+
+
+def entry_state(project_dir, entry):
+    '''
+    State of an indexed file, from file system metadata only:
+
+    MISSING:  the FBX file was deleted
+    MODIFIED: the FBX file was changed outside the add-on
+    ORPHANED: the source blend file no longer exists
+    STALE:    the source blend file was saved after the export
+    CURRENT:  none of the above
+    '''
+    filepath = os.path.join(project_dir, entry['path'])
+    try:
+        stat = os.stat(filepath)
+    except OSError:
+        return 'MISSING'
+    if (stat.st_size != entry['size'] or stat.st_mtime != entry['mtime']):
+        return 'MODIFIED'
+
+    try:
+        blend_mtime = os.stat(entry['blend']).st_mtime
+    except OSError:
+        return 'ORPHANED'
+    if (blend_mtime > entry['exported_at']):
+        return 'STALE'
+    return 'CURRENT'
+
+
+def remove(project_dir, paths, delete_files=False):
+    '''
+    Remove entries from the index, and optionally their FBX files
+    '''
+    db = connect(project_dir)
+    try:
+        with db:
+            db.executemany('DELETE FROM assets WHERE path = ?',
+                [(path,) for path in paths])
+    finally:
+        db.close()
+
+    if (delete_files):
+        for path in paths:
+            filepath = os.path.join(project_dir, path)
+            if (os.path.isfile(filepath)):
+                os.remove(filepath)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='project_index',
+        description="Query the index of the FBX files exported into an " + \
+            "Unreal project",
+    )
+    parser.add_argument('project_dir', help="Unreal project directory")
+    parser.add_argument('command', nargs='?', default='list',
+        choices=['list', 'stale', 'orphans', 'prune'],
+        help="list: every entry. stale: entries whose FBX or source " + \
+            "changed. orphans: entries whose FBX or source is gone. " + \
+            "prune: remove the orphaned entries")
+    parser.add_argument('--blend', help="Only entries of this blend file")
+    parser.add_argument('--delete', action='store_true',
+        help="With prune, also delete FBX files whose source is gone")
+    parser.add_argument('--json', action='store_true',
+        help="Print the entries as JSON")
+    args = parser.parse_args(argv)
+
+    rows = entries(args.project_dir, args.blend)
+    for row in rows:
+        row['state'] = entry_state(args.project_dir, row)
+
+    match args.command:
+        case 'stale':
+            rows = [r for r in rows if r['state'] in ('STALE', 'MODIFIED')]
+        case 'orphans' | 'prune':
+            rows = [r for r in rows if r['state'] in ('ORPHANED', 'MISSING')]
+
+    if (args.command == 'prune'):
+        remove(args.project_dir, [r['path'] for r in rows],
+            delete_files=args.delete)
+
+    if (args.json):
+        print(json.dumps(rows, indent=4))
+    else:
+        for row in rows:
+            print(f"{row['state']:<9} {row['asset_type']:<14} {row['path']}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
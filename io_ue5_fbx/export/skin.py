@@ -0,0 +1,96 @@
+'''
+Skin weight limiting for Blender's FBX exporter, which reads the weights
+from the mesh. The native writer limits the weight arrays it writes instead
+'''
+import bpy
+import numpy as np
+from contextlib import contextmanager
+from . import geometry
+from ..constants import BlenderTypes
+
+# suffix of the original mesh's name while its limited copy is exported
+HIDDEN_SUFFIX = '.io_ue5_fbx_original'
+
+
+def deform_mask(obj, arm):
+    '''
+    True for each vertex group of obj that deforms a bone of arm
+    '''
+    bones = arm.data.bones
+    return np.array([g.name in bones for g in obj.vertex_groups], dtype=bool)
+
+
+def set_weights(obj, vertices, groups, weights, keep, limited):
+    '''
+    Write limited weights to the mesh of obj: changed weights first, while
+    the element order still matches the arrays, then remove dropped ones
+    '''
+    mesh = obj.data
+    offsets = np.searchsorted(vertices, np.arange(len(mesh.vertices)))
+
+    changed = np.flatnonzero(keep & (limited != weights))
+    for v in np.unique(vertices[changed]).tolist():
+        start = offsets[v]
+        for i, elem in enumerate(mesh.vertices[v].groups):
+            if (keep[start + i]):
+                elem.weight = limited[start + i]
+
+    dropped = ~keep
+    for g in np.unique(groups[dropped]).tolist():
+        obj.vertex_groups[g].remove(
+            vertices[dropped & (groups == g)].tolist())
+
+
+@contextmanager
+def weights_override(objects, max_influences, threshold):
+    '''
+    Export a copy of each skinned mesh with limited weights, under the
+    mesh's name, for the duration. A mesh shared by several exported
+    objects gets one copy, used by all of them, limited by the vertex
+    groups of its first skinned user. The original meshes are not modified
+    '''
+    from .native import find_armature
+
+    exported = set(objects)
+
+    # exported users of each mesh
+    users = {}
+    for obj in objects:
+        if (obj.type == BlenderTypes.MESH):
+            users.setdefault(obj.data, []).append(obj)
+
+    swapped = []
+    try:
+        for mesh, objs in users.items():
+            for obj in objs:
+                arm = find_armature(obj, exported)
+                if (arm is not None and obj.vertex_groups):
+                    break
+            else:
+                continue
+
+            vertices, groups, weights = geometry.get_skin_weights(mesh)
+            keep, limited = geometry.limit_skin_weights(vertices, groups,
+                weights, deform_mask(obj, arm), max_influences, threshold)
+            if (keep.all() and np.array_equal(limited, weights)):
+                continue
+
+            name = mesh.name
+            copy = mesh.copy()
+            mesh.name = name + HIDDEN_SUFFIX
+            copy.name = name
+            for user in objs:
+                user.data = copy
+            swapped.append((mesh, name, objs))
+
+            set_weights(obj, vertices, groups, weights, keep, limited)
+
+        yield
+
+    finally:
+        for mesh, name, objs in reversed(swapped):
+            copy = objs[0].data
+            for user in objs:
+                user.data = mesh
+            bpy.data.meshes.remove(copy)
+            mesh.name = name
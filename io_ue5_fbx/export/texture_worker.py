@@ -0,0 +1,86 @@
+'''
+RUN THIS SCRIPT FROM A BACKGROUND BLENDER PROCESS.
+Headless texture worker, started by textures.export_textures_stages():
+
+    blender --background --factory-startup --python texture_worker.py \
+        -- textures.json
+
+Scales down and converts each texture of the job file, then writes the
+results to the result file named in the job file.
+'''
+import bpy
+import os
+import sys
+import json
+import shutil
+
+# printed after each texture, as read by batch.read_markers()
+MARKER = 'io_ue5_fbx:'
+
+ORIGINAL = 'ORIGINAL'
+
+
+def process(job):
+    '''
+    Write one texture, through a partial file
+    '''
+    target = job['target']
+    partial = os.path.join(os.path.dirname(target),
+        f".{os.path.basename(target)}.partial")
+
+    image = bpy.data.images.load(job['source'], check_existing=False)
+    try:
+        [width, height] = image.size
+        if (not width or not height):
+            raise ValueError(f"Could not read {job['source']}")
+
+        # 1.) scale down, keeping the aspect ratio
+        max_size = job['max_size']
+        scale = 1.0
+        if (max_size and max(width, height) > max_size):
+            scale = max_size / max(width, height)
+
+        # 2.) within size, in the original format: copy the file as is
+        if (scale == 1.0 and job['format'] == ORIGINAL):
+            shutil.copyfile(job['source'], partial)
+        else:
+            if (scale != 1.0):
+                image.scale(max(1, round(width * scale)),
+                    max(1, round(height * scale)))
+            if (job['format'] != ORIGINAL):
+                image.file_format = job['format']
+            image.save(filepath=partial)
+
+        os.replace(partial, target)
+    finally:
+        bpy.data.images.remove(image)
+        if (os.path.isfile(partial)):
+            os.remove(partial)
+
+
+def run(job_path):
+    '''
+    Process every texture in the job file
+    '''
+    with open(job_path) as f:
+        spec = json.load(f)
+
+    results = []
+    for job in spec['jobs']:
+        result = {'name': job['name'], 'message': ''}
+        try:
+            process(job)
+            result['status'] = 'FINISHED'
+        except Exception as error:
+            result['status'] = 'FAILED'
+            result['message'] = str(error)
+
+        print(f"{MARKER}done:{job['name']}", flush=True)
+        results.append(result)
+
+    with open(spec['result'], 'w') as f:
+        json.dump(results, f)
+
+
+if __name__ == '__main__':
+    run(sys.argv[sys.argv.index('--') + 1])
@@ -0,0 +1,377 @@
+'''
+Texture stage. Gathers the images used by the materials of the exported
+meshes, dedupes them by content, and writes only the changed ones to a
+texture directory next to the FBX files
+
+Images are hashed on a thread pool. Images to resize or convert go to a
+pool of background Blender processes, which read and write every format
+Blender supports; the others are copied on the thread pool
+'''
+import bpy
+import os
+import re
+import sys
+import json
+import shutil
+import hashlib
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from . import manifest
+from ..constants import BlenderTypes, AddonTextureFormat
+
+# headless script run by each background Blender process
+WORKER_SCRIPT = os.path.join(os.path.dirname(__file__), 'texture_worker.py')
+
+# manifest of the written textures, in the texture directory
+TEXTURE_MANIFEST = 'io_ue5_fbx_textures.json'
+
+# background Blender processes resizing or converting textures
+TEXTURE_WORKERS = max(1, (os.cpu_count() or 2) // 2)
+
+# threads hashing and copying texture files
+IO_THREADS = 8
+
+# bytes hashed at a time
+HASH_CHUNK = 1 << 20
+
+# Blender file format: file extension
+FORMAT_EXTENSIONS = {
+    AddonTextureFormat.PNG.name: '.png',
+    AddonTextureFormat.TARGA.name: '.tga',
+    AddonTextureFormat.JPEG.name: '.jpg',
+}
+
+
+def node_tree_images(node_tree, images, visited):
+    '''
+    Add the images of the image texture nodes of a node tree, and of its
+    node groups, to images
+    '''
+    if (node_tree is None or node_tree in visited):
+        return
+    visited.add(node_tree)
+
+    for node in node_tree.nodes:
+        if (node.type == 'TEX_IMAGE' and node.image is not None):
+            images.setdefault(node.image, None)
+        elif (node.type == 'GROUP'):
+            node_tree_images(node.node_tree, images, visited)
+
+
+def collect_images(objects):
+    '''
+    Images used by the materials of the mesh objects, in order
+    '''
+    images = {}
+    visited = set()
+    for obj in objects:
+        if (obj.type != BlenderTypes.MESH):
+            continue
+        for slot in obj.material_slots:
+            if (slot.material is not None and slot.material.use_nodes):
+                node_tree_images(slot.material.node_tree, images, visited)
+    return list(images)
+
+
+def texture_name(image):
+    '''
+    File name stem of a texture, from the image name without extension
+    '''
+    stem = os.path.splitext(image.name)[0]
+    return re.sub(r'[^A-Za-z0-9_-]', '_', stem)
+
+
+def image_source(image, tmp_dir):
+    '''
+    File to read an image from. Packed images are written to tmp_dir first.
+    Returns None for images without file data (generated, tiled, movies)
+    '''
+    if (image.source != 'FILE'):
+        return None
+
+    ext = os.path.splitext(image.filepath)[1] or '.png'
+    if (image.packed_file is not None):
+        path = os.path.join(tmp_dir, f"{texture_name(image)}{ext}")
+        with open(path, 'wb') as f:
+            f.write(image.packed_file.data)
+        return path
+
+    path = bpy.path.abspath(image.filepath, library=image.library)
+    return path if os.path.isfile(path) else None
+
+
+def image_origin(image):
+    '''
+    Where an image comes from: its file, or the Blender file it is packed
+    in. An image with new content from the same origin was edited, and
+    replaces its texture
+    '''
+    if (image.packed_file is not None):
+        blend = image.library.filepath if image.library else bpy.data.filepath
+        return f"{bpy.path.abspath(blend)}:{image.name}"
+    return os.path.normcase(bpy.path.abspath(image.filepath,
+        library=image.library))
+
+
+def hash_file(path):
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        while (chunk := f.read(HASH_CHUNK)):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def copy_texture(job):
+    '''
+    Copy a texture through a partial file. Returns an error message, or
+    None
+    '''
+    partial = os.path.join(os.path.dirname(job['target']),
+        f".{os.path.basename(job['target'])}.partial")
+    try:
+        shutil.copyfile(job['source'], partial)
+        os.replace(partial, job['target'])
+    except OSError as error:
+        if (os.path.isfile(partial)):
+            os.remove(partial)
+        return str(error)
+    return None
+
+
+def start_worker(job_path, log_path):
+    '''
+    Start one background Blender process over a texture job file
+    '''
+    cmd = [
+        bpy.app.binary_path,
+        '--background',
+        '--factory-startup',
+        '--python-exit-code', '1',
+        '--python', WORKER_SCRIPT,
+        '--', job_path,
+    ]
+
+    with open(log_path, 'w') as log:
+        return subprocess.Popen(cmd, stdout=log, stderr=subprocess.STDOUT)
+
+
+def export_textures_stages(op,
+                           objects,
+                           directory,
+                           max_size = 0,
+                           file_format = AddonTextureFormat.ORIGINAL.name,
+                           workers = TEXTURE_WORKERS,
+                           ):
+    """
+    Write the textures of objects to directory
+
+    Generator. Yields a status between stages, and while waiting for the
+    workers. Closing the generator stops the workers
+
+    Keyword arguments:
+
+    op:          Operator. Passed in to get access to the report function
+    objects:     Exported objects
+    directory:   Texture directory
+
+    Optional keyword arguments:
+
+    max_size:    Largest width or height. Larger textures are scaled down,
+                 keeping their aspect ratio. 0 keeps the original size
+    file_format: Blender file format to convert to, or ORIGINAL
+    workers:     Number of background Blender processes
+
+    Returns the number of textures written (as StopIteration.value)
+    """
+    images = collect_images(objects)
+    if (not images):
+        return 0
+
+    os.makedirs(directory, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix='io_ue5_fbx_tx_')
+
+    try:
+        # 1.) resolve the files of the images
+        sources = {}
+        for image in images:
+            path = image_source(image, tmp_dir)
+            if (path is None):
+                if op: op.report({'WARNING'}, f"Image \"{image.name}\" " + \
+                    f"has no file data. Skipped")
+                continue
+            sources[image] = path
+
+        # 2.) hash each file once, in parallel
+        paths = list(dict.fromkeys(sources.values()))
+        yield f"Hashing {len(paths)} texture(s)"
+        with ThreadPoolExecutor(IO_THREADS) as pool:
+            path_digests = dict(zip(paths, pool.map(hash_file, paths)))
+        digests = {image: path_digests[path]
+            for image, path in sources.items()}
+
+        # 3.) one texture per content, named after its first image. Every
+        # export shares the directory, so a name its manifest holds for
+        # other content from another image is taken
+        manifest_path = os.path.join(directory, TEXTURE_MANIFEST)
+        entries = manifest.read_manifest(manifest_path)
+        written_as = {}
+        origins = {}
+        for file_name, entry in entries.items():
+            key = (entry.get('hash'), os.path.splitext(file_name)[1])
+            written_as.setdefault(key, file_name)
+            origins[file_name.lower()] = entry.get('origin', '')
+
+        converted = file_format != AddonTextureFormat.ORIGINAL.name
+        options = {'max_size': max_size, 'format': file_format}
+        textures = {}
+        names = set()
+        for image, path in sources.items():
+            digest = digests[image]
+            if (digest in textures):
+                continue
+
+            ext = FORMAT_EXTENSIONS[file_format] if converted \
+                else os.path.splitext(path)[1].lower()
+            origin = image_origin(image)
+
+            # the same content keeps its name. Otherwise, the first name
+            # free, or written from the same image before it changed
+            name = written_as.get((digest, ext))
+            if (name is None or name.lower() in names):
+                stem, i = texture_name(image), 1
+                name = f"{stem}{ext}"
+                while (name.lower() in names or
+                        origins.get(name.lower(), '') not in ('', origin)):
+                    name = f"{stem}_{i}{ext}"
+                    i += 1
+            names.add(name.lower())
+
+            textures[digest] = {
+                'name': name,
+                'source': path,
+                'origin': origin,
+                'target': os.path.join(directory, name),
+                'hash': digest,
+                'cost': os.path.getsize(path),
+                **options,
+            }
+
+        # 4.) skip the textures written from the same content and options
+        changed = []
+        for texture in textures.values():
+            entry = entries.get(texture['name'])
+            if (entry is not None and manifest.is_current(
+                    texture['target'], entry, texture['hash'], options)):
+                continue
+            changed.append(texture)
+
+        skipped = len(textures) - len(changed)
+        if (not changed):
+            if op: op.report({'INFO'}, f"{skipped} texture(s) unchanged")
+            return 0
+
+        # 5.) copy the textures that keep their size and format, and send
+        # the others to the workers, which skip scaling those within size
+        if (max_size or converted):
+            failed = yield from run_workers(changed, workers, tmp_dir)
+        else:
+            yield f"Copying {len(changed)} texture(s)"
+            with ThreadPoolExecutor(IO_THREADS) as pool:
+                errors = pool.map(copy_texture, changed)
+                failed = {t['name']: error for t, error in
+                    zip(changed, errors) if error is not None}
+        written = [t for t in changed if t['name'] not in failed]
+
+        # 6.) record the written textures
+        with manifest.ManifestLock(manifest_path):
+            entries = manifest.read_manifest(manifest_path)
+            for texture in written:
+                stat = os.stat(texture['target'])
+                entries[texture['name']] = {
+                    'hash': texture['hash'],
+                    'origin': texture['origin'],
+                    'options': options,
+                    'size': stat.st_size,
+                    'mtime': stat.st_mtime,
+                }
+            manifest.write_manifest(manifest_path, entries)
+
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    for name, message in failed.items():
+        if op: op.report({'WARNING'}, f"Failed to write texture " + \
+            f"{name}: {message}")
+    if op: op.report({'INFO'}, f"Wrote {len(written)} texture(s) to " + \
+        f"{directory}, {skipped} unchanged")
+    return len(written)
+
+
+def run_workers(jobs, workers, tmp_dir):
+    '''
+    Resize or convert textures in background Blender processes
+
+    Generator. Yields a status while polling the workers, and returns
+    {texture name: error message} of the failed textures
+    '''
+    from . import batch
+
+    buckets = batch.distribute_jobs(jobs, workers)
+    job_files = []
+    for i, bucket in enumerate(buckets):
+        job_path = os.path.join(tmp_dir, f"textures_{i}.json")
+        result_path = os.path.join(tmp_dir, f"textures_result_{i}.json")
+        log_path = os.path.join(tmp_dir, f"textures_{i}.log")
+        with open(job_path, 'w') as f:
+            json.dump({'jobs': bucket, 'result': result_path}, f)
+        job_files.append((job_path, result_path, log_path, bucket))
+
+    procs = [start_worker(jf[0], jf[2]) for jf in job_files]
+    offsets = [0] * len(procs)
+    done = 0
+
+    try:
+        while True:
+            for i, (_, _, log_path, _) in enumerate(job_files):
+                offsets[i], markers = batch.read_markers(log_path, offsets[i])
+                done += sum(kind == 'done' for kind, _ in markers)
+
+            running = [proc for proc in procs if proc.poll() is None]
+            yield f"Processed {done} of {len(jobs)} texture(s)"
+            if (not running):
+                break
+
+            # do not spin when driven by a blocking export
+            try:
+                running[0].wait(timeout=batch.POLL_INTERVAL)
+            except subprocess.TimeoutExpired:
+                pass
+
+    finally:
+        # cancelled: stop the workers
+        for proc in procs:
+            if (proc.poll() is None):
+                proc.terminate()
+                proc.wait()
+
+    failed = {}
+    for (_, result_path, log_path, bucket), proc in zip(job_files, procs):
+        results = {}
+        if (os.path.isfile(result_path)):
+            with open(result_path) as f:
+                results = {r['name']: r for r in json.load(f)}
+
+        for job in bucket:
+            result = results.get(job['name'])
+            if (result is None):
+                failed[job['name']] = f"Worker exited with code " + \
+                    f"{proc.returncode}"
+            elif (result['status'] != 'FINISHED'):
+                failed[job['name']] = result['message']
+
+        if (proc.returncode != 0 and os.path.isfile(log_path)):
+            with open(log_path) as f:
+                print(f.read()[-2000:], file=sys.stderr)
+
+    return failed
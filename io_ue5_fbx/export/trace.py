@@ -0,0 +1,95 @@
+'''
+Per-phase timing of an export. Reported as a one line breakdown, and
+optionally written as a Chrome trace (chrome://tracing, ui.perfetto.dev)
+'''
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+# phase of the time an export spends suspended, waiting for the UI
+IDLE = 'Idle'
+
+
+class Trace:
+    '''
+    Records nested phases. The breakdown uses the self time of each phase,
+    excluding nested phases, so that the times add up to the total
+    '''
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.end = self.origin
+        self.events = []         # [name, start, duration]
+        self.self_times = {}     # name -> seconds, in order of first use
+        self.stack = []          # [name, child time] of the open phases
+
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        self.self_times.setdefault(name, 0.0)
+        self.stack.append([name, 0.0])
+        try:
+            yield
+        finally:
+            self.end = time.perf_counter()
+            duration = self.end - start
+            [_, child_time] = self.stack.pop()
+            if (self.stack):
+                self.stack[-1][1] += duration
+
+            self.events.append([name, start - self.origin, duration])
+            self.self_times[name] += duration - child_time
+
+
+    def pause(self, value):
+        '''
+        Yield value from a stages generator, recording the time until the
+        next stage as Idle. Use as: yield from trace.pause(value)
+        '''
+        with self.phase(IDLE):
+            yield value
+
+
+    def total(self):
+        return self.end - self.origin
+
+
+    def summary(self):
+        '''
+        Breakdown such as "1.20s: Validate path 0.001s, Write FBX 1.1s, ..."
+        '''
+        phases = ', '.join(f"{name} {seconds:.3f}s"
+            for name, seconds in self.self_times.items())
+        return f"{self.total():.3f}s: {phases}"
+
+
+    def write_chrome_trace(self, filepath, label=''):
+        '''
+        Write the phases in the Chrome trace event format
+        '''
+        pid = os.getpid()
+        tid = threading.get_ident()
+        events = [{
+            'name': name,
+            'cat': 'export',
+            'ph': 'X',
+            'ts': start * 1e6,
+            'dur': duration * 1e6,
+            'pid': pid,
+            'tid': tid,
+        } for name, start, duration in self.events]
+
+        # name the track after the exported file
+        events.append({
+            'name': 'thread_name',
+            'ph': 'M',
+            'pid': pid,
+            'tid': tid,
+            'args': {'name': label},
+        })
+
+        with open(filepath, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
@@ -0,0 +1,167 @@
+'''
+RUN THIS SCRIPT IN THE UNREAL EDITOR.
+Imports the FBX files of an io_ue5_fbx import manifest. Copied next to the
+manifest by every export, and run from the editor's Output Log:
+
+    py "C:/Unreal Projects/TART07/Content/TART07/io_ue5_fbx_import.py"
+
+Each pass is one import_asset_tasks() call: first the static meshes and
+the skeletal meshes that create their skeleton, then the animations and
+skeletal meshes imported onto those skeletons. Assets are replaced in
+place, so running the script again reimports the directory.
+'''
+import os
+import sys
+import json
+import unreal
+
+MANIFEST_NAME = 'io_ue5_fbx_import.json'
+MANIFEST_VERSION = 1
+
+SKELETAL_MESH = 'SkeletalMesh'
+STATIC_MESH = 'StaticMesh'
+ANIM_SEQUENCE = 'AnimSequence'
+
+MESH_TYPES = {
+    SKELETAL_MESH: unreal.FBXImportType.FBXIT_SKELETAL_MESH,
+    STATIC_MESH: unreal.FBXImportType.FBXIT_STATIC_MESH,
+    ANIM_SEQUENCE: unreal.FBXImportType.FBXIT_ANIMATION,
+}
+
+
+def import_options(entry, skeleton):
+    '''
+    FbxImportUI of an asset entry. The exported file is already scaled and
+    converted to Unreal's axes, so Unreal keeps it as is
+    '''
+    settings = entry['import']
+    asset_type = entry['asset_type']
+
+    options = unreal.FbxImportUI()
+    options.set_editor_property('automated_import_should_detect_type', False)
+    options.set_editor_property('mesh_type_to_import', MESH_TYPES[asset_type])
+    options.set_editor_property('import_mesh', asset_type != ANIM_SEQUENCE)
+    options.set_editor_property('import_as_skeletal',
+        asset_type != STATIC_MESH)
+    options.set_editor_property('import_animations',
+        asset_type != STATIC_MESH and settings.get('bake_animation', True))
+    options.set_editor_property('import_materials',
+        asset_type != ANIM_SEQUENCE)
+    options.set_editor_property('import_textures', False)
+    if (skeleton is not None):
+        options.set_editor_property('skeleton', skeleton)
+
+    normals = unreal.FBXNormalImportMethod.FBXNIM_IMPORT_NORMALS
+    if (asset_type == STATIC_MESH):
+        data = options.get_editor_property('static_mesh_import_data')
+        data.set_editor_property('normal_import_method', normals)
+    elif (asset_type == SKELETAL_MESH):
+        data = options.get_editor_property('skeletal_mesh_import_data')
+        data.set_editor_property('normal_import_method', normals)
+    else:
+        data = options.get_editor_property('anim_sequence_import_data')
+        data.set_editor_property('animation_length',
+            unreal.FBXAnimationLengthImportType.FBXALIT_EXPORTED_TIME)
+        data.set_editor_property('import_bone_tracks', True)
+        if (settings.get('fps')):
+            data.set_editor_property('use_default_sample_rate', False)
+            data.set_editor_property('custom_sample_rate',
+                round(settings['fps']))
+    data.set_editor_property('import_uniform_scale', 1.0)
+
+    return options
+
+
+def import_task(directory, entry, skeleton):
+    task = unreal.AssetImportTask()
+    task.set_editor_property('filename',
+        os.path.join(directory, entry['file']))
+    task.set_editor_property('destination_path', entry['destination'])
+    task.set_editor_property('destination_name', entry['name'])
+    task.set_editor_property('replace_existing', True)
+    task.set_editor_property('automated', True)
+    task.set_editor_property('save', True)
+    task.set_editor_property('options', import_options(entry, skeleton))
+    return task
+
+
+def run_pass(directory, entries):
+    '''
+    Import entries in one import_asset_tasks() call. Returns the number of
+    failed imports
+    '''
+    tasks = []
+    failed = 0
+    for entry in entries:
+        skeleton = None
+        path = entry.get('skeleton', {}).get('asset')
+        if (entry['asset_type'] == ANIM_SEQUENCE and not path):
+            unreal.log_error(f"{entry['file']}: no skeleton for armature " + \
+                f"\"{entry.get('armature', '')}\". Skipped")
+            failed += 1
+            continue
+        if (path):
+            skeleton = unreal.EditorAssetLibrary.load_asset(path)
+            if (skeleton is None):
+                unreal.log_error(f"{entry['file']}: skeleton {path} " + \
+                    f"does not exist. Skipped")
+                failed += 1
+                continue
+
+        if (not os.path.isfile(os.path.join(directory, entry['file']))):
+            unreal.log_warning(f"{entry['file']} does not exist. Skipped")
+            failed += 1
+            continue
+        tasks.append(import_task(directory, entry, skeleton))
+
+    if (not tasks):
+        return failed
+
+    unreal.AssetToolsHelpers.get_asset_tools().import_asset_tasks(tasks)
+    for task in tasks:
+        imported = task.get_editor_property('imported_object_paths')
+        name = os.path.basename(task.get_editor_property('filename'))
+        if (imported):
+            unreal.log(f"{name}: imported {', '.join(imported)}")
+        else:
+            unreal.log_error(f"{name}: import failed")
+            failed += 1
+    return failed
+
+
+def main(manifest_path=None):
+    if (manifest_path is None):
+        manifest_path = os.path.join(os.path.dirname(
+            os.path.abspath(__file__)), MANIFEST_NAME)
+    directory = os.path.dirname(manifest_path)
+
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    if (manifest.get('version') != MANIFEST_VERSION):
+        unreal.log_error(f"Unsupported manifest version " + \
+            f"{manifest.get('version')}")
+        return 1
+
+    # assets that create their skeleton, then those imported onto one
+    assets = sorted(manifest['assets'].values(), key=lambda e: e['file'])
+    passes = [
+        [e for e in assets if not e.get('skeleton', {}).get('asset')],
+        [e for e in assets if e.get('skeleton', {}).get('asset')],
+    ]
+
+    failed = 0
+    with unreal.ScopedSlowTask(len(passes), "Importing FBX files") as task:
+        task.make_dialog(True)
+        for entries in passes:
+            if (task.should_cancel()):
+                break
+            task.enter_progress_frame(1)
+            failed += run_pass(directory, entries)
+
+    unreal.log(f"Imported {len(assets) - failed} of {len(assets)} " + \
+        f"asset(s) from {manifest_path}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 else None)
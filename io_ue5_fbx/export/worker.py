@@ -0,0 +1,78 @@
+'''
+RUN THIS SCRIPT FROM A BACKGROUND BLENDER PROCESS.
+Headless batch export worker, started by batch.export_batch():
+
+    blender --background scene.blend --python worker.py -- jobs.json
+
+Exports each job of the job file with export_fbx(), then writes the results
+to the result file named in the job file.
+'''
+import bpy
+import os
+import sys
+import json
+import time
+
+# make the add-on importable without installing it
+addon_root = os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+if (addon_root not in sys.path):
+    sys.path.insert(0, addon_root)
+
+from io_ue5_fbx.export import export, batch
+from io_ue5_fbx.export.headless import Reporter
+
+
+def run(job_path):
+    '''
+    Export every job in the job file
+    '''
+    with open(job_path) as f:
+        spec = json.load(f)
+
+    results = []
+    for job in spec['jobs']:
+        reporter = Reporter()
+        start = time.perf_counter()
+        result = {
+            'name': job['name'],
+            'filepath': '',
+            'asset_type': job['asset_type'],
+        }
+
+        try:
+            stages = export.export_fbx_stages(
+                op=reporter,
+                context=bpy.context,
+                file_name=job['file_name'],
+                selected_mesh=job['selected_mesh'],
+                selected_armature=job['selected_armature'],
+                action=job['action'],
+                objects=[bpy.data.objects[name] for name in job['objects']],
+                strict_paths=True,
+                **spec['settings'],
+            )
+            while True:
+                try:
+                    next(stages)
+                except StopIteration as stop:
+                    result['filepath'] = stop.value
+                    break
+
+            result['status'] = 'FINISHED'
+        except Exception as error:
+            reporter.messages.append(str(error))
+            result['status'] = 'FAILED'
+
+        print(f"{batch.MARKER}done:{job['name']}", flush=True)
+
+        result['messages'] = reporter.messages
+        result['elapsed'] = time.perf_counter() - start
+        results.append(result)
+
+    with open(spec['result'], 'w') as f:
+        json.dump(results, f)
+
+
+if __name__ == '__main__':
+    run(sys.argv[sys.argv.index('--') + 1])
@@ -0,0 +1,195 @@
+import bpy
+
+
+class ObjectIndex:
+    '''
+    Objects of the scene, by object type and by collection, kept up to date
+    from depsgraph updates instead of scanning the view layer on every
+    lookup
+
+    Removed, renamed, converted and unlinked objects are found lazily, when
+    a lookup comes across them: renamed and converted objects are indexed
+    again under their new name and type, the others dropped. Scene
+    membership is checked against a set of object pointers that is only
+    rebuilt after collections change, so a lookup does not scan the scene.
+    Undo and loading a file invalidate every object, and rebuild the index
+    '''
+
+    def __init__(self):
+        self.scene = 0                # pointer of the indexed scene
+        self.by_type = {}             # type -> {name: object}, in order
+        self.by_collection = {}       # collection name -> {object pointer}
+        self.members = None           # object pointers of the scene
+
+
+    def invalidate(self):
+        '''
+        Rebuild the index on the next lookup
+        '''
+        self.scene = 0
+
+
+    def rebuild(self, scene):
+        '''
+        Index every object of the scene
+        '''
+        self.scene = scene.as_pointer()
+        self.by_type = {}
+        self.by_collection = {}
+        self.members = set()
+
+        for obj in scene.objects:
+            self.by_type.setdefault(obj.type, {})[obj.name] = obj
+            self.members.add(obj.as_pointer())
+        for coll in bpy.data.collections:
+            self.by_collection[coll.name] = \
+                {o.as_pointer() for o in coll.objects}
+
+
+    def ensure(self, scene):
+        '''
+        Rebuild the index if it is invalid, or was built for another scene
+        '''
+        if (self.scene != scene.as_pointer()):
+            self.rebuild(scene)
+
+
+    def apply_updates(self, scene, depsgraph):
+        '''
+        Index the objects and collections of the depsgraph updates
+        '''
+        if (self.scene != scene.as_pointer()):
+            return
+
+        for update in depsgraph.updates:
+            data = update.id.original
+            if (isinstance(data, bpy.types.Object)):
+                objs = self.by_type.setdefault(data.type, {})
+                if (data.name not in objs):
+                    objs[data.name] = data
+            elif (isinstance(data, bpy.types.Collection)):
+                self.by_collection[data.name] = \
+                    {o.as_pointer() for o in data.objects}
+                self.members = None
+            elif (isinstance(data, bpy.types.Scene)):
+                # objects linked to or unlinked from the scene collection
+                self.members = None
+
+
+    def is_type_update(self, scene, depsgraph):
+        '''
+        Do the depsgraph updates include an object of another type than it
+        is indexed under, such as a mesh converted to a curve? Call before
+        apply_updates(), which indexes it under its new type
+        '''
+        converted = False
+        for update in depsgraph.updates:
+            data = update.id.original
+            if (not isinstance(data, bpy.types.Object)):
+                continue
+            self.ensure(scene)
+            for obj_type, objs in self.by_type.items():
+                if (obj_type != data.type and
+                        objs.get(data.name) == data):
+                    converted = True
+                    break
+        return converted
+
+
+    def in_scene(self, obj, scene):
+        '''
+        Is obj linked to the scene? Rebuilds the scene's object pointers
+        after collections changed
+        '''
+        if (self.members is None):
+            self.members = {o.as_pointer() for o in scene.objects}
+        return obj.as_pointer() in self.members
+
+
+    def is_valid(self, name, obj, obj_type, scene):
+        '''
+        Is the indexed object still in the scene, under the same name (or
+        any name, if None) and of the same type?
+        '''
+        try:
+            return (name is None or obj.name == name) and \
+                obj.type == obj_type and self.in_scene(obj, scene)
+        except ReferenceError:
+            # removed
+            return False
+
+
+    def reindex(self, obj, scene):
+        '''
+        Index an object found under a stale name or type under its current
+        ones. Returns False if it is no longer in the scene
+        '''
+        try:
+            if (not self.in_scene(obj, scene)):
+                return False
+            self.by_type.setdefault(obj.type, {})[obj.name] = obj
+            return True
+        except ReferenceError:
+            return False
+
+
+    def objects(self, obj_type, collection=None):
+        '''
+        Objects of a type in the scene, optionally only those of a
+        collection. Generator, in the order the objects were indexed
+
+        Objects are validated as they are reached, so a lookup that stops
+        early does not visit the rest. Stale entries are re-keyed once the
+        generator finishes or is closed, since the index cannot change
+        while it is iterated
+        '''
+        scene = bpy.context.scene
+        self.ensure(scene)
+
+        objs = self.by_type.setdefault(obj_type, {})
+        members = self.by_collection.get(collection) if collection else None
+
+        stale = []
+        try:
+            for name, obj in objs.items():
+                if (not self.is_valid(name, obj, obj_type, scene)):
+                    stale.append((name, obj))
+
+                    # renamed objects of the type are yielded under their
+                    # new name, converted ones wait in their new type
+                    if (not self.is_valid(None, obj, obj_type, scene)):
+                        continue
+                if (members is not None and
+                        obj.as_pointer() not in members):
+                    continue
+                yield obj
+        finally:
+            for name, obj in stale:
+                objs.pop(name, None)
+                self.reindex(obj, scene)
+
+
+    def first(self, obj_type, collection=None):
+        '''
+        First object of a type, or None
+        '''
+        return next(self.objects(obj_type, collection), None)
+
+
+# the add-on's index, updated by the depsgraph handler
+object_index = ObjectIndex()
+
+
+def select_first(obj_type, state=True):
+    '''
+    Select (or deselect) the first object of a type. Returns the object, or
+    None if there is none in the view layer
+    '''
+    for obj in object_index.objects(obj_type):
+        try:
+            obj.select_set(state)
+        except RuntimeError:
+            # in the scene, but excluded from the view layer
+            continue
+        return obj
+    return None
@@ -0,0 +1,355 @@
+'''
+Re-export a library of Blender files, each with the settings saved in its
+own scene. Runs with a plain Python interpreter, outside Blender:
+
+    python io_ue5_fbx/library.py assets/ eva.blend "blender/*.blend" \
+        --blender /opt/blender/blender --workers 8 \
+        --log-dir logs --result library.json -- --ex-engine NATIVE
+
+Directories are searched recursively for .blend files. Each file is exported
+by a background Blender process of its own, running cli.py with
+--scene-settings, at most --workers at a time and largest file first.
+Arguments after --, such as --objects "SK_*" or --ex-engine NATIVE, are
+passed on to cli.py and override the saved settings of every file.
+
+Every process writes its output to a log of its own in --log-dir, next to
+its result. The results of all files are combined into one report, written
+to --result. The exit code is 0 if every file exported.
+'''
+import os
+import re
+import sys
+import glob
+import json
+import time
+import shutil
+import argparse
+import subprocess
+
+# the command line entry point run by each Blender process
+MAIN_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+    '__main__.py')
+
+# seconds between polls of the Blender processes
+POLL_INTERVAL = 0.1
+
+# seconds a stopped process gets to remove its partial files, before it is
+# killed
+STOP_GRACE = 10
+
+# cli.EXIT_*
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+
+
+def find_blend_files(patterns):
+    '''
+    Blender files of directories, glob patterns and paths, in the order
+    given, without duplicates. Returns (files, patterns matching nothing)
+    '''
+    files = []
+    missing = []
+    seen = set()
+
+    for pattern in patterns:
+        if (os.path.isdir(pattern)):
+            matches = []
+            for root, dirs, names in os.walk(pattern):
+                dirs.sort()
+                matches.extend(os.path.join(root, name)
+                    for name in sorted(names) if name.endswith('.blend'))
+        elif (glob.has_magic(pattern)):
+            matches = sorted(path for path in glob.glob(pattern,
+                recursive=True) if path.endswith('.blend'))
+        else:
+            matches = [pattern] if os.path.isfile(pattern) else []
+
+        if (not matches):
+            missing.append(pattern)
+        for path in matches:
+            key = os.path.normcase(os.path.realpath(path))
+            if (key not in seen):
+                seen.add(key)
+                files.append(path)
+
+    return files, missing
+
+
+def log_names(files):
+    '''
+    One unique log name per file, from its path relative to the files'
+    common directory, e.g. blender/leaf.blend -> blender_leaf
+    '''
+    paths = [os.path.abspath(path) for path in files]
+    common = os.path.commonpath([os.path.dirname(p) for p in paths]) \
+        if paths else ''
+
+    names = []
+    used = set()
+    for path in paths:
+        stem = os.path.splitext(os.path.relpath(path, common))[0]
+        name = re.sub(r'[^A-Za-z0-9_-]', '_', stem)
+        unique, i = name, 1
+        while (unique.lower() in used):
+            unique = f"{name}_{i}"
+            i += 1
+        used.add(unique.lower())
+        names.append(unique)
+    return names
+
+
+def find_blender(path=''):
+    '''
+    Blender executable: the given path, $BLENDER, or blender on the PATH
+    '''
+    return path or os.environ.get('BLENDER') or shutil.which('blender')
+
+
+def start_file(blender, job, cli_args):
+    '''
+    Start one background Blender process exporting one file
+    '''
+    cmd = [
+        blender,
+        '--background',
+        '--factory-startup',
+        '--python-exit-code', str(EXIT_FAILED),
+        '--python', MAIN_SCRIPT,
+        '--', job['blend'],
+        '--scene-settings',
+        '--result', job['result'],
+    ] + cli_args
+
+    # a stale result would hide a crash
+    if (os.path.isfile(job['result'])):
+        os.remove(job['result'])
+
+    with open(job['log'], 'w') as log:
+        return subprocess.Popen(cmd, stdout=log, stderr=subprocess.STDOUT,
+            stdin=subprocess.DEVNULL)
+
+
+def file_result(job, code, elapsed, timed_out=False):
+    '''
+    Result of one file, from the result its process wrote
+    '''
+    result = {
+        'blend': job['blend'],
+        'status': 'FAILED',
+        'exit_code': code,
+        'elapsed': elapsed,
+        'log': job['log'],
+        'exports': [],
+        'messages': [],
+    }
+
+    summary = None
+    if (os.path.isfile(job['result'])):
+        try:
+            with open(job['result']) as f:
+                summary = json.load(f)
+        except (OSError, ValueError) as error:
+            result['messages'].append(f"Unreadable result: {error}")
+
+    if (summary is not None):
+        result['exports'] = summary.get('files', [])
+        if (code == EXIT_OK and summary.get('status') == 'FINISHED'):
+            result['status'] = 'FINISHED'
+        for export in result['exports']:
+            if (export.get('status') != 'FINISHED'):
+                name = export.get('name') or 'Export'
+                result['messages'].append(f"{name}: " + \
+                    '; '.join(export.get('messages', [])))
+
+    if (timed_out):
+        result['messages'].append(f"Stopped after {elapsed:.0f}s")
+    elif (summary is None):
+        result['messages'].append(f"Blender exited with code {code} " + \
+            f"without a result, see {job['log']}")
+
+    return result
+
+
+def export_library(blender, files, log_dir, workers = 4, timeout = 0,
+                   cli_args = None, out = sys.stdout):
+    """
+    Export every file in its own background Blender process, at most workers
+    at a time. Files are started largest first, so that a large file does
+    not start last and hold up the whole run
+
+    Keyword arguments:
+
+    blender:  Blender executable
+    files:    Blender files to export
+    log_dir:  Directory of the per-file logs and results
+
+    Optional keyword arguments:
+
+    workers:  Number of Blender processes run at once
+    timeout:  Seconds after which a file's process is stopped, 0 for none.
+              It is killed if it does not exit within STOP_GRACE seconds
+    cli_args: Arguments passed on to cli.py
+    out:      Stream of the progress lines, one per finished file
+
+    Returns a list of results, one per file, in the order of files
+    """
+
+    os.makedirs(log_dir, exist_ok=True)
+    cli_args = cli_args or []
+
+    # 1.) one job per file, largest first
+    jobs = []
+    for i, (path, name) in enumerate(zip(files, log_names(files))):
+        jobs.append({
+            'index': i,
+            'blend': os.path.abspath(path),
+            'log': os.path.join(log_dir, f"{name}.log"),
+            'result': os.path.join(log_dir, f"{name}.json"),
+            'cost': os.path.getsize(path),
+        })
+    pending = sorted(jobs, key=lambda j: j['cost'], reverse=True)
+
+    # 2.) keep up to workers processes running until all files are done
+    results = [None] * len(jobs)
+    running = {}
+    stopping = {}
+    try:
+        while (pending or running):
+            while (pending and len(running) < workers):
+                job = pending.pop(0)
+                running[job['index']] = (job, time.perf_counter(),
+                    start_file(blender, job, cli_args))
+
+            for index, (job, start, proc) in list(running.items()):
+                elapsed = time.perf_counter() - start
+                if (proc.poll() is None):
+                    if (not timeout or elapsed <= timeout):
+                        continue
+
+                    # cli.py exits on SIGTERM, removing its partial files.
+                    # Kill it only if it does not exit in time
+                    if (index not in stopping):
+                        proc.terminate()
+                        stopping[index] = time.perf_counter()
+                        continue
+                    if (time.perf_counter() - stopping[index] < STOP_GRACE):
+                        continue
+                    proc.kill()
+
+                proc.wait()
+                del running[index]
+                result = file_result(job, proc.returncode, elapsed,
+                    index in stopping)
+                results[index] = result
+
+                done = sum(r is not None for r in results)
+                print(f"[{done}/{len(jobs)}] {result['status']} " + \
+                    f"{job['blend']} ({len(result['exports'])} export(s), " + \
+                    f"{elapsed:.1f}s)", file=out, flush=True)
+                for message in result['messages']:
+                    print(f"    {message}", file=out, flush=True)
+
+            time.sleep(POLL_INTERVAL)
+
+    finally:
+        # interrupted: stop the processes still running
+        for job, _, proc in running.values():
+            if (proc.poll() is None):
+                proc.terminate()
+        for job, _, proc in running.values():
+            try:
+                proc.wait(timeout=STOP_GRACE)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.wait()
+
+    return results
+
+
+def make_parser():
+    parser = argparse.ArgumentParser(
+        prog='library.py',
+        description="Export a library of Blender files to Unreal Engine " + \
+            "5, each with the io_ue5_fbx settings saved in its scene",
+        epilog="Arguments after -- are passed on to cli.py, and " + \
+            "override the saved settings of every file",
+    )
+    parser.add_argument('paths', nargs='+', metavar='PATH',
+        help="Blender files, directories, or glob patterns")
+    parser.add_argument('--blender', default='',
+        help="Blender executable. Defaults to $BLENDER, or blender on " + \
+            "the PATH")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+        help="Number of Blender processes run at once")
+    parser.add_argument('--timeout', type=float, default=0,
+        help="Seconds after which a file is stopped, 0 for none")
+    parser.add_argument('--log-dir', default='io_ue5_fbx_logs',
+        help="Directory of the per-file logs and results")
+    parser.add_argument('--result', metavar='JSON',
+        help="Write the combined report to this file")
+    return parser
+
+
+def main(argv=None):
+    '''
+    Parse the arguments, export every file, and report. Returns the exit code
+    '''
+    argv = sys.argv[1:] if argv is None else argv
+
+    # arguments of cli.py follow '--'
+    cli_args = []
+    if ('--' in argv):
+        index = argv.index('--')
+        argv, cli_args = argv[:index], argv[index + 1:]
+
+    try:
+        args = make_parser().parse_args(argv)
+    except SystemExit as error:
+        return EXIT_OK if error.code == 0 else EXIT_USAGE
+
+    blender = find_blender(args.blender)
+    if (not blender):
+        print("Blender not found. Pass --blender, or set $BLENDER",
+            file=sys.stderr)
+        return EXIT_USAGE
+
+    files, missing = find_blend_files(args.paths)
+    for pattern in missing:
+        print(f"No Blender files match {pattern}", file=sys.stderr)
+    if (not files):
+        return EXIT_USAGE
+
+    log_dir = os.path.abspath(args.log_dir)
+    workers = max(1, args.workers)
+    start = time.perf_counter()
+    results = export_library(blender, files, log_dir,
+        workers=workers,
+        timeout=args.timeout,
+        cli_args=cli_args,
+        )
+
+    failed = [r for r in results if r['status'] != 'FINISHED']
+    code = EXIT_FAILED if failed or missing else EXIT_OK
+    report = {
+        'status': 'FAILED' if code else 'FINISHED',
+        'exit_code': code,
+        'elapsed': time.perf_counter() - start,
+        'blender': blender,
+        'workers': workers,
+        'missing': missing,
+        'exported': len(results) - len(failed),
+        'failed': len(failed),
+        'files': results,
+    }
+    if (args.result):
+        with open(args.result, 'w') as f:
+            json.dump(report, f, indent=4)
+
+    print(f"Exported {report['exported']} of {len(results)} file(s) " + \
+        f"in {report['elapsed']:.1f}s, logs in {log_dir}")
+    return code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
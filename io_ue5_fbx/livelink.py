@@ -0,0 +1,226 @@
+'''
+Live link. Watches the exports made while it is enabled, and queues them
+again when the objects, data or actions they export change: after edits
+pause, or when the blend file is saved. A burst of edits makes a single
+export per asset
+'''
+import bpy
+import time
+import bpy.app.handlers as handlers
+from bpy.app.handlers import persistent
+from .constants import AddonLiveLink, BlenderTypes
+from .export import anim, jobs
+
+# watched exports of the open file: target -> job
+watched = {}
+
+# data-blocks the watched exports depend on: (type, name) -> {target}
+dependencies = {}
+
+# targets changed since they were last queued
+dirty = set()
+
+# time of the last edit of a watched data-block
+last_edit = 0.0
+
+# frame of the last update. Updates that change the frame are playback
+last_frame = None
+
+
+def id_key(data):
+    '''
+    Key of a data-block in dependencies, such as ('Mesh', 'Cube')
+    '''
+    return (data.bl_rna.identifier, data.name)
+
+
+def job_dependencies(job):
+    '''
+    Keys of the objects of a job, their data, and the actions of its
+    armatures
+    '''
+    keys = set()
+    for name in job['objects']:
+        obj = bpy.data.objects.get(name)
+        if (obj is None):
+            continue
+        keys.add(id_key(obj))
+        if (obj.data is not None):
+            keys.add(id_key(obj.data))
+        if (obj.type == BlenderTypes.ARMATURE):
+            keys.update(id_key(a) for a in anim.armature_actions(obj))
+    return keys
+
+
+def watch(job):
+    '''
+    Watch an exported job, if the live link is enabled. Called after each
+    successful export, so that a re-export refreshes its dependencies
+    '''
+    global last_frame
+
+    io_props = bpy.context.scene.io_ue5_fbx
+    if (io_props.ex_live_link == AddonLiveLink.OFF.name):
+        return
+
+    last_frame = bpy.context.scene.frame_current
+
+    target = job['target']
+    if (target in watched):
+        unwatch(target)
+
+    # the manifest skips exports whose content is unchanged
+    settings = dict(job['settings'], skip_unchanged=True)
+    watched[target] = dict(job, settings=settings)
+    for key in job_dependencies(job):
+        dependencies.setdefault(key, set()).add(target)
+
+
+def unwatch(target):
+    '''
+    Stop watching the export to target
+    '''
+    watched.pop(target, None)
+    dirty.discard(target)
+    for targets in dependencies.values():
+        targets.discard(target)
+
+
+def clear():
+    '''
+    Stop watching every export
+    '''
+    global last_frame
+    watched.clear()
+    dependencies.clear()
+    dirty.clear()
+    last_frame = None
+
+
+def on_depsgraph_update(scene, depsgraph):
+    '''
+    Mark the watched exports that depend on updated data-blocks. Called by
+    the add-on's depsgraph handler
+    '''
+    global last_edit, last_frame
+
+    io_props = scene.io_ue5_fbx
+    if (io_props.ex_live_link == AddonLiveLink.OFF.name or not watched):
+        return
+
+    # updates caused by the running export itself
+    if (jobs.export_queue.running is not None):
+        return
+
+    # playback and scrubbing move objects, but do not edit them
+    frame = scene.frame_current
+    if (frame != last_frame):
+        last_frame = frame
+        return
+
+    changed = False
+    for update in depsgraph.updates:
+        data = update.id.original
+        if (isinstance(data, bpy.types.Object) and
+                not (update.is_updated_transform or
+                     update.is_updated_geometry)):
+            continue
+        targets = dependencies.get(id_key(data))
+        if (targets):
+            dirty.update(targets)
+            changed = True
+
+    if (not changed or io_props.ex_live_link != AddonLiveLink.EDIT.name):
+        return
+
+    last_edit = time.monotonic()
+    if (not bpy.app.timers.is_registered(flush_after_edits)):
+        bpy.app.timers.register(flush_after_edits,
+            first_interval=io_props.ex_live_delay)
+
+
+def flush_after_edits():
+    '''
+    Timer. Queue the changed exports once no edit happened for the quiet
+    period. Every edit pushes the flush back
+    '''
+    delay = bpy.context.scene.io_ue5_fbx.ex_live_delay
+    remaining = last_edit + delay - time.monotonic()
+    if (remaining > 0):
+        return remaining
+
+    flush()
+    return None # do not repeat
+
+
+def flush():
+    '''
+    Queue the changed exports. Returns the number of exports queued
+    '''
+    from .operators import start_export_queue, tag_redraw
+
+    io_props = bpy.context.scene.io_ue5_fbx
+    if (io_props.ex_live_link == AddonLiveLink.OFF.name):
+        dirty.clear()
+        return 0
+
+    count = 0
+    for target in sorted(dirty):
+        job = watched.get(target)
+        if (job is None):
+            continue
+        queued = {key: value for key, value in job.items()
+            if key != 'sequence'}
+        queued.update(blend=bpy.data.filepath, attempts=0, not_before=0.0,
+            errors=[], state=jobs.QUEUED)
+        jobs.export_queue.push(queued)
+        count += 1
+    dirty.clear()
+
+    if (count):
+        # the panel shows the queued exports
+        tag_redraw()
+        start_export_queue()
+    return count
+
+
+@persistent
+def on_save_post(*args):
+    '''
+    Saving the file exports the changed assets right away
+    '''
+    if (bpy.app.timers.is_registered(flush_after_edits)):
+        bpy.app.timers.unregister(flush_after_edits)
+    if (dirty):
+        flush()
+
+
+@persistent
+def on_load_post(*args):
+    '''
+    The exports of the previous file are no longer watched
+    '''
+    clear()
+
+
+def register():
+    '''
+    Add the save and load event listeners
+    '''
+    if (on_save_post not in handlers.save_post):
+        handlers.save_post.append(on_save_post)
+    if (on_load_post not in handlers.load_post):
+        handlers.load_post.append(on_load_post)
+
+
+def unregister():
+    '''
+    Remove the save and load event listeners
+    '''
+    if (on_save_post in handlers.save_post):
+        handlers.save_post.remove(on_save_post)
+    if (on_load_post in handlers.load_post):
+        handlers.load_post.remove(on_load_post)
+    if (bpy.app.timers.is_registered(flush_after_edits)):
+        bpy.app.timers.unregister(flush_after_edits)
+    clear()
@@ -1,11 +1,66 @@
 import bpy
 import os
+import time
 
 from bpy.types import Operator
 from bpy.props import StringProperty, BoolProperty
+from bpy.app.handlers import persistent
+
+from . import properties, livelink
+from .index import select_first
+from .export import export, batch, headless, jobs
+from .constants import \
+(
+    BlenderTypes,
+    BlenderUnits,
+    AddonUnits,
+    AddonSmoothing,
+    AddonBatch,
+)
+
+# seconds between the stages of a queued export
+QUEUE_INTERVAL = 0.02
+
+# events that still reach Blender while an export runs: view navigation,
+# and events of the window and of other timers. Others could edit the
+# objects the export is reading, and are blocked
+EXPORT_PASS_EVENTS = {
+    'MOUSEMOVE',
+    'INBETWEEN_MOUSEMOVE',
+    'MIDDLEMOUSE',
+    'WHEELUPMOUSE',
+    'WHEELDOWNMOUSE',
+    'WHEELINMOUSE',
+    'WHEELOUTMOUSE',
+    'TRACKPADPAN',
+    'TRACKPADZOOM',
+    'MOUSEROTATE',
+    'MOUSESMARTZOOM',
+    'NDOF_MOTION',
+    'WINDOW_DEACTIVATE',
+    'TIMER_REPORT',
+    'TIMERREGION',
+}
+
+
+def is_over(rect, event):
+    '''
+    Is the mouse over an area or region?
+    '''
+    return rect is not None and \
+        rect.x <= event.mouse_x < rect.x + rect.width and \
+        rect.y <= event.mouse_y < rect.y + rect.height
+
+
+def tag_redraw():
+    '''
+    Redraw the 3D viewports, where the export progress is drawn
+    '''
+    for window in bpy.context.window_manager.windows:
+        for area in window.screen.areas:
+            if (area.type == 'VIEW_3D'):
+                area.tag_redraw()
 
-from .export import export
-from .constants import BlenderTypes, BlenderUnits, AddonUnits, AddonSmoothing
 
 class Base_Filebrowser:
 
@@ -116,11 +171,7 @@ class OT_Reset(Operator):
         bpy.context.scene.io_ue5_fbx.fp_file_name = stem
 
         # set object type. Try to select the mesh if it exists
-        objs = bpy.context.view_layer.objects
-        for obj in objs:
-            if obj.type == BlenderTypes.MESH:
-                obj.select_set(True)
-                break
+        select_first(BlenderTypes.MESH)
 
         # set transform units based on Blender scene units
         if (units == BlenderUnits.NONE.value):
@@ -149,6 +200,12 @@ class OT_Export(Operator):
     bl_label = "Export FBX"
     bl_description = "Export selected objects to the FBX file"
 
+    # state of the running export, drawn by VIEW3D_PT_Export
+    running = False
+    cancelled = False
+    progress = 0.0
+    status = ''
+
 
     @classmethod
     def description(cls, context, properties):
@@ -158,35 +215,310 @@ class OT_Export(Operator):
         return cls.bl_description
 
 
+    def export_stages(self, context):
+        '''
+        Start the export. Returns a generator of (progress, status)
+        '''
+        io_props = context.scene.io_ue5_fbx
+
+        # one FBX file per object or collection, in background processes
+        if (io_props.bt_mode != AddonBatch.OFF.name):
+            return batch.export_batch_stages(op=self, # access to report()
+                                             context=context,
+                                             **properties.batch_settings(io_props),
+                                             )
+
+        return export.export_fbx_stages(op=self, # access to report()
+                                        context=context,
+                                        **properties.export_settings(io_props),
+                                        )
+
+
     def execute(self, context):
+        '''
+        Exports the FBX file, blocking. Used when called from a script
+        '''
+        io_props = context.scene.io_ue5_fbx
+        batch_mode = io_props.bt_mode != AddonBatch.OFF.name
+
+        for _ in self.export_stages(context):
+            # wait for the background workers between polls
+            if (batch_mode):
+                time.sleep(batch.POLL_INTERVAL)
+        return {'FINISHED'}
+
+
+    def invoke(self, context, event):
         '''
         Executes when this button is clicked. 
-        Exports the FBX file.
+        Exports the FBX file in stages, driven by a timer
         '''
         io_props = context.scene.io_ue5_fbx
+        if (io_props.bt_mode != AddonBatch.OFF.name):
+            settings = properties.batch_settings(io_props)
+        else:
+            settings = properties.export_settings(io_props)
+        job = jobs.make_job(context,
+                            io_props.bt_mode,
+                            settings,
+                            priority=io_props.ex_priority,
+                            retries=io_props.ex_retries,
+                            )
+
+        # queue the request behind the running export
+        if (OT_Export.running):
+            if (jobs.export_queue.push(job)):
+                self.report({'INFO'}, f"Merged with the queued export")
+            else:
+                self.report({'INFO'}, f"Export queued")
+            start_export_queue()
+            return {'FINISHED'}
+
+        # run the first queued job, which may have a higher priority
+        jobs.export_queue.push(job)
+        self.job = jobs.export_queue.pop()
+        if (self.job is None):
+            start_export_queue()
+            return {'FINISHED'}
+
+        OT_Export.running = True
+        OT_Export.cancelled = False
+        OT_Export.progress = 0.0
+        OT_Export.status = "Starting export"
+
+        try:
+            self.stages = jobs.export_job_stages(self, context, self.job)
+        except Exception as error:
+            self.fail(context, error)
+            return {'CANCELLED'}
+
+        # the sidebar of the button, where Cancel is drawn, if the export
+        # was started from it
+        self.area = context.area
+        self.region = context.region \
+            if context.region and context.region.type == 'UI' else None
+
+        wm = context.window_manager
+        self.timer = wm.event_timer_add(0.02, window=context.window)
+        wm.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
+
+
+    def modal(self, context, event):
+        '''
+        Run one export stage per timer event. Escape over the area of the
+        export, or the Cancel button, cancels
+
+        The stages hold the objects, with armature modifiers and the action
+        overridden, between timer events. Events that could edit them are
+        blocked, except in the sidebar of the Cancel button
+        '''
+        escape = event.type == 'ESC' and event.value == 'PRESS' and \
+            is_over(self.area, event)
+        if (escape or OT_Export.cancelled):
+            # runs the cleanup of the stages, removing partial files
+            self.stages.close()
+            jobs.export_queue.finish(self.job)
+            self.finish(context)
+            self.report({'WARNING'}, f"Export cancelled")
+            return {'CANCELLED'}
+
+        if (event.type != 'TIMER'):
+            if (event.type in EXPORT_PASS_EVENTS or
+                    is_over(self.region, event)):
+                return {'PASS_THROUGH'}
+            return {'RUNNING_MODAL'}
+
+        try:
+            [OT_Export.progress, OT_Export.status] = next(self.stages)
+        except StopIteration:
+            jobs.export_queue.finish(self.job)
+            livelink.watch(self.job)
+            self.finish(context)
+            return {'FINISHED'}
+        except Exception as error:
+            self.stages.close()
+            self.fail(context, error)
+            return {'CANCELLED'}
+
+        self.redraw(context)
+        return {'PASS_THROUGH'}
+
+
+    def fail(self, context, error):
+        if (jobs.export_queue.fail(self.job, error)):
+            self.report({'WARNING'}, f"Export failed, retrying: {error}")
+        else:
+            self.report({'ERROR'}, f"Export failed: {error}")
+        self.finish(context)
+
+
+    def finish(self, context):
+        if (hasattr(self, 'timer')):
+            context.window_manager.event_timer_remove(self.timer)
+        OT_Export.running = False
+        OT_Export.cancelled = False
+        self.redraw(context)
+
+        # run the exports queued meanwhile
+        start_export_queue()
+
+
+    def redraw(self, context):
+        for area in context.screen.areas:
+            if (area.type == 'VIEW_3D'):
+                area.tag_redraw()
+
+
+class OT_Export_Cancel(Operator):
+
+    bl_idname = "op.export_cancel"
+    bl_label = "Cancel"
+    bl_description = "Cancel the running export"
 
-        export.export_fbx(op=self, # access to report()
-                          context=context,
-                          dir_name=io_props.fp_project_dir,
-                          subdir_name=io_props.fp_project_subdir,
-                          file_name=io_props.fp_file_name,
-                          selected_mesh = io_props.ob_mesh,
-                          selected_armature = io_props.ob_armature,
-                          scale=io_props.tr_scale,
-                          units=io_props.tr_units,
-                          smoothing=io_props.tr_smoothing,
-                          add_leaf_bones = io_props.ar_leaf_bones,
-                          bake_animation = io_props.ar_bake_animation,
-                          )
-        
+
+    @classmethod
+    def description(cls, context, properties):
+        '''
+        Show the tooltip
+        '''
+        return cls.bl_description
+
+
+    def execute(self, context):
+        '''
+        Executes when this button is clicked. 
+        The export stops at its next stage.
+        '''
+        OT_Export.cancelled = True
+        return {'FINISHED'}
+
+
+class OT_Export_Queue_Clear(Operator):
+
+    bl_idname = "op.export_queue_clear"
+    bl_label = "Clear Queue"
+    bl_description = "Remove the queued exports of this file"
+
+
+    @classmethod
+    def description(cls, context, properties):
+        '''
+        Show the tooltip
+        '''
+        return cls.bl_description
+
+
+    def execute(self, context):
+        '''
+        Executes when this button is clicked. 
+        The running export is not affected.
+        '''
+        jobs.export_queue.clear()
+        self.report({'INFO'}, f"Export queue cleared")
         return {'FINISHED'}
 
 
+# queued export run by run_export_queue(): (job, stages, reporter)
+queue_state = None
+
+
+def run_export_queue():
+    '''
+    Timer. Run the queued exports of the open file one at a time, one stage
+    per call. Shares the progress and Cancel button of OT_Export
+    '''
+    global queue_state
+
+    if (queue_state is None):
+        # wait for the export started from the button
+        if (OT_Export.running):
+            return QUEUE_INTERVAL
+
+        job = jobs.export_queue.pop()
+        if (job is None):
+            # sleep until a failed job may be retried
+            wait = jobs.export_queue.next_ready()
+            return None if wait is None else max(wait, QUEUE_INTERVAL)
+
+        reporter = headless.Reporter()
+        OT_Export.running = True
+        OT_Export.cancelled = False
+        OT_Export.progress = 0.0
+        OT_Export.status = f"Starting queued export"
+        try:
+            stages = jobs.export_job_stages(reporter, bpy.context, job)
+        except Exception as error:
+            finish_queued_job(job, reporter, error)
+            return QUEUE_INTERVAL
+        queue_state = (job, stages, reporter)
+
+    [job, stages, reporter] = queue_state
+
+    if (OT_Export.cancelled):
+        # runs the cleanup of the stages, removing partial files
+        stages.close()
+        reporter.report({'WARNING'}, f"Export cancelled")
+        finish_queued_job(job, reporter)
+        return QUEUE_INTERVAL
+
+    try:
+        [OT_Export.progress, OT_Export.status] = next(stages)
+    except StopIteration:
+        finish_queued_job(job, reporter)
+    except Exception as error:
+        stages.close()
+        finish_queued_job(job, reporter, error)
+
+    tag_redraw()
+    return QUEUE_INTERVAL
+
+
+def finish_queued_job(job, reporter, error=None):
+    '''
+    Record the outcome of the queued job, and free the progress bar
+    '''
+    global queue_state
+    queue_state = None
+
+    if (error is None):
+        jobs.export_queue.finish(job)
+        livelink.watch(job)
+    elif (jobs.export_queue.fail(job, error)):
+        reporter.report({'WARNING'}, f"Export failed, retrying: {error}")
+    else:
+        reporter.report({'ERROR'}, f"Export failed: {error}")
+
+    OT_Export.running = False
+    OT_Export.cancelled = False
+    tag_redraw()
+
+
+def start_export_queue():
+    '''
+    Run the queued exports, unless they are already running
+    '''
+    if (not bpy.app.timers.is_registered(run_export_queue)):
+        bpy.app.timers.register(run_export_queue,
+            first_interval=QUEUE_INTERVAL)
+
+
+@persistent
+def resume_export_queue(*args):
+    '''
+    Run the exports queued for the file just opened
+    '''
+    if (jobs.export_queue.pending()):
+        start_export_queue()
+
+
 op_classes = [
     OT_Filebrowser_Dir,
     OT_Filebrowser_Subdir,
     OT_Reset,
     OT_Export,
+    OT_Export_Cancel,
+    OT_Export_Queue_Clear,
 ]
 
 
@@ -197,10 +529,29 @@ def register():
     for op_class in op_classes:
         bpy.utils.register_class(op_class)
 
+    # exports queued before Blender was closed
+    jobs.export_queue.path = jobs.queue_path()
+    jobs.export_queue.load()
+    if (resume_export_queue not in bpy.app.handlers.load_post):
+        bpy.app.handlers.load_post.append(resume_export_queue)
+    resume_export_queue()
+
 
 def unregister():
     """
     Unegisters the operator classes
     """
+    if (resume_export_queue in bpy.app.handlers.load_post):
+        bpy.app.handlers.load_post.remove(resume_export_queue)
+    if (bpy.app.timers.is_registered(run_export_queue)):
+        bpy.app.timers.unregister(run_export_queue)
+    global queue_state
+    if (queue_state is not None):
+        # queued again if it has retries left, for when the add-on is enabled
+        [job, stages, _] = queue_state
+        stages.close()
+        jobs.export_queue.fail(job, "Add-on disabled")
+        queue_state = None
+
     for op_class in reversed(op_classes):
         bpy.utils.unregister_class(op_class)
@@ -13,6 +13,7 @@ from bpy.props import \
     PointerProperty,
 )
 
+from .index import select_first
 from .constants import \
 (
     BlenderTypes,
@@ -20,6 +21,11 @@ from .constants import \
     BlenderUnits,
     AddonUnits,
     AddonSmoothing, 
+    AddonBatch,
+    AddonEngine,
+    AddonInfluences,
+    AddonLiveLink,
+    AddonTextureFormat,
 )
 
 def update_mesh_object_type(self, context):
@@ -27,12 +33,7 @@ def update_mesh_object_type(self, context):
     After toggling boolean property, select the first mesh object from scene
     '''
     ob_mesh = context.scene.io_ue5_fbx.ob_mesh
-    objs = bpy.context.view_layer.objects
-
-    for obj in objs:
-        if obj.type == BlenderTypes.MESH:
-            obj.select_set(ob_mesh)
-            break
+    select_first(BlenderTypes.MESH, ob_mesh)
 
 
 def update_armature_object_type(self, context):
@@ -40,12 +41,7 @@ def update_armature_object_type(self, context):
     After toggling boolean property, select the first armature object from scene
     '''
     ob_armature = context.scene.io_ue5_fbx.ob_armature
-    objs = bpy.context.view_layer.objects
-
-    for obj in objs:
-        if obj.type == BlenderTypes.ARMATURE:
-            obj.select_set(ob_armature)
-            break        
+    select_first(BlenderTypes.ARMATURE, ob_armature)
 
 
 class PG_Properties(bpy.types.PropertyGroup):
@@ -121,6 +117,287 @@ class PG_Properties(bpy.types.PropertyGroup):
         default=True,
     )
 
+    ar_limit_influences: BoolProperty(
+        name="Limit Influences",
+        description="Keep the largest bone weights of each vertex, drop " + \
+            "the weights below the threshold and renormalize the rest. " + \
+            "The mesh itself is not modified",
+        default=False,
+    )
+
+    ar_max_influences: EnumProperty(
+        name="Max",
+        description="Bone influences kept per vertex",
+        items=[
+            (AddonInfluences.FOUR.name, AddonInfluences.FOUR.value, 'Keep 4 influences per vertex'),
+            (AddonInfluences.EIGHT.name, AddonInfluences.EIGHT.value, 'Keep 8 influences per vertex'),
+            (AddonInfluences.TWELVE.name, AddonInfluences.TWELVE.value, 'Keep 12 influences per vertex'),
+        ],
+        default=AddonInfluences.EIGHT.name,
+    )
+
+    ar_weight_threshold: FloatProperty(
+        name="Weight Threshold",
+        description="Drop bone weights below this value. The largest " + \
+            "weight of each vertex is always kept",
+        precision=3,
+        default=0.01,
+        min=0,
+        max=1,
+    )
+
+    ar_reduce_keys: BoolProperty(
+        name="Reduce Keys",
+        description="Drop baked keys that linear interpolation between " + \
+            "the remaining keys reproduces within the tolerances " + \
+            "(native writer)",
+        default=False,
+    )
+
+    ar_location_tolerance: FloatProperty(
+        name="Location",
+        description="Largest location error of key reduction",
+        precision=4,
+        default=0.0001,
+        min=0,
+        soft_max=0.1,
+        unit='LENGTH',
+    )
+
+    ar_rotation_tolerance: FloatProperty(
+        name="Rotation",
+        description="Largest rotation error of key reduction, in degrees",
+        precision=3,
+        default=0.01,
+        min=0,
+        soft_max=5,
+    )
+
+    ar_scale_tolerance: FloatProperty(
+        name="Scale",
+        description="Largest scale error of key reduction",
+        precision=4,
+        default=0.0001,
+        min=0,
+        soft_max=0.1,
+    )
+
+    bt_mode: EnumProperty(
+        name="Batch",
+        description="Split the selection into several FBX files",
+        items=[
+            (AddonBatch.OFF.name, AddonBatch.OFF.value, 'Export the selection to a single FBX file'),
+            (AddonBatch.OBJECT.name, AddonBatch.OBJECT.value, 'Export each selected root object, with its selected children, to its own FBX file'),
+            (AddonBatch.COLLECTION.name, AddonBatch.COLLECTION.value, 'Export the selected objects of each collection to their own FBX file'),
+            (AddonBatch.ACTION.name, AddonBatch.ACTION.value, 'Export each action of the selected armatures to its own skeleton-only FBX file, for Unreal AnimSequence assets'),
+        ],
+        default=AddonBatch.OFF.name,
+    )
+
+    bt_workers: IntProperty(
+        name="Workers",
+        description="Number of background Blender processes used for batch export",
+        default=4,
+        min=1,
+        soft_max=64,
+    )
+
+    tx_textures: BoolProperty(
+        name="Export Textures",
+        description="Write the images used by the materials of the " + \
+            "exported meshes to a texture directory. Identical images " + \
+            "are written once, and unchanged images are not written again",
+        default=False,
+    )
+
+    tx_subdir: StringProperty(
+        name="Directory",
+        description="Texture directory, relative to the FBX file directory",
+        default='Textures',
+    )
+
+    tx_max_size: IntProperty(
+        name="Max Size",
+        description="Scale down textures whose width or height is " + \
+            "larger, keeping their aspect ratio. 0 keeps the original size",
+        default=0,
+        min=0,
+        soft_max=8192,
+    )
+
+    tx_format: EnumProperty(
+        name="Format",
+        description="File format of the written textures",
+        items=[
+            (AddonTextureFormat.ORIGINAL.name, AddonTextureFormat.ORIGINAL.value, 'Keep the file format of each image'),
+            (AddonTextureFormat.PNG.name, AddonTextureFormat.PNG.value, 'Convert to PNG'),
+            (AddonTextureFormat.TARGA.name, AddonTextureFormat.TARGA.value, 'Convert to Targa'),
+            (AddonTextureFormat.JPEG.name, AddonTextureFormat.JPEG.value, 'Convert to JPEG. Lossy, without alpha'),
+        ],
+        default=AddonTextureFormat.ORIGINAL.name,
+    )
+
+    ex_skip_unchanged: BoolProperty(
+        name="Skip Unchanged",
+        description="Skip the export if the mesh, armature, animation and " + \
+            "settings are unchanged since the last export to the same file",
+        default=False,
+    )
+
+    ex_engine: EnumProperty(
+        name="Writer",
+        description="Engine used to write the FBX file",
+        items=[
+            (AddonEngine.BLENDER.name, AddonEngine.BLENDER.value, 'Export with bpy.ops.export_scene.fbx'),
+            (AddonEngine.NATIVE.name, AddonEngine.NATIVE.value, 'Stream a binary FBX file from NumPy arrays. Faster, with lower peak memory on dense meshes'),
+        ],
+        default=AddonEngine.BLENDER.name,
+    )
+
+    ex_compression: IntProperty(
+        name="Compression",
+        description="zlib level of the native writer's array data. " + \
+            "0 stores arrays uncompressed, for fast local iteration",
+        default=6,
+        min=0,
+        max=9,
+    )
+
+    ex_memory_budget: IntProperty(
+        name="Memory Budget (MB)",
+        description="Stream geometry in chunks, holding at most this " + \
+            "much mesh data at once, and fail before exceeding it. " + \
+            "0 holds whole arrays (native writer)",
+        default=0,
+        min=0,
+        soft_max=65536,
+    )
+
+    ex_vertex_limit: IntProperty(
+        name="Vertex Limit",
+        description="Split meshes with more vertices into pieces of at " + \
+            "most this many vertices, each its own model. Skinned " + \
+            "meshes are not split. 0 never splits (native writer)",
+        default=0,
+        min=0,
+        soft_max=10000000,
+    )
+
+    ex_write_trace: BoolProperty(
+        name="Write Trace",
+        description="Write the time spent in each export phase to a " + \
+            "Chrome trace file (.trace.json) next to the FBX file",
+        default=False,
+    )
+
+    ex_keep_identical: BoolProperty(
+        name="Keep Identical",
+        description="Keep the previous FBX file if the new export only " + \
+            "differs in timestamps and creation metadata, so that " + \
+            "Unreal does not reimport it",
+        default=False,
+    )
+
+    ex_import_manifest: BoolProperty(
+        name="Unreal Import Script",
+        description="Add each exported file to a JSON manifest next to " + \
+            "it, with its asset type, skeleton and import settings, and " + \
+            "copy a Python script that imports them all into Unreal",
+        default=False,
+    )
+
+    ex_priority: IntProperty(
+        name="Priority",
+        description="Queued exports run in order of priority, highest " + \
+            "first. Exporting again to a queued target merges the requests",
+        default=0,
+        soft_min=-10,
+        soft_max=10,
+    )
+
+    ex_retries: IntProperty(
+        name="Retries",
+        description="Number of times a failed export is queued again, " + \
+            "with a growing delay",
+        default=2,
+        min=0,
+        max=10,
+    )
+
+    ex_live_link: EnumProperty(
+        name="Live Link",
+        description="Export again when the exported objects change. " + \
+            "Watches the exports made while enabled",
+        items=[
+            (AddonLiveLink.OFF.name, AddonLiveLink.OFF.value, 'Only export from the Export button'),
+            (AddonLiveLink.SAVE.name, AddonLiveLink.SAVE.value, 'Export the changed assets again when the blend file is saved'),
+            (AddonLiveLink.EDIT.name, AddonLiveLink.EDIT.value, 'Export the changed assets again once edits pause, and when the blend file is saved'),
+        ],
+        default=AddonLiveLink.OFF.name,
+    )
+
+    ex_live_delay: FloatProperty(
+        name="Quiet Period",
+        description="Seconds without edits before the changed assets " + \
+            "are exported again. A burst of edits makes a single export",
+        default=1.0,
+        min=0.1,
+        soft_max=10.0,
+        unit='TIME_ABSOLUTE',
+    )
+
+def export_settings(io_props):
+    '''
+    Keyword arguments of export_fbx() from the add-on properties. io_props
+    is the scene's PG_Properties, or any object with the same attributes,
+    such as parsed command line arguments
+    '''
+    return {
+        'dir_name': io_props.fp_project_dir,
+        'subdir_name': io_props.fp_project_subdir,
+        'file_name': io_props.fp_file_name,
+        'selected_mesh': io_props.ob_mesh,
+        'selected_armature': io_props.ob_armature,
+        'scale': io_props.tr_scale,
+        'units': io_props.tr_units,
+        'smoothing': io_props.tr_smoothing,
+        'add_leaf_bones': io_props.ar_leaf_bones,
+        'weight_limits': (
+            int(AddonInfluences[io_props.ar_max_influences].value),
+            io_props.ar_weight_threshold,
+        ) if io_props.ar_limit_influences else None,
+        'bake_animation': io_props.ar_bake_animation,
+        'key_tolerance': (
+            io_props.ar_location_tolerance,
+            io_props.ar_rotation_tolerance,
+            io_props.ar_scale_tolerance,
+        ) if io_props.ar_reduce_keys else None,
+        'skip_unchanged': io_props.ex_skip_unchanged,
+        'engine': io_props.ex_engine,
+        'compression': io_props.ex_compression,
+        'memory_budget': io_props.ex_memory_budget,
+        'vertex_limit': io_props.ex_vertex_limit,
+        'write_trace': io_props.ex_write_trace,
+        'keep_identical': io_props.ex_keep_identical,
+        'write_textures': io_props.tx_textures,
+        'texture_subdir': io_props.tx_subdir,
+        'texture_max_size': io_props.tx_max_size,
+        'texture_format': io_props.tx_format,
+        'write_import_manifest': io_props.ex_import_manifest,
+    }
+
+
+def batch_settings(io_props):
+    '''
+    Keyword arguments of export_batch() from the add-on properties
+    '''
+    settings = export_settings(io_props)
+    del settings['file_name'] # one file per object or collection
+    settings['mode'] = io_props.bt_mode
+    settings['workers'] = io_props.bt_workers
+    return settings
+
+
 def register():
     """
     Registers the property group class and adds it to the context
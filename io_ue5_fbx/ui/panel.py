@@ -1,7 +1,65 @@
 import bpy
 import os
-from .. import operators, properties
-from ..constants import BlenderTypes, BlenderUnits, AddonUnits
+from .. import operators, properties, depsgraph, livelink
+from ..export import jobs
+from ..constants import \
+(
+    BlenderTypes,
+    BlenderUnits,
+    AddonUnits,
+    AddonBatch,
+    AddonEngine,
+    AddonLiveLink,
+)
+
+
+# property keys per prefix ('fp', 'ob', ...) in declaration order, with
+# their labels: {prefix: [(key, label)]}. Built once by register()
+layout_table = {}
+
+# selection state, cached until the selection changes:
+# [cache key, any object selected, any mesh or armature selected or active]
+selection_cache = [None, False, False]
+
+
+def build_layout_table():
+    '''
+    Group the PG_Properties keys by prefix, after the class is registered
+    '''
+    rna = properties.PG_Properties.bl_rna.properties
+    layout_table.clear()
+    for key in properties.PG_Properties.__annotations__:
+        prefix = key.split('_')[0]
+        layout_table.setdefault(prefix, []).append((key, rna[key].name))
+
+
+def selection_state(context):
+    '''
+    (any object selected, any mesh or armature selected or active). Only
+    walks the selection when the depsgraph handler reports a change
+    '''
+    obj_act = context.active_object
+    key = (depsgraph.selection_generation, context.scene.as_pointer(),
+        obj_act.as_pointer() if obj_act else 0)
+    if (selection_cache[0] == key):
+        return selection_cache[1], selection_cache[2]
+
+    obj_types_list = [BlenderTypes.MESH, BlenderTypes.ARMATURE]
+    obj_sel = context.selected_objects
+    found = False
+
+    # check selected objects
+    for obj in obj_sel:
+        if (obj.type in obj_types_list):
+            found = True
+            break
+
+    # check active object
+    if obj_act is not None and obj_act.type in obj_types_list:
+        found = True
+
+    selection_cache[:] = [key, bool(obj_sel), found]
+    return selection_cache[1], selection_cache[2]
 
 
 class Base_Panel:
@@ -31,22 +89,7 @@ class VIEW3D_PT_FBXExporter(Base_Panel, bpy.types.Panel):
         '''
         Decide whether or not to show the tool based on context
         '''
-        obj_types_list = [BlenderTypes.MESH, BlenderTypes.ARMATURE]
-        
-        obj_sel = context.selected_objects
-        obj_act = context.active_object
-        found = False
-
-        # check selected objects
-        for obj in obj_sel:
-            if (obj.type in obj_types_list):
-                found = True
-                break
-
-        # check active object
-        if obj_act is not None and obj_act.type in obj_types_list:
-            found = True
-
+        [_, found] = selection_state(context)
         return found
     
 
@@ -69,17 +112,12 @@ class VIEW3D_PT_Filepath(Base_Panel, bpy.types.Panel):
         Draw the filepath subpanel
         '''
         [layout, io_props] = super(VIEW3D_PT_Filepath, self).draw(context)
-        
-        # filter filepath properties
-        ann = io_props.__annotations__.keys()
-        fp_keys = [k for k in ann if k.startswith('fp')]
     
         # UI Layout
-        for key in fp_keys:
+        for key, label in layout_table['fp']:
             if key == 'fp_project_dir' or key == 'fp_project_subdir':
                 
                 # label
-                label = io_props.bl_rna.properties.get(key).name
                 row = layout.row()
                 row.label(text=label)
                 
@@ -117,14 +155,10 @@ class VIEW3D_PT_Objects(Base_Panel, bpy.types.Panel):
         Draw the Objects subpanel
         '''
         [layout, io_props] = super(VIEW3D_PT_Objects, self).draw(context)
-
-        # filter blender properties
-        ann = io_props.__annotations__.keys()
-        ob_keys = [k for k in ann if k.startswith('ob')]
         
         # UI Layout
         row = layout.row(align=True) # props on the same row
-        for key in ob_keys:
+        for key, _ in layout_table['ob']:
             row.prop(io_props, key, toggle=1)
 
 
@@ -141,12 +175,8 @@ class VIEW3D_PT_Transform(Base_Panel, bpy.types.Panel):
         '''
         [layout, io_props] = super(VIEW3D_PT_Transform, self).draw(context)  
 
-        # filter blender properties
-        ann = io_props.__annotations__.keys()
-        tr_keys = [k for k in ann if k.startswith('tr')]
-
         # UI Layout
-        for key in tr_keys:
+        for key, _ in layout_table['tr']:
             row = layout.row()
             row.prop(io_props, key)
 
@@ -167,18 +197,113 @@ class VIEW3D_PT_Armature(Base_Panel, bpy.types.Panel):
         '''
         [layout, io_props] = super(VIEW3D_PT_Armature, self).draw(context)  
 
-        # filter blender properties
-        ann = io_props.__annotations__.keys()
-        ar_keys = [k for k in ann if k.startswith('ar')]
-
         # UI Layout
         row = layout.row()
-        for key in ar_keys:
+        for key, _ in layout_table['ar']:
+            # weight and key reduction options get a row each
+            if (key.startswith(('ar_limit', 'ar_max', 'ar_weight')) or
+                key.startswith('ar_reduce') or key.endswith('_tolerance')):
+                row = layout.row()
             row.prop(io_props, key)
 
             # disable if armature is not selected
             row.enabled = io_props.ob_armature
 
+            # limits apply to skinned meshes
+            if (key == 'ar_limit_influences'):
+                row.enabled = io_props.ob_armature and io_props.ob_mesh
+            elif (key in ('ar_max_influences', 'ar_weight_threshold')):
+                row.enabled = io_props.ob_armature and io_props.ob_mesh and \
+                    io_props.ar_limit_influences
+
+            # reduction applies to baked keys
+            elif (key == 'ar_reduce_keys'):
+                row.enabled = io_props.ob_armature and \
+                    io_props.ar_bake_animation
+            elif (key.endswith('_tolerance')):
+                row.enabled = io_props.ob_armature and \
+                    io_props.ar_bake_animation and io_props.ar_reduce_keys
+
+
+class VIEW3D_PT_Batch(Base_Panel, bpy.types.Panel):
+
+    bl_parent_id = "VIEW3D_PT_FBXExporter"
+    bl_label = "Batch"
+    bl_options = {'DEFAULT_CLOSED'}
+
+
+    def draw(self, context):
+        '''
+        Draw the Batch subpanel
+        '''
+        [layout, io_props] = super(VIEW3D_PT_Batch, self).draw(context)
+
+        # UI Layout
+        for key, _ in layout_table['bt']:
+            row = layout.row()
+            row.prop(io_props, key)
+
+            # workers are only used in batch mode
+            if (key == 'bt_workers'):
+                row.enabled = io_props.bt_mode != AddonBatch.OFF.name
+
+
+class VIEW3D_PT_Textures(Base_Panel, bpy.types.Panel):
+
+    bl_parent_id = "VIEW3D_PT_FBXExporter"
+    bl_label = "Textures"
+    bl_options = {'DEFAULT_CLOSED'}
+
+
+    def draw(self, context):
+        '''
+        Draw the Textures subpanel
+        '''
+        [layout, io_props] = super(VIEW3D_PT_Textures, self).draw(context)
+
+        # UI Layout
+        for key, _ in layout_table['tx']:
+            row = layout.row()
+            row.prop(io_props, key)
+
+            # textures come from the materials of meshes
+            row.enabled = io_props.ob_mesh
+            if (key != 'tx_textures'):
+                row.enabled = io_props.ob_mesh and io_props.tx_textures
+
+
+class VIEW3D_PT_Options(Base_Panel, bpy.types.Panel):
+
+    bl_parent_id = "VIEW3D_PT_FBXExporter"
+    bl_label = "Options"
+    bl_options = {'DEFAULT_CLOSED'}
+
+
+    def draw(self, context):
+        '''
+        Draw the Options subpanel
+        '''
+        [layout, io_props] = super(VIEW3D_PT_Options, self).draw(context)
+        native = io_props.ex_engine == AddonEngine.NATIVE.name
+
+        # UI Layout
+        for key, _ in layout_table['ex']:
+            # retries share the priority row
+            if (key != 'ex_retries'):
+                row = layout.row()
+            row.prop(io_props, key)
+
+            # writer options only apply to the native engine
+            if (key in ('ex_compression', 'ex_memory_budget',
+                'ex_vertex_limit')):
+                row.enabled = native
+            elif (key == 'ex_live_delay'):
+                row.enabled = io_props.ex_live_link == AddonLiveLink.EDIT.name
+
+        if (io_props.ex_live_link != AddonLiveLink.OFF.name):
+            row = layout.row()
+            row.label(text=f"Watching {len(livelink.watched)} export(s)")
+
 
 class VIEW3D_PT_Export(Base_Panel, bpy.types.Panel):
 
@@ -193,17 +318,34 @@ class VIEW3D_PT_Export(Base_Panel, bpy.types.Panel):
         '''
         [layout, io_props] = super(VIEW3D_PT_Export, self).draw(context)
 
-        # UI Button
-        row1 = layout.row()
-        row1.operator(operators.OT_Reset.bl_idname)
+        # progress of the running export
+        if (operators.OT_Export.running):
+            row = layout.row()
+            row.progress(factor=operators.OT_Export.progress,
+                text=operators.OT_Export.status)
+            row = layout.row()
+            row.operator(operators.OT_Export_Cancel.bl_idname)
+
+        # exports waiting for the running one, or for a retry
+        pending = jobs.export_queue.pending()
+        if (pending):
+            row = layout.row()
+            row.label(text=f"{pending} queued export(s)")
+            row.operator(operators.OT_Export_Queue_Clear.bl_idname)
+
+        # UI Button. Exporting while an export runs queues the request
+        if (not operators.OT_Export.running):
+            row1 = layout.row()
+            row1.operator(operators.OT_Reset.bl_idname)
         row2 = layout.row()
         row2.operator(operators.OT_Export.bl_idname)
 
         # disable the Export button if the following is true:
         # at least one object is not selected, or file name is not defined
+        [has_selection, _] = selection_state(context)
         if (not io_props.fp_project_dir or
             not io_props.fp_file_name or 
-            not context.selected_objects):
+            not has_selection):
             row2.enabled = False
         else:
             row2.enabled = True
@@ -215,6 +357,9 @@ ui_classes = [
     VIEW3D_PT_Objects,
     VIEW3D_PT_Transform,
     VIEW3D_PT_Armature,
+    VIEW3D_PT_Batch,
+    VIEW3D_PT_Textures,
+    VIEW3D_PT_Options,
     VIEW3D_PT_Export,
 ]
 
@@ -223,6 +368,8 @@ def register():
     """
     Registers the ui classes when the addon is enabled
     """
+    build_layout_table()
+
     for ui_class in ui_classes:
         bpy.utils.register_class(ui_class)
 
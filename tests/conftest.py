@@ -0,0 +1,12 @@
+'''
+Most tested modules run without Blender. They are imported as top-level
+modules from io_ue5_fbx/export, since the add-on package imports bpy.
+Tests of the add-on package itself are skipped unless bpy is importable
+'''
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, os.path.join(ROOT, 'io_ue5_fbx', 'export'))
+sys.path.insert(1, ROOT)
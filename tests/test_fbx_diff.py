@@ -0,0 +1,98 @@
+import pytest
+import numpy as np
+
+import fbx_writer
+from fbx_diff import diff, is_identical
+from fbx_reader import FBXReadError
+
+IDS = {'Cube': 1, 'Cone': 2, 'Torus': 3, 'Ico': 4, 'Plane': 5, 'Monkey': 6}
+
+
+def write_scene(path, vertices, creator='io_ue5_fbx', names=('Cube',)):
+    with open(path, 'wb') as f:
+        w = fbx_writer.FBXWriter(f)
+        w.node('Creator', creator)
+        with w.scope('Objects'):
+            for name in names:
+                w.node('Model', fbx_writer.Int64(IDS[name]),
+                    fbx_writer.name_class(name, 'Model'), 'Mesh')
+            w.node('Geometry', fbx_writer.Int64(100),
+                fbx_writer.name_class('Mesh', 'Geometry'), 'Mesh')
+            w.node('Vertices', vertices)
+        w.close()
+    return path
+
+
+def test_identical(tmp_path):
+    vertices = np.arange(90, dtype=np.float64)
+    a = write_scene(tmp_path / 'a.fbx', vertices)
+    b = write_scene(tmp_path / 'b.fbx', vertices)
+    assert diff(a, b) == []
+    assert is_identical(a, b)
+
+
+def test_ignores_creator(tmp_path):
+    vertices = np.arange(90, dtype=np.float64)
+    a = write_scene(tmp_path / 'a.fbx', vertices)
+    b = write_scene(tmp_path / 'b.fbx', vertices, creator='Blender')
+    assert diff(a, b) == []
+
+
+def test_objects_in_any_order(tmp_path):
+    vertices = np.arange(90, dtype=np.float64)
+    a = write_scene(tmp_path / 'a.fbx', vertices, names=('Cube', 'Cone'))
+    b = write_scene(tmp_path / 'b.fbx', vertices, names=('Cone', 'Cube'))
+    assert diff(a, b) == []
+
+
+def test_array_tolerance(tmp_path):
+    vertices = np.arange(90, dtype=np.float64)
+    a = write_scene(tmp_path / 'a.fbx', vertices)
+    b = write_scene(tmp_path / 'b.fbx', vertices + 1e-9)
+    moved = vertices.copy()
+    moved[3] += 0.5
+    c = write_scene(tmp_path / 'c.fbx', moved)
+    assert diff(a, b) == []
+    [difference] = diff(a, c)
+    assert 'Vertices' in difference
+    assert '1 value(s) differ, first at [3]' in difference
+
+
+def test_limit(tmp_path):
+    a = write_scene(tmp_path / 'a.fbx', np.arange(90, dtype=np.float64),
+        names=('Cube', 'Cone', 'Torus'))
+    b = write_scene(tmp_path / 'b.fbx', np.zeros(30, dtype=np.float64),
+        names=('Ico', 'Plane', 'Monkey'))
+    assert len(diff(a, b)) > 1
+    assert len(diff(a, b, limit=1)) == 1
+    assert not is_identical(a, b)
+
+
+def test_unreadable_previous_file(tmp_path):
+    vertices = np.random.default_rng(0).random(900)
+    new = write_scene(tmp_path / 'new.fbx', vertices)
+    data = new.read_bytes()
+
+    # a partial file, cut anywhere
+    for size in (30, 40, len(data) // 2, len(data) - 200):
+        previous = tmp_path / f"cut{size}.fbx"
+        previous.write_bytes(data[:size])
+        assert not is_identical(previous, new)
+        with pytest.raises(FBXReadError):
+            diff(previous, new)
+
+    # the middle of the file lost, the footer kept
+    for size in (40, 60, 200, len(data) // 2):
+        previous = tmp_path / f"spliced{size}.fbx"
+        previous.write_bytes(data[:size] + data[-200:])
+        assert not is_identical(previous, new)
+        try:
+            assert diff(previous, new)
+        except FBXReadError:
+            pass
+
+    # deflated data overwritten
+    index = data.index(b'Vertices') + 40
+    previous = tmp_path / 'corrupt.fbx'
+    previous.write_bytes(data[:index] + b'\xff' * 16 + data[index + 16:])
+    assert not is_identical(previous, new)
@@ -0,0 +1,68 @@
+import pytest
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+import fbx_writer
+from fbx_reader import FBXReader, FBXReadError, inspect
+
+
+def write_scene(path, vertices, pool=None, name='Cube',
+                version=fbx_writer.FBX_VERSION):
+    with open(path, 'wb') as f:
+        w = fbx_writer.FBXWriter(f, version=version, pool=pool)
+        w.node('Creator', 'io_ue5_fbx test')
+        with w.scope('Objects'):
+            with w.scope('Geometry', fbx_writer.Int64(1),
+                    fbx_writer.name_class(name, 'Geometry'), 'Mesh'):
+                w.node('Vertices', vertices)
+                w.array_node('PolygonVertexIndex', np.int32, 3,
+                    [np.array([0, 1], dtype=np.int32),
+                     np.array([-3], dtype=np.int32)])
+            w.node('Model', fbx_writer.Int64(2),
+                fbx_writer.name_class(name, 'Model'), 'Mesh')
+        w.close()
+    return path
+
+
+@pytest.mark.parametrize('version', [7400, 7500])
+def test_round_trip(tmp_path, version):
+    path = tmp_path / 'scene.fbx'
+    vertices = np.arange(300, dtype=np.float64)
+    write_scene(path, vertices, version=version)
+
+    with FBXReader(path) as r:
+        assert r.version == version
+        assert r.wide == (version >= 7500)
+        assert [n.name for n in r.nodes] == ['Creator', 'Objects']
+        geometry = r.find('Objects').find('Geometry')
+        assert geometry.props[0] == 1
+        assert geometry.props[2] == 'Mesh'
+        array = geometry.find('Vertices').props[0]
+        assert len(array) == 300
+        np.testing.assert_array_equal(array.values(), vertices)
+        np.testing.assert_array_equal(
+            geometry.find('PolygonVertexIndex').props[0].values(), [0, 1, -3])
+
+    summary = inspect(str(path))
+    assert summary['meshes'] == 1
+    assert summary['vertices'] == 100
+    assert summary['creator'] == 'io_ue5_fbx test'
+
+
+def test_pool_writes_the_same_file(tmp_path):
+    vertices = np.random.default_rng(0).random(50000)
+    serial = write_scene(tmp_path / 'serial.fbx', vertices)
+    with ThreadPoolExecutor(4) as pool:
+        pooled = write_scene(tmp_path / 'pooled.fbx', vertices, pool)
+    assert serial.read_bytes() == pooled.read_bytes()
+
+
+def test_not_fbx(tmp_path):
+    path = tmp_path / 'text.fbx'
+    path.write_bytes(b'; FBX 7.4.0 project file')
+    try:
+        FBXReader(path)
+    except FBXReadError:
+        pass
+    else:
+        assert False, "read a text file as binary FBX"
@@ -0,0 +1,91 @@
+import numpy as np
+
+from geometry import decompose_matrices, limit_skin_weights, \
+    split_by_vertex_limit
+
+
+def euler_matrix(x, y, z):
+    '''
+    R = Rz @ Ry @ Rx, of XYZ euler angles in degrees
+    '''
+    x, y, z = np.radians([x, y, z])
+    rx = np.array([[1, 0, 0], [0, np.cos(x), -np.sin(x)],
+        [0, np.sin(x), np.cos(x)]])
+    ry = np.array([[np.cos(y), 0, np.sin(y)], [0, 1, 0],
+        [-np.sin(y), 0, np.cos(y)]])
+    rz = np.array([[np.cos(z), -np.sin(z), 0], [np.sin(z), np.cos(z), 0],
+        [0, 0, 1]])
+    return rz @ ry @ rx
+
+
+def test_limit_skin_weights():
+    vertices = np.array([0, 0, 0, 1, 1])
+    groups = np.array([0, 1, 2, 0, 3])
+    weights = np.array([0.5, 0.3, 0.2, 0.01, 0.9])
+    deform = np.array([True, True, True, False])
+
+    keep, new = limit_skin_weights(vertices, groups, weights, deform,
+        max_influences=2, threshold=0.05)
+    np.testing.assert_array_equal(keep, [True, True, False, True, True])
+    np.testing.assert_allclose(new[:2], [0.625, 0.375])
+    # the largest weight is kept below the threshold, and other groups
+    # are left as they are
+    np.testing.assert_allclose(new[3:], [1.0, 0.9])
+
+
+def test_limit_skin_weights_keeps_all():
+    vertices = np.array([0, 0])
+    groups = np.array([0, 1])
+    weights = np.array([1.0, 1.0])
+    keep, new = limit_skin_weights(vertices, groups, weights,
+        np.array([True, True]))
+    assert keep.all()
+    np.testing.assert_allclose(new, [0.5, 0.5])
+    np.testing.assert_allclose(weights, [1.0, 1.0])
+
+
+def test_split_by_vertex_limit():
+    # a strip of quads, each sharing two vertices with the one before
+    count = 100
+    loop_vertices = np.array([[2 * i, 2 * i + 1, 2 * i + 3, 2 * i + 2]
+        for i in range(count)]).ravel()
+    loop_start = np.arange(count) * 4
+    loop_total = np.full(count, 4)
+
+    pieces = split_by_vertex_limit(loop_vertices, loop_start, loop_total, 10)
+    assert pieces[0] == (0, 4)
+    assert [first for first, _ in pieces[1:]] == [end for _, end in pieces[:-1]]
+    assert pieces[-1][1] == count
+    for first, end in pieces:
+        used = loop_vertices[loop_start[first]:loop_start[end - 1] + 4]
+        assert len(np.unique(used)) <= 10
+
+
+def test_split_by_vertex_limit_large_polygon():
+    loop_vertices = np.array([0, 1, 2, 3, 4, 5, 6, 7, 0, 1, 8])
+    loop_start = np.array([0, 8])
+    loop_total = np.array([8, 3])
+    assert split_by_vertex_limit(loop_vertices, loop_start, loop_total,
+        4) == [(0, 1), (1, 2)]
+
+
+def test_decompose_matrices():
+    angles = np.array([[10.0, -20.0, 30.0], [0.0, 0.0, 0.0],
+        [-45.0, 60.0, 170.0]])
+    scales = np.array([[1.0, 2.0, 3.0], [1.0, 1.0, 1.0], [-2.0, 0.5, 1.0]])
+    mats = np.tile(np.eye(4), (3, 1, 1))
+    for i, (angle, scale) in enumerate(zip(angles, scales)):
+        mats[i, :3, :3] = euler_matrix(*angle) * scale
+        mats[i, :3, 3] = [i, 2 * i, -i]
+
+    translation, rotation, scale = decompose_matrices(mats)
+    np.testing.assert_allclose(translation, mats[:, :3, 3])
+    np.testing.assert_allclose(rotation, angles, atol=1e-9)
+    np.testing.assert_allclose(scale, scales)
+
+
+def test_decompose_matrices_gimbal():
+    mats = np.tile(np.eye(4), (1, 1, 1))
+    mats[0, :3, :3] = euler_matrix(30.0, 90.0, 0.0)
+    _, rotation, _ = decompose_matrices(mats)
+    np.testing.assert_allclose(rotation, [[30.0, 90.0, 0.0]], atol=1e-6)
@@ -0,0 +1,93 @@
+from import_manifest import ANIM_SEQUENCE, MANIFEST_VERSION, SKELETAL_MESH, \
+    STATIC_MESH, game_path, skeleton_path, validate
+
+DESTINATION = '/Game/TART07'
+
+
+def entry(name, asset_type, **keys):
+    return dict({
+        'file': f"{name}.fbx",
+        'name': name,
+        'asset_type': asset_type,
+        'destination': DESTINATION,
+        'import': {'leaf_bones': False},
+    }, **keys)
+
+
+def manifest(*entries):
+    return {
+        'version': MANIFEST_VERSION,
+        'assets': {e['file']: e for e in entries},
+    }
+
+
+def touch(directory, *entries):
+    for e in entries:
+        (directory / e['file']).write_bytes(b'')
+
+
+def test_valid(tmp_path):
+    mesh = entry('SK_Eva', SKELETAL_MESH, bones=['root', 'spine'])
+    anim = entry('A_Eva_Walk', ANIM_SEQUENCE, bones=['root', 'spine'],
+        skeleton={'asset': skeleton_path(mesh)})
+    prop = entry('SM_Crate', STATIC_MESH)
+    touch(tmp_path, mesh, anim, prop)
+    assert validate(manifest(mesh, anim, prop), str(tmp_path)) == []
+
+
+def test_version(tmp_path):
+    errors = validate({'version': MANIFEST_VERSION + 1}, str(tmp_path))
+    assert errors == [f"Unsupported manifest version {MANIFEST_VERSION + 1}"]
+
+
+def test_entry_errors(tmp_path):
+    missing = entry('SM_Crate', STATIC_MESH)
+    del missing['destination']
+    outside = entry('SM_Barrel', STATIC_MESH, destination='/Engine/Props')
+    unknown = entry('T_Wood', 'Texture2D')
+    touch(tmp_path, missing, unknown)
+
+    errors = validate(manifest(missing, outside, unknown), str(tmp_path))
+    assert errors == [
+        "SM_Barrel.fbx: destination /Engine/Props is outside /Game",
+        "SM_Barrel.fbx: SM_Barrel.fbx does not exist",
+        "SM_Crate.fbx: missing destination",
+        "T_Wood.fbx: unknown asset type Texture2D",
+    ]
+
+
+def test_same_destination(tmp_path):
+    a = entry('SM_Crate', STATIC_MESH)
+    b = entry('sm_crate', STATIC_MESH, file='crate_copy.fbx')
+    touch(tmp_path, a, b)
+    [error] = validate(manifest(a, b), str(tmp_path))
+    assert error.startswith("crate_copy.fbx: imports onto /Game/TART07/sm_crate")
+
+
+def test_skeletons(tmp_path):
+    mesh = entry('SK_Eva', SKELETAL_MESH, bones=['root', 'spine'])
+    orphan = entry('A_Idle', ANIM_SEQUENCE, armature='Armature')
+    wrong = entry('A_Walk', ANIM_SEQUENCE, bones=['root'],
+        skeleton={'asset': skeleton_path(mesh)})
+    leaf = entry('A_Run', ANIM_SEQUENCE, bones=['root', 'spine'],
+        skeleton={'asset': skeleton_path(mesh)}, **{'import':
+        {'leaf_bones': True}})
+    # a skeleton of another directory is not checked here
+    other = entry('A_Jump', ANIM_SEQUENCE,
+        skeleton={'asset': '/Game/Chars/SK_Kai_Skeleton'})
+    touch(tmp_path, mesh, orphan, wrong, leaf, other)
+
+    errors = validate(manifest(mesh, orphan, wrong, leaf, other),
+        str(tmp_path))
+    assert errors == [
+        "A_Idle.fbx: no skeleton for armature \"Armature\"",
+        "A_Run.fbx: leaf bones differ from SK_Eva.fbx",
+        "A_Walk.fbx: 1 bone(s) do not match the 2 of SK_Eva.fbx",
+    ]
+
+
+def test_game_path():
+    assert game_path('C:\\TART07\\Content\\TART07') == '/Game/TART07'
+    assert game_path('/home/eva/TART07/Content/Chars/Eva') == \
+        '/Game/Chars/Eva'
+    assert game_path('/tmp/export') == '/Game'
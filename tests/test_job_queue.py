@@ -0,0 +1,104 @@
+import job_queue
+from job_queue import JobQueue, QUEUED, RUNNING
+
+BLEND = '/project/eva.blend'
+
+
+def make_job(target, priority=0, retries=0, blend=BLEND, objects=()):
+    return {
+        'target': target,
+        'blend': blend,
+        'mode': 'FBX',
+        'objects': list(objects),
+        'settings': {},
+        'priority': priority,
+        'retries': retries,
+        'attempts': 0,
+        'not_before': 0.0,
+        'errors': [],
+        'state': QUEUED,
+    }
+
+
+def test_priority_then_order():
+    queue = JobQueue()
+    queue.push(make_job('a'))
+    queue.push(make_job('b', priority=1))
+    queue.push(make_job('c'))
+    queue.push(make_job('d', blend='/project/leaf.blend'))
+
+    popped = []
+    while (job := queue.pop(BLEND, now=0.0)):
+        assert job['state'] == RUNNING
+        popped.append(job['target'])
+        queue.finish(job)
+    assert popped == ['b', 'a', 'c']
+    assert queue.pending(BLEND) == 0
+    assert queue.pending('/project/leaf.blend') == 1
+
+
+def test_merge():
+    queue = JobQueue()
+    assert not queue.push(make_job('a', objects=['Cube']))
+    queue.push(make_job('b'))
+    assert queue.push(make_job('a', priority=2, objects=['Cone']))
+    assert len(queue) == 2
+
+    job = queue.pop(BLEND, now=0.0)
+    assert job['target'] == 'a'
+    assert job['objects'] == ['Cone']
+    assert queue.pop(BLEND, now=0.0)['target'] == 'b'
+    assert queue.pop(BLEND, now=0.0) is None
+
+
+def test_retry_with_backoff():
+    queue = JobQueue()
+    queue.push(make_job('a', retries=1))
+
+    job = queue.pop(BLEND, now=0.0)
+    assert queue.fail(job, "disk full")
+    assert job['errors'] == ["disk full"]
+    assert job['state'] == QUEUED
+    assert queue.pop(BLEND, now=job['not_before'] - 1.0) is None
+
+    job = queue.pop(BLEND, now=job['not_before'])
+    assert job['attempts'] == 2
+    assert not queue.fail(job, "disk full")
+    assert len(queue) == 0
+
+
+def test_newer_request_replaces_retry():
+    queue = JobQueue()
+    queue.push(make_job('a', retries=3))
+    job = queue.pop(BLEND, now=0.0)
+    queue.push(make_job('a', objects=['Cone']))
+    assert not queue.fail(job, "disk full")
+    assert queue.pop(BLEND, now=0.0)['objects'] == ['Cone']
+
+
+def test_save_and_load(tmp_path):
+    path = str(tmp_path / 'queue.json')
+    queue = JobQueue(path)
+    queue.push(make_job('a'))
+    queue.push(make_job('b', priority=1))
+    queue.push(make_job('c', blend=''))
+    running = queue.pop(BLEND, now=0.0)
+    assert running['target'] == 'b'
+
+    # Blender quit while b was running
+    loaded = JobQueue(path)
+    loaded.load()
+    assert len(loaded) == 2
+    job = loaded.pop(BLEND, now=0.0)
+    assert job['target'] == 'b'
+    assert job['attempts'] == 2
+    assert loaded.pop(BLEND, now=0.0)['target'] == 'a'
+
+
+def test_load_other_version(tmp_path):
+    path = tmp_path / 'queue.json'
+    path.write_text('{"version": %d, "jobs": []}' % (
+        job_queue.QUEUE_VERSION + 1))
+    queue = JobQueue(str(path))
+    queue.load()
+    assert len(queue) == 0
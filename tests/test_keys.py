@@ -0,0 +1,69 @@
+import numpy as np
+
+from keys import compatible_eulers, flip_eulers, reduce_keys
+
+
+def interpolate(keep, values):
+    '''
+    Linear interpolation of the kept keys of (frames, channels) values
+    '''
+    frames = np.arange(len(values))
+    return np.stack([np.interp(frames, frames[keep[:, c]],
+        values[keep[:, c], c]) for c in range(values.shape[1])], axis=1)
+
+
+def test_compatible_eulers_unwraps():
+    z = np.array([170.0, 179.0, -172.0, -165.0])
+    rot = np.zeros((4, 1, 3))
+    rot[:, 0, 2] = z
+    result = compatible_eulers(rot)
+    np.testing.assert_allclose(result[:, 0, 2], [170.0, 179.0, 188.0, 195.0])
+
+
+def test_compatible_eulers_picks_closest_solution():
+    rot = np.array([[[10.0, 20.0, 30.0]], [[12.0, 22.0, 32.0]]])
+    # the second frame, as the other solution of the same rotation
+    flipped = rot.copy()
+    flipped[1] = flip_eulers(rot[1]) - [0.0, 0.0, 360.0]
+    np.testing.assert_allclose(compatible_eulers(flipped), rot)
+
+
+def test_compatible_eulers_follows_previous():
+    previous = np.array([[0.0, 0.0, 350.0]])
+    rot = np.array([[[0.0, 0.0, -5.0]]])
+    np.testing.assert_allclose(compatible_eulers(rot, previous),
+        [[[0.0, 0.0, 355.0]]])
+
+
+def test_reduce_keys_linear():
+    frames = np.arange(50, dtype=np.float64)
+    channels = np.zeros((50, 1, 9))
+    channels[:, 0, 0] = frames * 0.5
+    channels[:, 0, 6:] = 1.0
+
+    keep, values = reduce_keys(channels, (0.01, 0.1, 0.001))
+    assert keep.shape == channels.shape
+    assert keep[:, 0, 0].sum() == 2
+    assert keep[0].all() and keep[-1].all()
+    np.testing.assert_allclose(values[-1, 0, 0], 24.5, atol=0.01)
+
+
+def test_reduce_keys_within_tolerance():
+    rng = np.random.default_rng(1)
+    channels = np.cumsum(rng.normal(size=(200, 3, 9)), axis=0)
+    tolerance = (0.05, 0.5, 0.01)
+
+    keep, values = reduce_keys(channels, tolerance)
+    assert keep.sum() < keep.size
+    flat_keep = keep.reshape(200, -1)
+    curve = interpolate(flat_keep, values.reshape(200, -1))
+    error = np.abs(curve - channels.reshape(200, -1))
+    tol = np.tile(np.repeat(tolerance, 3), 3)
+    assert (error <= tol + 1e-4).all()
+
+
+def test_reduce_keys_single_frame():
+    channels = np.ones((1, 2, 9), dtype=np.float32)
+    keep, values = reduce_keys(channels, (0.01, 0.1, 0.001))
+    assert keep.all()
+    np.testing.assert_array_equal(values, channels)
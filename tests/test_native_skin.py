@@ -0,0 +1,61 @@
+import pytest
+import numpy as np
+
+bpy = pytest.importorskip('bpy')
+
+from fbx_reader import FBXReader
+from io_ue5_fbx.export import native
+
+
+def skinned_cube(modifier):
+    '''
+    A cube skinned to a one-bone armature, with a modifier after its
+    armature modifier
+    '''
+    bpy.ops.wm.read_factory_settings(use_empty=True)
+    scene = bpy.context.scene
+
+    arm_data = bpy.data.armatures.new('Armature')
+    arm = bpy.data.objects.new('Armature', arm_data)
+    scene.collection.objects.link(arm)
+    bpy.context.view_layer.objects.active = arm
+    bpy.ops.object.mode_set(mode='EDIT')
+    bone = arm_data.edit_bones.new('root')
+    bone.tail = (0.0, 0.0, 1.0)
+    bpy.ops.object.mode_set(mode='OBJECT')
+
+    mesh = bpy.data.meshes.new('Cube')
+    mesh.from_pydata([(x, y, z) for x in (-1, 1) for y in (-1, 1)
+        for z in (-1, 1)], [], [(0, 1, 3, 2), (4, 6, 7, 5), (0, 4, 5, 1),
+        (2, 3, 7, 6), (0, 2, 6, 4), (1, 5, 7, 3)])
+    cube = bpy.data.objects.new('Cube', mesh)
+    scene.collection.objects.link(cube)
+    group = cube.vertex_groups.new(name='root')
+    group.add(range(8), 1.0, 'REPLACE')
+    cube.modifiers.new('Armature', 'ARMATURE').object = arm
+    mod = cube.modifiers.new(modifier, modifier)
+    if (modifier == 'SUBSURF'):
+        mod.levels = 2
+    return arm, cube
+
+
+@pytest.mark.parametrize('modifier', ['SUBSURF', 'MIRROR', 'SOLIDIFY'])
+def test_weights_follow_generative_modifiers(tmp_path, modifier):
+    arm, cube = skinned_cube(modifier)
+    path = tmp_path / 'SK_Cube.fbx'
+    for _ in native.write_fbx_stages(None, bpy.context, str(path),
+            [arm, cube], bake_anim=False):
+        pass
+
+    with FBXReader(path) as r:
+        objects = r.find('Objects')
+        [geometry] = objects.find_all('Geometry')
+        count = len(geometry.find('Vertices').props[0]) // 3
+        clusters = [d for d in objects.find_all('Deformer')
+            if d.props[2] == 'Cluster']
+        [cluster] = clusters
+        indexes = cluster.find('Indexes').props[0].values()
+
+    assert count > 8
+    # every written vertex is weighted, and no index points past them
+    np.testing.assert_array_equal(np.sort(indexes), np.arange(count))
@@ -0,0 +1,52 @@
+import os
+
+import project_index
+from project_index import entries, entry_state, file_hash, record
+
+
+def export(project_dir, name, data, blend, content_hash=None):
+    path = project_dir / 'Content' / f"{name}.fbx"
+    path.parent.mkdir(exist_ok=True)
+    path.write_bytes(data)
+    record(str(project_dir), str(path), blend, [name], 'StaticMesh', {},
+        content_hash=content_hash)
+    return path
+
+
+def test_content_hash_is_the_file_hash(tmp_path):
+    blend = tmp_path / 'eva.blend'
+    blend.write_bytes(b'')
+    path = export(tmp_path, 'SM_Crate', b'crate', str(blend))
+
+    [crate] = entries(str(tmp_path))
+    assert crate['path'] == 'Content/SM_Crate.fbx'
+    assert crate['content_hash'] == file_hash(path)
+    assert entry_state(str(tmp_path), crate) == 'CURRENT'
+
+    # a hash computed by the caller is stored as is
+    record(str(tmp_path), str(path), str(blend), ['SM_Crate'], 'StaticMesh',
+        {}, content_hash='known')
+    [crate] = entries(str(tmp_path))
+    assert crate['content_hash'] == 'known'
+
+
+def test_unchanged_file_keeps_its_hash(tmp_path, monkeypatch):
+    path = export(tmp_path, 'SM_Crate', b'crate', '')
+
+    def no_read(filepath):
+        raise AssertionError(f"read {filepath} again")
+
+    monkeypatch.setattr(project_index, 'file_hash', no_read)
+    record(str(tmp_path), str(path), '', ['SM_Crate'], 'StaticMesh', {})
+    [entry] = entries(str(tmp_path))
+    monkeypatch.undo()
+    assert entry['content_hash'] == file_hash(path)
+
+
+def test_modified(tmp_path):
+    path = export(tmp_path, 'SM_Crate', b'crate', '')
+    path.write_bytes(b'crate, edited')
+    [entry] = entries(str(tmp_path))
+    assert entry_state(str(tmp_path), entry) == 'MODIFIED'
+    os.remove(path)
+    assert entry_state(str(tmp_path), entry) == 'MISSING'
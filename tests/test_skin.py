@@ -0,0 +1,44 @@
+import pytest
+
+bpy = pytest.importorskip('bpy')
+
+from io_ue5_fbx.export import skin
+
+
+def test_shared_mesh_gets_one_copy():
+    bpy.ops.wm.read_factory_settings(use_empty=True)
+    scene = bpy.context.scene
+
+    arm = bpy.data.objects.new('Armature', bpy.data.armatures.new('Armature'))
+    scene.collection.objects.link(arm)
+    bpy.context.view_layer.objects.active = arm
+    bpy.ops.object.mode_set(mode='EDIT')
+    for name in ('a', 'b'):
+        arm.data.edit_bones.new(name).tail = (0.0, 0.0, 1.0)
+    bpy.ops.object.mode_set(mode='OBJECT')
+
+    mesh = bpy.data.meshes.new('Mesh')
+    mesh.from_pydata([(0, 0, 0), (1, 0, 0), (0, 1, 0)], [], [(0, 1, 2)])
+    users = []
+    for name in ('Left', 'Right'):
+        obj = bpy.data.objects.new(name, mesh)
+        scene.collection.objects.link(obj)
+        obj.modifiers.new('Armature', 'ARMATURE').object = arm
+        users.append(obj)
+    # groups are stored in the shared mesh, by index
+    for obj in users:
+        for name in ('a', 'b'):
+            obj.vertex_groups.new(name=name)
+    users[0].vertex_groups['a'].add([0, 1, 2], 0.9, 'REPLACE')
+    users[0].vertex_groups['b'].add([0, 1, 2], 0.1, 'REPLACE')
+
+    with skin.weights_override([arm] + users, 1, 0.0):
+        copy = users[0].data
+        assert copy != mesh
+        assert users[1].data == copy
+        assert copy.name == 'Mesh'
+        assert all(len(v.groups) == 1 for v in copy.vertices)
+
+    assert all(obj.data == mesh for obj in users)
+    assert mesh.name == 'Mesh'
+    assert all(len(v.groups) == 2 for v in mesh.vertices)